@@ -1,10 +1,27 @@
 from django.contrib import admin
-from .models import SystemUser
+from .models import DirectorySync, JobLease, JobRun, SystemUser
 
 
 @admin.register(SystemUser)
 class SystemUserAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'department', 'title', 'auth_method', 'is_active']
-    list_filter = ['is_active', 'department', 'auth_method']
+    list_filter = ['is_active', 'department', 'auth_method', 'email_delivery']
     search_fields = ['name', 'email', 'department', 'title']
     readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(DirectorySync)
+class DirectorySyncAdmin(admin.ModelAdmin):
+    list_display = ['source', 'last_sync_at', 'last_full_sync_at']
+
+
+@admin.register(JobLease)
+class JobLeaseAdmin(admin.ModelAdmin):
+    list_display = ['name', 'holder', 'locked_until', 'next_run_at']
+
+
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ['job', 'started_at', 'duration', 'succeeded', 'holder']
+    list_filter = ['job', 'succeeded']
+    readonly_fields = ['job', 'holder', 'started_at', 'duration', 'succeeded', 'output']
@@ -1,15 +1,41 @@
+from django.core.cache import cache
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+
+from apps.core.middleware import get_current_user
 from apps.core.models import SystemUser
 
+USER_OPTIONS_CACHE_KEY = 'core:active-user-options'
+USER_OPTIONS_TTL = 60 * 60
+
+
+def active_user_options():
+    """The user picker's <option> list, rendered once and cached until a user changes."""
+    html = cache.get(USER_OPTIONS_CACHE_KEY)
+    if html is None:
+        html = format_html_join(
+            '', '<option value="{}">{}</option>',
+            SystemUser.objects.filter(is_active=True).values_list('id', 'name'),
+        )
+        cache.set(USER_OPTIONS_CACHE_KEY, str(html), USER_OPTIONS_TTL)
+    return html
+
+
+def invalidate_user_options():
+    cache.delete(USER_OPTIONS_CACHE_KEY)
+
 
 def current_user(request):
-    user_id = request.session.get('current_user_id')
-    user = None
-    if user_id:
-        try:
-            user = SystemUser.objects.get(id=user_id, is_active=True)
-        except SystemUser.DoesNotExist:
-            pass
+    # Callables are only evaluated by templates that use them, so partials
+    # that don't render the navbar cost no queries
+    def user_options():
+        html = active_user_options()
+        user = get_current_user(request)
+        if user is not None:
+            html = html.replace(f'<option value="{user.id}">', f'<option value="{user.id}" selected>', 1)
+        return mark_safe(html)
+
     return {
-        'current_user': user,
-        'all_users': SystemUser.objects.filter(is_active=True),
+        'current_user': lambda: get_current_user(request),
+        'user_options': user_options,
     }
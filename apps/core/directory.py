@@ -0,0 +1,228 @@
+"""Azure AD directory sync for SystemUser.
+
+A source is a JSON file (a plain list of users or a Graph-style page with
+``value`` and ``@odata.deltaLink``), a CSV file, or an http(s) URL serving
+Graph-style pages linked by ``@odata.nextLink``. Users are matched on
+azure_ad_object_id, then email, and written in batches with upserts.
+
+A full sync stamps every user it sees with directory_synced_at and then
+deactivates the Azure AD users it did not see in one UPDATE. For URL
+sources the final deltaLink is stored in DirectorySync, and the next run
+asks only for changes; users removed in a delta are deactivated.
+
+An empty or missing accountEnabled (common in hand-made CSV exports)
+leaves an existing user's is_active unchanged; new users start active.
+"""
+import csv
+import json
+import time
+import urllib.request
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .context_processors import invalidate_user_options
+from .middleware import invalidate_current_user
+from .models import AuthMethod, DirectorySync, SystemUser
+
+DIRECTORY_BATCH_SIZE = 1000
+DIRECTORY_TIMEOUT = 30
+
+SYNC_FIELDS = [
+    'name', 'email', 'department', 'title', 'phone', 'is_active',
+    'auth_method', 'azure_ad_object_id', 'directory_synced_at', 'updated_at',
+]
+
+
+def _is_url(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def _enabled(value):
+    """accountEnabled as a bool, or None when the source leaves it out."""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        return value not in ('false', '0', 'no') if value else None
+    return None if value is None else bool(value)
+
+
+def parse_record(raw):
+    """Normalize a Graph user (or CSV row with the same column names)."""
+    phones = raw.get('businessPhones') or []
+    if isinstance(phones, str):
+        phones = [phones]
+    return {
+        'object_id': (raw.get('id') or '').strip(),
+        'email': (raw.get('mail') or raw.get('userPrincipalName') or '').strip().lower(),
+        'name': (raw.get('displayName') or '').strip(),
+        'department': raw.get('department') or '',
+        'title': raw.get('jobTitle') or '',
+        'phone': raw.get('mobilePhone') or (phones[0] if phones else ''),
+        'is_active': _enabled(raw.get('accountEnabled')),
+        'removed': '@removed' in raw,
+    }
+
+
+def _fetch_json(url):
+    with urllib.request.urlopen(url, timeout=DIRECTORY_TIMEOUT) as response:
+        return json.load(response)
+
+
+def iter_directory_pages(source, delta_link=''):
+    """Yield (raw records, delta_link) per page; the last page carries the link."""
+    if _is_url(source):
+        url = delta_link or source
+        while url:
+            page = _fetch_json(url)
+            yield page.get('value', []), page.get('@odata.deltaLink', '')
+            url = page.get('@odata.nextLink')
+    elif source.lower().endswith('.csv'):
+        with open(source, newline='', encoding='utf-8-sig') as f:
+            yield csv.DictReader(f), ''
+    else:
+        with open(source, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            yield data, ''
+        else:
+            yield data.get('value', []), data.get('@odata.deltaLink', '')
+
+
+def _latest_records(pages, stats):
+    """Parse every record, keeping the last occurrence of each user.
+
+    An export (or a delta spanning several pages) may list the same object
+    id twice; both copies in one upsert would fail with "ON CONFLICT DO
+    UPDATE command cannot affect row a second time".
+    """
+    latest = {}
+    for records, _ in pages:
+        for raw in records:
+            stats['received'] += 1
+            record = parse_record(raw)
+            key = record['object_id'] or ('email', record['email'])
+            latest.pop(key, None)
+            latest[key] = record
+    return list(latest.values())
+
+
+def _batches(records, size):
+    for start in range(0, len(records), size):
+        yield records[start:start + size]
+
+
+def _upsert_batch(records, synced_at, stats):
+    """Create or update one batch of parsed records. Returns the emails written."""
+    # Last occurrence wins when the export repeats a user
+    records = list({r['email']: r for r in records}.values())
+    by_object_id = dict(
+        SystemUser.objects
+        .filter(azure_ad_object_id__in=[r['object_id'] for r in records if r['object_id']])
+        .values_list('azure_ad_object_id', 'pk')
+    )
+    by_email = dict(SystemUser.objects.filter(email__in=[r['email'] for r in records]).values_list('email', 'pk'))
+
+    existing, keep_active, new = [], [], []
+    for r in records:
+        pk = by_object_id.get(r['object_id'])
+        email_pk = by_email.get(r['email'])
+        if pk is not None and email_pk is not None and pk != email_pk:
+            # The new email already belongs to another user
+            stats['conflicts'] += 1
+            continue
+        user = SystemUser(
+            pk=pk or email_pk,
+            name=r['name'] or r['email'],
+            email=r['email'],
+            department=r['department'],
+            title=r['title'],
+            phone=r['phone'],
+            is_active=True if r['is_active'] is None else r['is_active'],
+            auth_method=AuthMethod.AZURE_AD,
+            azure_ad_object_id=r['object_id'],
+            directory_synced_at=synced_at,
+            updated_at=synced_at,
+        )
+        if not user.pk:
+            new.append(user)
+        elif r['is_active'] is None:
+            keep_active.append(user)
+        else:
+            existing.append(user)
+
+    if existing:
+        SystemUser.objects.bulk_create(
+            existing, update_conflicts=True, unique_fields=['id'], update_fields=SYNC_FIELDS,
+        )
+    if keep_active:
+        SystemUser.objects.bulk_create(
+            keep_active, update_conflicts=True, unique_fields=['id'],
+            update_fields=[f for f in SYNC_FIELDS if f != 'is_active'],
+        )
+    if new:
+        SystemUser.objects.bulk_create(
+            new, update_conflicts=True, unique_fields=['email'], update_fields=SYNC_FIELDS,
+        )
+    stats['updated'] += len(existing) + len(keep_active)
+    stats['created'] += len(new)
+    return [user.email for user in existing + keep_active + new]
+
+
+def sync_directory(source, incremental=None, batch_size=DIRECTORY_BATCH_SIZE):
+    """Sync SystemUsers from ``source``. Returns the run's counts and throughput.
+
+    ``incremental`` defaults to True for URL sources with a stored delta
+    link. Only a full sync deactivates users missing from the source.
+    """
+    from apps.search.services import index_objects
+
+    state, _ = DirectorySync.objects.get_or_create(source=source)
+    if incremental is None:
+        incremental = _is_url(source) and bool(state.delta_link)
+    started_at = timezone.now()
+    started = time.monotonic()
+    stats = {
+        'incremental': incremental, 'received': 0, 'created': 0, 'updated': 0,
+        'deactivated': 0, 'skipped': 0, 'conflicts': 0,
+    }
+    delta_link = ''
+    touched = []
+
+    def pages():
+        nonlocal delta_link
+        for records, link in iter_directory_pages(source, state.delta_link if incremental else ''):
+            yield records, link
+            delta_link = link or delta_link
+
+    for records in _batches(_latest_records(pages(), stats), batch_size):
+        removed = [r['object_id'] for r in records if r['removed'] and r['object_id']]
+        records = [r for r in records if not r['removed']]
+        stats['skipped'] += sum(1 for r in records if not r['email'])
+        with transaction.atomic():
+            emails = _upsert_batch([r for r in records if r['email']], started_at, stats)
+            if removed:
+                gone = SystemUser.objects.filter(azure_ad_object_id__in=removed, is_active=True)
+                touched += gone.values_list('pk', flat=True)
+                stats['deactivated'] += gone.update(is_active=False)
+            written = list(SystemUser.objects.filter(email__in=emails))
+            index_objects('user', written)
+        touched += [user.pk for user in written]
+
+    if not incremental:
+        missing = SystemUser.objects.filter(auth_method=AuthMethod.AZURE_AD, is_active=True).filter(
+            Q(directory_synced_at__isnull=True) | Q(directory_synced_at__lt=started_at)
+        )
+        touched += missing.values_list('pk', flat=True)
+        stats['deactivated'] += missing.update(is_active=False)
+        state.last_full_sync_at = started_at
+
+    state.delta_link = delta_link if _is_url(source) else ''
+    state.last_sync_at = started_at
+    state.save()
+    invalidate_user_options()
+    invalidate_current_user(*touched)
+
+    stats['seconds'] = time.monotonic() - started
+    stats['per_second'] = stats['received'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
@@ -8,7 +8,7 @@ WIDGET_CLASSES = 'w-full rounded-lg border-gray-300 shadow-sm focus:border-indig
 class SystemUserForm(forms.ModelForm):
     class Meta:
         model = SystemUser
-        fields = ['name', 'email', 'department', 'title', 'phone', 'is_active']
+        fields = ['name', 'email', 'department', 'title', 'phone', 'email_delivery', 'is_active']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': WIDGET_CLASSES,
@@ -30,7 +30,39 @@ class SystemUserForm(forms.ModelForm):
                 'class': WIDGET_CLASSES,
                 'placeholder': '+45 12 34 56 78',
             }),
+            'email_delivery': forms.Select(attrs={'class': WIDGET_CLASSES}),
             'is_active': forms.CheckboxInput(attrs={
                 'class': 'rounded border-gray-300 text-indigo-600 focus:ring-indigo-500',
             }),
         }
+
+
+class ReassignWorkForm(forms.Form):
+    """Where a user's open work goes: one assignee for everything, optionally
+    overridden per entity category."""
+    assignee = forms.ModelChoiceField(
+        queryset=SystemUser.objects.none(), required=False,
+        label='Overdrag til', empty_label='— Behold opgaverne —',
+        widget=forms.Select(attrs={'class': WIDGET_CLASSES}),
+    )
+
+    def __init__(self, *args, user, categories=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        candidates = SystemUser.objects.filter(is_active=True).exclude(pk=user.pk)
+        self.fields['assignee'].queryset = candidates
+        for category in categories:
+            self.fields[f'category_{category.pk}'] = forms.ModelChoiceField(
+                queryset=candidates, required=False, label=category.name,
+                empty_label='Samme som ovenfor',
+                widget=forms.Select(attrs={'class': WIDGET_CLASSES}),
+            )
+
+    def category_fields(self):
+        return [field for field in self if field.name.startswith('category_')]
+
+    def category_assignees(self):
+        return {
+            int(name.removeprefix('category_')): value
+            for name, value in self.cleaned_data.items()
+            if name.startswith('category_') and value
+        }
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.scheduler import ensure_leases, get_jobs, node_name, run_due_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run the periodic jobs (overdue scan, reminders, digests, outbox, purges, counter repair) in-process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', action='append', dest='jobs', help='Only run this job (may be given several times)')
+        parser.add_argument('--tick', type=float, default=10.0, help='Seconds between checks for due jobs')
+        parser.add_argument('--once', action='store_true', help='Run the due jobs once and exit')
+
+    def handle(self, *args, **options):
+        known = {job.name for job in get_jobs()}
+        unknown = set(options['jobs'] or ()) - known
+        if unknown:
+            raise CommandError(f'Unknown job(s): {", ".join(sorted(unknown))}. Known: {", ".join(sorted(known))}.')
+
+        ensure_leases()
+        holder = node_name()
+        self.stdout.write(f'Scheduler {holder} started.')
+        try:
+            while True:
+                for run in run_due_jobs(holder, names=options['jobs']):
+                    style = self.style.SUCCESS if run.succeeded else self.style.ERROR
+                    self.stdout.write(style(
+                        f'{run.job}: {"ok" if run.succeeded else "failed"} in {run.duration:.2f}s'
+                    ))
+                if options['once']:
+                    break
+                time.sleep(options['tick'])
+        except KeyboardInterrupt:
+            self.stdout.write('Scheduler stopped.')
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.directory import DIRECTORY_BATCH_SIZE, sync_directory
+
+
+class Command(BaseCommand):
+    help = 'Create, update and deactivate users from an Azure AD directory export or endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='JSON or CSV file, or an http(s) URL serving Graph-style pages')
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--full', action='store_true',
+                          help='Ignore the stored delta link and deactivate users missing from the source')
+        mode.add_argument('--delta', action='store_true',
+                          help='Treat the source as a delta export: only apply the changes it lists')
+        parser.add_argument('--batch-size', type=int, default=DIRECTORY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        incremental = False if options['full'] else True if options['delta'] else None
+        try:
+            stats = sync_directory(options['source'], incremental=incremental, batch_size=options['batch_size'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read {options["source"]}: {exc}')
+
+        mode = 'Delta' if stats['incremental'] else 'Full'
+        self.stdout.write(self.style.SUCCESS(
+            f'{mode} sync: {stats["received"]} records in {stats["seconds"]:.2f}s '
+            f'({stats["per_second"]:.0f}/s). Created {stats["created"]}, updated {stats["updated"]}, '
+            f'deactivated {stats["deactivated"]}, skipped {stats["skipped"]} without email, '
+            f'{stats["conflicts"]} email conflicts.'
+        ))
@@ -0,0 +1,48 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from apps.core.models import SystemUser
+
+CURRENT_USER_TTL = 60
+
+
+def _user_cache_key(user_id):
+    return f'core:user:{user_id}'
+
+
+def get_current_user(request):
+    """The session's active SystemUser, looked up at most once per request.
+
+    The instance is cached for CURRENT_USER_TTL seconds across requests.
+    unread_count is deferred, so reading it always goes to the database.
+    """
+    if not hasattr(request, '_current_user'):
+        user_id = request.session.get('current_user_id')
+        user = None
+        if user_id:
+            user = cache.get(_user_cache_key(user_id))
+            if user is None:
+                user = SystemUser.objects.defer('unread_count').filter(id=user_id, is_active=True).first()
+                if user is not None:
+                    cache.set(_user_cache_key(user_id), user, CURRENT_USER_TTL)
+        request._current_user = user
+    return request._current_user
+
+
+def invalidate_current_user(*user_ids):
+    cache.delete_many([_user_cache_key(user_id) for user_id in user_ids])
+
+
+class CurrentUserMiddleware:
+    """Set ``request.current_user`` to the session's SystemUser, resolved on first use.
+
+    It is falsy when nobody is selected; pass ``request.current_user or None``
+    where a real None is needed, e.g. for a foreign key.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.current_user = SimpleLazyObject(lambda: get_current_user(request))
+        return self.get_response(request)
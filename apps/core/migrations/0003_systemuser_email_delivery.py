@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_alter_systemuser_options_systemuser_auth_method_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemuser',
+            name='email_delivery',
+            field=models.CharField(choices=[('immediate', 'Med det samme'), ('hourly', 'Samlet hver time'), ('daily', 'Samlet dagligt')], default='immediate', help_text='Samlede emails sendes som én opsummering pr. periode.', max_length=20, verbose_name='Email-notifikationer'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_systemuser_email_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='systemuser',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_systemuser_unread_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('holder', models.CharField(blank=True, max_length=200)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('next_run_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Planlagt job',
+                'verbose_name_plural': 'Planlagte jobs',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='JobRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=100)),
+                ('holder', models.CharField(max_length=200)),
+                ('started_at', models.DateTimeField()),
+                ('duration', models.FloatField(help_text='Sekunder')),
+                ('succeeded', models.BooleanField()),
+                ('output', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Jobkørsel',
+                'verbose_name_plural': 'Jobkørsler',
+                'ordering': ['-started_at'],
+                'indexes': [models.Index(fields=['job', 'started_at'], name='jobrun_job_started_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_job_lease_and_run'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectorySync',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=500, unique=True)),
+                ('delta_link', models.TextField(blank=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('last_sync_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Katalogsynkronisering',
+                'verbose_name_plural': 'Katalogsynkroniseringer',
+            },
+        ),
+        migrations.AddField(
+            model_name='systemuser',
+            name='directory_synced_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='systemuser',
+            name='azure_ad_object_id',
+            field=models.CharField(blank=True, db_index=True, help_text='Udfyldes automatisk ved Azure AD sync.', max_length=36, verbose_name='Azure AD Object ID'),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 class AuthMethod(models.TextChoices):
@@ -6,6 +9,41 @@ class AuthMethod(models.TextChoices):
     AZURE_AD = 'azure_ad', 'Azure AD'
 
 
+class EmailDelivery(models.TextChoices):
+    IMMEDIATE = 'immediate', 'Med det samme'
+    HOURLY = 'hourly', 'Samlet hver time'
+    DAILY = 'daily', 'Samlet dagligt'
+
+
+class SystemUserQuerySet(models.QuerySet):
+    def with_workload(self):
+        """Annotate open_task_count, overdue_task_count, completed_task_count,
+        task_count and onboarding_count in the same query.
+
+        Task counts are grouped over one join; created onboardings come from a
+        correlated subquery so the two relations don't multiply each other.
+        """
+        from apps.onboarding.models import OnboardingProcess, TaskStatus
+
+        today = timezone.now().date()
+        is_open = ~Q(assigned_tasks__status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
+        created = (
+            OnboardingProcess.objects
+            .filter(created_by=OuterRef('pk'))
+            .order_by()
+            .values('created_by')
+            .annotate(n=Count('pk'))
+            .values('n')
+        )
+        return self.annotate(
+            open_task_count=Count('assigned_tasks', filter=is_open),
+            overdue_task_count=Count('assigned_tasks', filter=is_open & Q(assigned_tasks__deadline__lt=today)),
+            completed_task_count=Count('assigned_tasks', filter=Q(assigned_tasks__status=TaskStatus.COMPLETED)),
+            task_count=Count('assigned_tasks'),
+            onboarding_count=Coalesce(Subquery(created, output_field=IntegerField()), 0),
+        )
+
+
 class SystemUser(models.Model):
     name = models.CharField(max_length=200, verbose_name='Navn')
     email = models.EmailField(unique=True, verbose_name='Email')
@@ -13,6 +51,11 @@ class SystemUser(models.Model):
     title = models.CharField(max_length=200, blank=True, verbose_name='Stilling')
     phone = models.CharField(max_length=50, blank=True, verbose_name='Telefon')
     is_active = models.BooleanField(default=True, verbose_name='Aktiv')
+    email_delivery = models.CharField(
+        max_length=20, choices=EmailDelivery.choices, default=EmailDelivery.IMMEDIATE,
+        verbose_name='Email-notifikationer',
+        help_text='Samlede emails sendes som én opsummering pr. periode.'
+    )
     # Azure AD integration fields (prepared for future use)
     auth_method = models.CharField(
         max_length=20, choices=AuthMethod.choices, default=AuthMethod.LOCAL,
@@ -20,12 +63,20 @@ class SystemUser(models.Model):
         help_text='Lokal = brugervælger. Azure AD = fremtidig SSO integration.'
     )
     azure_ad_object_id = models.CharField(
-        max_length=36, blank=True, verbose_name='Azure AD Object ID',
+        max_length=36, blank=True, db_index=True, verbose_name='Azure AD Object ID',
         help_text='Udfyldes automatisk ved Azure AD sync.'
     )
+    # Start of the last full directory sync that included this user; users
+    # left with an older stamp were missing from the export
+    directory_synced_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Denormalized count of unread notifications, kept in step by
+    # apps.notifications.services and repaired by repair_unread_counts
+    unread_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SystemUserQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
         verbose_name = 'Bruger'
@@ -40,3 +91,56 @@ class SystemUser(models.Model):
         if len(parts) >= 2:
             return (parts[0][0] + parts[-1][0]).upper()
         return self.name[:2].upper()
+
+
+class DirectorySync(models.Model):
+    """Where the last sync_directory run from a source left off."""
+    source = models.CharField(max_length=500, unique=True)
+    delta_link = models.TextField(blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+    last_sync_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Katalogsynkronisering'
+        verbose_name_plural = 'Katalogsynkroniseringer'
+
+    def __str__(self):
+        return self.source
+
+
+class JobLease(models.Model):
+    """One row per scheduled job; whoever holds the lease runs the job.
+
+    Taken with a conditional UPDATE so only one scheduler node gets it. A
+    lease left by a crashed node expires at ``locked_until``.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    holder = models.CharField(max_length=200, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    next_run_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'Planlagt job'
+        verbose_name_plural = 'Planlagte jobs'
+
+    def __str__(self):
+        return self.name
+
+
+class JobRun(models.Model):
+    job = models.CharField(max_length=100)
+    holder = models.CharField(max_length=200)
+    started_at = models.DateTimeField()
+    duration = models.FloatField(help_text='Sekunder')
+    succeeded = models.BooleanField()
+    output = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+        indexes = [models.Index(fields=['job', 'started_at'], name='jobrun_job_started_idx')]
+        verbose_name = 'Jobkørsel'
+        verbose_name_plural = 'Jobkørsler'
+
+    def __str__(self):
+        return f'{self.job} {self.started_at:%Y-%m-%d %H:%M}'
@@ -0,0 +1,145 @@
+"""In-process periodic jobs for the run_scheduler command.
+
+Each job is a management command run on an interval. Nodes
+coordinate through JobLease rows: a job runs on the node that takes its
+lease once ``next_run_at`` has passed, and every run is recorded as a
+JobRun. The lease is renewed while the job runs, so a long run is not
+picked up by a second node.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import JobLease, JobRun
+
+logger = logging.getLogger(__name__)
+
+Job = namedtuple('Job', ['name', 'interval', 'command', 'args'])
+
+# Default intervals in seconds; override per job with settings.SCHEDULER_INTERVALS
+JOBS = [
+    Job('send_outbox', 60, 'send_outbox', ()),
+    Job('check_overdue', 60 * 60, 'check_overdue', ()),
+    Job('send_reminders', 60 * 60, 'send_reminders', ()),
+    Job('send_digests_hourly', 60 * 60, 'send_digests', ('hourly',)),
+    Job('send_digests_daily', 24 * 60 * 60, 'send_digests', ('daily',)),
+    Job('purge_notifications', 24 * 60 * 60, 'purge_notifications', ()),
+    Job('repair_unread_counts', 24 * 60 * 60, 'repair_unread_counts', ()),
+]
+
+# A lease outlives its holder by at most this long; a running job renews
+# it every JOB_LEASE_RENEW_SECONDS
+JOB_LEASE_SECONDS = 30 * 60
+JOB_LEASE_RENEW_SECONDS = 5 * 60
+JOB_RUN_RETENTION_DAYS = 30
+
+
+def get_jobs():
+    """The registered jobs with intervals from settings applied."""
+    intervals = getattr(settings, 'SCHEDULER_INTERVALS', {})
+    return [job._replace(interval=intervals.get(job.name, job.interval)) for job in JOBS]
+
+
+def node_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def ensure_leases(jobs=None):
+    """Create the missing lease rows for ``jobs`` (all registered jobs by default)."""
+    JobLease.objects.bulk_create(
+        [JobLease(name=job.name) for job in jobs or get_jobs()], ignore_conflicts=True,
+    )
+
+
+def acquire_lease(name, holder, now=None):
+    """Take the lease for job ``name`` if it is due and nobody holds it.
+
+    The lease row must exist; see ensure_leases.
+    """
+    now = now or timezone.now()
+    return JobLease.objects.filter(
+        Q(next_run_at__isnull=True) | Q(next_run_at__lte=now),
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now),
+        name=name,
+    ).update(holder=holder, locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS)) == 1
+
+
+def renew_lease(name, holder):
+    """Extend ``holder``'s lease on job ``name``. False if the lease was lost."""
+    return JobLease.objects.filter(name=name, holder=holder, locked_until__isnull=False).update(
+        locked_until=timezone.now() + timedelta(seconds=JOB_LEASE_SECONDS),
+    ) == 1
+
+
+def release_lease(name, holder, next_run_at):
+    JobLease.objects.filter(name=name, holder=holder).update(locked_until=None, next_run_at=next_run_at)
+
+
+@contextmanager
+def keep_lease(name, holder):
+    """Renew the lease from a background thread while the body runs."""
+    stop = threading.Event()
+
+    def renew():
+        try:
+            while not stop.wait(JOB_LEASE_RENEW_SECONDS):
+                if not renew_lease(name, holder):
+                    logger.warning('Job %s lost its lease while running on %s', name, holder)
+                    break
+        finally:
+            # The thread has its own connection
+            connection.close()
+
+    thread = threading.Thread(target=renew, name=f'lease-{name}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job, holder):
+    """Run ``job`` under a lease already held by ``holder`` and record the run."""
+    started_at = timezone.now()
+    started = time.monotonic()
+    out = StringIO()
+    try:
+        with keep_lease(job.name, holder):
+            call_command(job.command, *job.args, stdout=out, stderr=out)
+        succeeded = True
+    except Exception:
+        out.write(traceback.format_exc())
+        succeeded = False
+    duration = time.monotonic() - started
+
+    release_lease(job.name, holder, started_at + timedelta(seconds=job.interval))
+    JobRun.objects.filter(job=job.name, started_at__lt=started_at - timedelta(days=JOB_RUN_RETENTION_DAYS)).delete()
+    return JobRun.objects.create(
+        job=job.name, holder=holder, started_at=started_at, duration=duration,
+        succeeded=succeeded, output=out.getvalue(),
+    )
+
+
+def run_due_jobs(holder, names=None, now=None):
+    """Run every job that is due and whose lease this node gets. Returns the JobRuns."""
+    runs = []
+    for job in get_jobs():
+        if names and job.name not in names:
+            continue
+        if acquire_lease(job.name, holder, now=now):
+            runs.append(run_job(job, holder))
+    return runs
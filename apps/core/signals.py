@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .context_processors import invalidate_user_options
+from .middleware import invalidate_current_user
+from .models import SystemUser
+
+
+@receiver(post_save, sender=SystemUser)
+@receiver(post_delete, sender=SystemUser)
+def system_user_changed(sender, instance, **kwargs):
+    invalidate_user_options()
+    invalidate_current_user(instance.pk)
@@ -6,11 +6,13 @@ app_name = 'core'
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='dashboard'),
     path('switch-user/', views.SwitchUserView.as_view(), name='switch_user'),
+    path('heartbeat/', views.HeartbeatView.as_view(), name='heartbeat'),
     # User administration
     path('users/', views.UserListView.as_view(), name='user_list'),
     path('users/create/', views.UserCreateView.as_view(), name='user_create'),
     path('users/<int:pk>/', views.UserDetailView.as_view(), name='user_detail'),
     path('users/<int:pk>/edit/', views.UserUpdateView.as_view(), name='user_edit'),
     path('users/<int:pk>/toggle-active/', views.UserToggleActiveView.as_view(), name='user_toggle_active'),
+    path('users/<int:pk>/reassign/', views.UserReassignView.as_view(), name='user_reassign'),
     path('users/<int:pk>/delete/', views.UserDeleteView.as_view(), name='user_delete'),
 ]
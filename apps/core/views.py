@@ -1,54 +1,59 @@
+from urllib.parse import urlencode
+
 from django.contrib import messages
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.views import View
 
 from apps.core.models import SystemUser
+from apps.notifications.services import render_unread_badge
 from apps.onboarding.models import OnboardingProcess, OnboardingTask, TaskStatus
-from .forms import SystemUserForm
+from apps.onboarding.services import get_open_work, get_task_counters, reassign_user_work
+from apps.search.services import search_filter
+from .forms import ReassignWorkForm, SystemUserForm
 
 
 class DashboardView(View):
     def get(self, request):
         context = {}
-        user_id = request.session.get('current_user_id')
-        if user_id:
-            try:
-                user = SystemUser.objects.get(id=user_id, is_active=True)
-                context['user'] = user
-
-                # My tasks (assigned to current user, not completed)
-                my_tasks = (
-                    OnboardingTask.objects
-                    .filter(assignee=user)
-                    .exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
-                    .select_related('onboarding')
-                    .order_by('deadline', 'sort_order')[:10]
-                )
-                context['my_tasks'] = my_tasks
-                context['my_tasks_count'] = my_tasks.count()
-
-                # Overdue tasks for current user
-                today = timezone.now().date()
-                overdue_count = (
-                    OnboardingTask.objects
-                    .filter(
-                        assignee=user,
-                        deadline__lt=today,
-                    )
-                    .exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
-                    .count()
+        user = request.current_user
+        if user:
+            context['user'] = user
+
+            # My tasks (assigned to current user, not completed)
+            my_tasks = (
+                OnboardingTask.objects
+                .filter(assignee=user)
+                .exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
+                .select_related('onboarding')
+                .order_by('deadline', 'sort_order')[:10]
+            )
+            context['my_tasks'] = my_tasks
+            context['my_tasks_count'] = my_tasks.count()
+
+            # Overdue tasks for current user
+            today = timezone.now().date()
+            overdue_count = (
+                OnboardingTask.objects
+                .filter(
+                    assignee=user,
+                    deadline__lt=today,
                 )
-                context['overdue_tasks_count'] = overdue_count
+                .exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
+                .count()
+            )
+            context['overdue_tasks_count'] = overdue_count
 
-                # Active onboardings (not 100% complete)
-                all_processes = OnboardingProcess.objects.prefetch_related('tasks').order_by('-start_date')[:20]
-                active_processes = [p for p in all_processes if not p.is_complete]
-                context['active_processes'] = active_processes[:5]
-                context['active_processes_count'] = len(active_processes)
+            # Active onboardings (not 100% complete)
+            all_processes = OnboardingProcess.objects.prefetch_related('tasks').order_by('-start_date')[:20]
+            active_processes = [p for p in all_processes if not p.is_complete]
+            context['active_processes'] = active_processes[:5]
+            context['active_processes_count'] = len(active_processes)
 
-            except SystemUser.DoesNotExist:
-                pass
         return render(request, 'core/dashboard.html', context)
 
 
@@ -66,25 +71,69 @@ class SwitchUserView(View):
         return redirect(request.POST.get('next', '/'))
 
 
+class HeartbeatView(View):
+    """All navbar counters in one poll, returned as out-of-band swaps.
+
+    Counts come from the denormalized unread counter and the cached task
+    counters; the ETag lets an unchanged heartbeat end in a 304.
+    """
+
+    def get(self, request):
+        user = request.current_user
+        if not user:
+            return HttpResponse(status=204)
+
+        counters = get_task_counters(user)
+        etag = f'"{user.pk}-{user.unread_count}-{counters["open"]}-{counters["overdue"]}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(render_to_string('partials/_heartbeat.html', {
+                'unread_badge': render_unread_badge(user.unread_count),
+                'open_tasks': counters['open'],
+                'overdue_tasks': counters['overdue'],
+            }))
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
 # --- User Administration ---
 
 class UserListView(View):
+    SORT_FIELDS = {
+        'name': 'name',
+        'department': 'department',
+        'open': 'open_task_count',
+        'overdue': 'overdue_task_count',
+        'completed': 'completed_task_count',
+        'onboardings': 'onboarding_count',
+    }
+
     def get(self, request):
         query = request.GET.get('q', '')
         show_inactive = request.GET.get('inactive', '') == '1'
-        users = SystemUser.objects.all()
-        if not show_inactive:
+        sort_by = request.GET.get('sort', '')
+        sort_dir = request.GET.get('dir', 'asc')
+        users = SystemUser.objects.with_workload()
+        filters = {}
+        if show_inactive:
+            filters['inactive'] = '1'
+        else:
             users = users.filter(is_active=True)
         if query:
-            users = (
-                users.filter(name__icontains=query) |
-                users.filter(email__icontains=query) |
-                users.filter(department__icontains=query)
-            ).distinct()
+            users = users.filter(search_filter('user', query))
+            filters['q'] = query
+        if sort_by in self.SORT_FIELDS:
+            order_field = self.SORT_FIELDS[sort_by]
+            users = users.order_by(f'-{order_field}' if sort_dir == 'desc' else order_field, 'name')
         return render(request, 'core/user_list.html', {
             'users': users,
             'query': query,
             'show_inactive': show_inactive,
+            'sort_by': sort_by,
+            'sort_dir': sort_dir,
+            # Kept on the sort links so sorting doesn't drop the filters
+            'filter_params': urlencode(filters) + '&' if filters else '',
         })
 
 
@@ -110,7 +159,7 @@ class UserCreateView(View):
 
 class UserDetailView(View):
     def get(self, request, pk):
-        user = get_object_or_404(SystemUser, pk=pk)
+        user = get_object_or_404(SystemUser.objects.with_workload(), pk=pk)
         # Tasks assigned to this user
         assigned_tasks = (
             OnboardingTask.objects
@@ -119,13 +168,9 @@ class UserDetailView(View):
             .select_related('onboarding')
             .order_by('deadline')[:10]
         )
-        completed_count = OnboardingTask.objects.filter(
-            assignee=user, status=TaskStatus.COMPLETED
-        ).count()
         return render(request, 'core/user_detail.html', {
             'user_obj': user,
             'assigned_tasks': assigned_tasks,
-            'completed_count': completed_count,
         })
 
 
@@ -160,31 +205,94 @@ class UserToggleActiveView(View):
         user.save(update_fields=['is_active'])
         status = 'aktiveret' if user.is_active else 'deaktiveret'
         messages.success(request, f'Brugeren "{user.name}" er {status}.')
+        if not user.is_active:
+            work = get_open_work(user)
+            if work.tasks or work.template_entities:
+                messages.warning(request, 'Brugeren har stadig åbne opgaver. Vælg hvem de skal overdrages til.')
+                return redirect('core:user_reassign', pk=user.pk)
         return redirect('core:user_detail', pk=user.pk)
 
 
-class UserDeleteView(View):
+def _reassign_form(user, work, data=None):
+    from apps.entities.models import Category
+    categories = Category.objects.filter(pk__in=work.category_ids).order_by('name')
+    return ReassignWorkForm(data, user=user, categories=categories)
+
+
+def _reassigned_message(reassignments):
+    tasks = sum(r.tasks for r in reassignments)
+    defaults = sum(r.template_entities for r in reassignments)
+    names = ', '.join(r.assignee.name for r in reassignments)
+    return f'{tasks} opgave(r) og {defaults} skabelonstandard(er) er overdraget til {names}.'
+
+
+class UserReassignView(View):
     def get(self, request, pk):
         user = get_object_or_404(SystemUser, pk=pk)
-        # Count related data for the confirmation page
-        active_tasks_count = OnboardingTask.objects.filter(
-            assignee=user
-        ).exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED]).count()
-        all_tasks_count = OnboardingTask.objects.filter(assignee=user).count()
-        created_onboardings_count = OnboardingProcess.objects.filter(created_by=user).count()
-        return render(request, 'core/user_confirm_delete.html', {
+        work = get_open_work(user)
+        return render(request, 'core/user_reassign.html', {
             'user_obj': user,
-            'active_tasks_count': active_tasks_count,
-            'all_tasks_count': all_tasks_count,
-            'created_onboardings_count': created_onboardings_count,
+            'work': work,
+            'form': _reassign_form(user, work),
         })
 
     def post(self, request, pk):
         user = get_object_or_404(SystemUser, pk=pk)
+        work = get_open_work(user)
+        form = _reassign_form(user, work, request.POST)
+        if form.is_valid():
+            reassignments = reassign_user_work(
+                user, form.cleaned_data['assignee'], form.category_assignees(),
+            )
+            if reassignments:
+                messages.success(request, _reassigned_message(reassignments))
+            else:
+                messages.info(request, 'Ingen opgaver blev overdraget.')
+            return redirect('core:user_detail', pk=user.pk)
+        return render(request, 'core/user_reassign.html', {
+            'user_obj': user,
+            'work': work,
+            'form': form,
+        })
+
+
+class UserDeleteView(View):
+    def get(self, request, pk):
+        user, work = self._get_user(pk)
+        return self._confirm(request, user, work, _reassign_form(user, work))
+
+    def post(self, request, pk):
+        user, work = self._get_user(pk)
+        form = _reassign_form(user, work, request.POST)
+        if not form.is_valid():
+            return self._confirm(request, user, work, form)
         name = user.name
+        # Open work is handed over before the delete nulls the references;
+        # both commit together or not at all
+        with transaction.atomic():
+            reassignments = reassign_user_work(
+                user, form.cleaned_data['assignee'], form.category_assignees(),
+            )
+            user.delete()
+        if reassignments:
+            messages.success(request, _reassigned_message(reassignments))
         # Clear session if deleting the current user
-        if request.session.get('current_user_id') == user.pk:
+        if request.session.get('current_user_id') == pk:
             request.session.pop('current_user_id', None)
-        user.delete()
         messages.success(request, f'Brugeren "{name}" er slettet.')
         return redirect('core:user_list')
+
+    def _get_user(self, pk):
+        # Related data for the confirmation page is counted in the same query
+        user = get_object_or_404(SystemUser.objects.with_workload(), pk=pk)
+        return user, get_open_work(user)
+
+    def _confirm(self, request, user, work, form):
+        return render(request, 'core/user_confirm_delete.html', {
+            'user_obj': user,
+            'active_tasks_count': user.open_task_count,
+            'all_tasks_count': user.task_count,
+            'created_onboardings_count': user.onboarding_count,
+            'template_defaults_count': work.template_entities,
+            'form': form,
+        })
@@ -4,6 +4,7 @@ from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
+from apps.search.services import search_filter
 from .forms import CustomFieldFormSet, EntityForm
 from .models import Category, Entity
 
@@ -13,8 +14,7 @@ class EntityListView(View):
         query = request.GET.get('q', '')
         entities = Entity.objects.select_related('category').all()
         if query:
-            entities = entities.filter(name__icontains=query) | entities.filter(category__name__icontains=query)
-            entities = entities.distinct()
+            entities = entities.filter(search_filter('entity', query))
         return render(request, 'entities/entity_list.html', {
             'entities': entities,
             'query': query,
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Notification
+from .models import EmailOutbox, Notification
+from .services import redrive_dead_letters
 
 
 @admin.register(Notification)
@@ -7,3 +8,17 @@ class NotificationAdmin(admin.ModelAdmin):
     list_display = ['recipient', 'title', 'notification_type', 'is_read', 'created_at']
     list_filter = ['notification_type', 'is_read']
     search_fields = ['title', 'message']
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ['to_email', 'subject', 'digest', 'created_at', 'sent_at', 'attempts', 'next_attempt_at', 'dead_at']
+    list_filter = ['digest', 'sent_at', 'dead_at']
+    search_fields = ['to_email', 'subject']
+    readonly_fields = ['created_at']
+    actions = ['redrive']
+
+    @admin.action(description='Send opgivne emails igen')
+    def redrive(self, request, queryset):
+        count = redrive_dead_letters(queryset)
+        self.message_user(request, f'{count} emails er sat i kø igen.')
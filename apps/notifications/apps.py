@@ -5,3 +5,7 @@ class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.notifications'
     verbose_name = 'Notifikationer'
+
+    def ready(self):
+        from .messages import compile_message_templates
+        compile_message_templates()
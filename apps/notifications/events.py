@@ -0,0 +1,76 @@
+"""In-process fan-out of notification events to connected SSE streams.
+
+Sync code (views, services) publishes; each open stream owns an asyncio
+queue on the ASGI event loop. Only streams served by this process are
+reached — the stream's heartbeat re-reads the counter to pick up changes
+made elsewhere (management commands, other workers).
+"""
+import asyncio
+import threading
+
+STREAM_QUEUE_SIZE = 100
+
+
+class EventBroker:
+    """Fan-out of events to asyncio queues, keyed by channel (a user, a process)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # key -> {queue: loop}
+
+    def subscribe(self, key):
+        queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(key, {})[queue] = asyncio.get_running_loop()
+        return queue
+
+    def unsubscribe(self, key, queue):
+        with self._lock:
+            queues = self._subscribers.get(key, {})
+            queues.pop(queue, None)
+            if not queues:
+                self._subscribers.pop(key, None)
+
+    def has_subscribers(self, key):
+        return key in self._subscribers
+
+    def subscribed(self, keys):
+        return [key for key in keys if key in self._subscribers]
+
+    def publish(self, key, event, data):
+        with self._lock:
+            targets = list(self._subscribers.get(key, {}).items())
+        for queue, loop in targets:
+            loop.call_soon_threadsafe(_offer, queue, (event, data))
+
+
+def _offer(queue, item):
+    # A stalled client must not grow memory; it resyncs on the next heartbeat
+    try:
+        queue.put_nowait(item)
+    except asyncio.QueueFull:
+        pass
+
+
+broker = EventBroker()
+
+
+def publish_unread_counts(user_ids):
+    """Push the current unread count to every connected stream of these users."""
+    from apps.core.models import SystemUser
+
+    user_ids = broker.subscribed(user_ids)
+    if not user_ids:
+        return
+    for user_id, count in SystemUser.objects.filter(pk__in=user_ids).values_list('pk', 'unread_count'):
+        broker.publish(user_id, 'unread', count)
+
+
+def publish_new_notifications(notifications):
+    for notification in notifications:
+        if broker.has_subscribers(notification.recipient_id):
+            broker.publish(notification.recipient_id, 'notification', {
+                'id': notification.pk,
+                'title': notification.title,
+                'type': notification.notification_type,
+            })
@@ -0,0 +1,65 @@
+import gzip
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count
+
+from apps.notifications.services import (
+    PURGE_CHUNK_SIZE, expired_notifications, get_retention_policy, purge_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete notifications past their retention period, in small chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=PURGE_CHUNK_SIZE)
+        parser.add_argument('--pause', type=float, default=0.1, help='Seconds to wait between chunks')
+        parser.add_argument('--archive', metavar='FILE',
+                            help='Append purged rows as JSON lines to FILE (gzip if it ends in .gz)')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be purged')
+
+    def handle(self, *args, **options):
+        policy = ', '.join(f'{key}={days}d' for key, days in sorted(get_retention_policy().items()))
+        self.stdout.write(f'Retention for read notifications: {policy}')
+
+        if options['dry_run']:
+            counts = (
+                expired_notifications().order_by()
+                .values_list('notification_type').annotate(n=Count('pk'))
+            )
+            for notification_type, n in counts:
+                self.stdout.write(f'  {notification_type}: {n}')
+            self.stdout.write(self.style.SUCCESS(f'{sum(n for _, n in counts)} notifications would be purged.'))
+            return
+
+        archive_file = None
+        if options['archive']:
+            opener = gzip.open if options['archive'].endswith('.gz') else open
+            archive_file = opener(options['archive'], 'at', encoding='utf-8')
+
+        def archive(rows):
+            for row in rows:
+                archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+            archive_file.flush()
+
+        started = time.monotonic()
+        try:
+            stats = purge_notifications(
+                chunk_size=options['chunk_size'], pause=options['pause'],
+                archive=archive if archive_file else None,
+            )
+        finally:
+            if archive_file:
+                archive_file.close()
+        elapsed = time.monotonic() - started
+
+        for notification_type, n in sorted(stats['by_type'].items()):
+            self.stdout.write(f'  {notification_type}: {n}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {stats["deleted"]} notifications in {stats["chunks"]} chunks in {elapsed:.2f}s '
+            f'(write lock held {stats["lock_seconds"]:.3f}s in total, '
+            f'{stats["max_lock_seconds"]:.3f}s at most).'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.models import EmailOutbox
+from apps.notifications.services import redrive_dead_letters
+
+
+class Command(BaseCommand):
+    help = 'Re-queue dead-lettered outbox emails for another round of delivery attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--id', type=int, action='append', dest='ids', help='Only this entry (repeatable)')
+        parser.add_argument('--to', help='Only entries for this recipient address')
+        parser.add_argument('--dry-run', action='store_true', help='Only list what would be re-queued')
+
+    def handle(self, *args, **options):
+        entries = EmailOutbox.objects.filter(dead_at__isnull=False, sent_at__isnull=True)
+        if options['ids']:
+            entries = entries.filter(pk__in=options['ids'])
+        if options['to']:
+            entries = entries.filter(to_email__iexact=options['to'])
+
+        if options['dry_run']:
+            for entry in entries.order_by('pk'):
+                self.stdout.write(f'  #{entry.pk} {entry.to_email}: {entry.subject} ({entry.last_error})')
+            self.stdout.write(self.style.SUCCESS(f'{entries.count()} dead letters would be re-queued.'))
+            return
+
+        count = redrive_dead_letters(entries)
+        self.stdout.write(self.style.SUCCESS(f'Re-queued {count} dead letters.'))
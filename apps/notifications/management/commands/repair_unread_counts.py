@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.notifications.services import repair_unread_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute SystemUser.unread_count where it has drifted from the notifications'
+
+    def handle(self, *args, **options):
+        fixed = repair_unread_counts()
+        self.stdout.write(self.style.SUCCESS(f'Repaired unread counters for {fixed} users.'))
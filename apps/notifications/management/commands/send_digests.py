@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.core.models import EmailDelivery
+from apps.notifications.services import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Send digest emails for users who receive notifications hourly or daily'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'window', choices=[EmailDelivery.HOURLY, EmailDelivery.DAILY],
+            help='Which digest window to flush',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        digests, entries, failed = send_digests(options['window'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {digests} {options["window"]} digests covering {entries} notifications '
+            f'({failed} failed) in {elapsed:.2f}s.'
+        ))
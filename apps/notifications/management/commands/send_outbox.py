@@ -0,0 +1,42 @@
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from apps.notifications.models import EmailOutbox
+from apps.notifications.services import OUTBOX_BATCH_SIZE, send_outbox_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        # One connection object for the whole run; it is reopened per batch
+        connection = get_connection()
+        total_sent = total_failed = 0
+        started = time.monotonic()
+        while True:
+            sent, failed = send_outbox_batch(options['batch_size'], connection=connection)
+            total_sent += sent
+            total_failed += failed
+            # Keep draining while full batches go out cleanly; failures wait for the next run
+            if sent == options['batch_size']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} emails ({total_failed} failed) in {elapsed:.2f}s.'
+        ))
+        dead = EmailOutbox.objects.filter(dead_at__isnull=False, sent_at__isnull=True).count()
+        if dead:
+            self.stdout.write(self.style.WARNING(
+                f'{dead} emails are dead-lettered; re-queue them with redrive_outbox.'
+            ))
@@ -0,0 +1,55 @@
+"""Notification message templates, one HTML and one text variant per type.
+
+The templates under notifications/messages/ are compiled once when the app
+is ready and rendered with a plain Context, so batch senders pay only for
+the render itself. Types that share a message map to one template.
+"""
+from django.conf import settings
+from django.template import Context
+from django.template.loader import get_template
+
+from .models import NotificationType
+
+# Notification rules send the same message whatever the status
+SHARED_TEMPLATES = {
+    NotificationType.TASK_READY: 'task_rule',
+    NotificationType.TASK_ASSIGNED: 'task_rule',
+    NotificationType.TASK_COMPLETED: 'task_rule',
+}
+
+# notification_type -> (html Template, text Template)
+_compiled = {}
+
+
+def template_name(notification_type, extension):
+    name = SHARED_TEMPLATES.get(notification_type, notification_type)
+    return f'notifications/messages/{name}.{extension}'
+
+
+def compile_message_templates():
+    by_name = {}
+    for notification_type in NotificationType.values:
+        html_name = template_name(notification_type, 'html')
+        if html_name not in by_name:
+            by_name[html_name] = (
+                get_template(html_name).template,
+                get_template(template_name(notification_type, 'txt')).template,
+            )
+        _compiled[notification_type] = by_name[html_name]
+
+
+def render_message(notification_type, context):
+    """Return ``(html, text)`` for a notification of ``notification_type``.
+
+    The HTML variant is shown in-app and sent as the email alternative; the
+    text variant is the email body. Links in ``context`` are site-relative;
+    the text variant prefixes them with settings.SITE_URL.
+    """
+    if not _compiled:
+        compile_message_templates()
+    html, text = _compiled[notification_type]
+    context = {'site_url': getattr(settings, 'SITE_URL', ''), **context}
+    return (
+        html.render(Context(context)).strip(),
+        text.render(Context(context, autoescape=False)).strip(),
+    )
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('to_email', models.EmailField(max_length=254, verbose_name='Modtager')),
+                ('subject', models.CharField(max_length=300, verbose_name='Emne')),
+                ('body', models.TextField(verbose_name='Indhold')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sendt')),
+                ('last_error', models.TextField(blank=True, verbose_name='Seneste fejl')),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_entries', to='notifications.notification')),
+            ],
+            options={
+                'verbose_name': 'Udgående email',
+                'verbose_name_plural': 'Udgående emails',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['sent_at', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
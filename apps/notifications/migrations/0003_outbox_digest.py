@@ -0,0 +1,37 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_email_outbox'),
+        ('onboarding', '0005_onboardingtask_assignee_overridden'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='outbox_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='digest',
+            field=models.CharField(blank=True, default='', max_length=20, verbose_name='Opsummering'),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='related_onboarding',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='onboarding.onboardingprocess'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['digest', 'sent_at', 'id'], name='outbox_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['digest', 'sent_at', 'to_email'], name='outbox_digest_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_counts(apps, schema_editor):
+    SystemUser = apps.get_model('core', 'SystemUser')
+    Notification = apps.get_model('notifications', 'Notification')
+    unread = (
+        Notification.objects
+        .filter(recipient=OuterRef('pk'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(c=Count('pk'))
+        .values('c')
+    )
+    SystemUser.objects.update(unread_count=Coalesce(Subquery(unread), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_systemuser_unread_count'),
+        ('notifications', '0003_outbox_digest'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
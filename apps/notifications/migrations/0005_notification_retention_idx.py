@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_systemuser_unread_count'),
+        ('notifications', '0004_backfill_unread_count'),
+        ('onboarding', '0006_process_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'is_read', 'created_at'], name='notification_retention_idx'),
+        ),
+    ]
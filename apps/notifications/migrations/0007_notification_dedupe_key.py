@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_systemuser_unread_count'),
+        ('notifications', '0006_notification_inbox_idx'),
+        ('onboarding', '0006_process_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedupe_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('dedupe_key', ''), _negated=True), fields=('recipient', 'dedupe_key'), name='notification_dedupe_uniq'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notification_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='html_body',
+            field=models.TextField(blank=True, verbose_name='HTML-indhold'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_emailoutbox_html_body'),
+        ('onboarding', '0006_process_version'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='emailoutbox',
+            name='outbox_pending_idx',
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Forsøg'),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='dead_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Opgivet'),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, null=True, verbose_name='Næste forsøg'),
+        ),
+        migrations.AddIndex(
+            model_name='emailoutbox',
+            index=models.Index(fields=['digest', 'sent_at', 'next_attempt_at'], name='outbox_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_outbox_retries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='notification_type',
+            field=models.CharField(choices=[('task_completed', 'Opgave færdig'), ('task_assigned', 'Opgave tildelt'), ('task_ready', 'Opgave klar'), ('task_overdue', 'Opgave forsinket'), ('task_due_soon', 'Opgave har snart deadline'), ('onboarding_completed', 'Onboarding færdig')], max_length=30, verbose_name='Type'),
+        ),
+    ]
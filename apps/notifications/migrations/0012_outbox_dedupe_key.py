@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_notification_type_tasks_reassigned'),
+        ('onboarding', '0008_task_next_reminder_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='dedupe_key',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddConstraint(
+            model_name='emailoutbox',
+            constraint=models.UniqueConstraint(condition=models.Q(('dedupe_key', ''), _negated=True), fields=('to_email', 'dedupe_key'), name='outbox_dedupe_uniq'),
+        ),
+    ]
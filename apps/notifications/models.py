@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class NotificationType(models.TextChoices):
@@ -6,6 +7,8 @@ class NotificationType(models.TextChoices):
     TASK_ASSIGNED = 'task_assigned', 'Opgave tildelt'
     TASK_READY = 'task_ready', 'Opgave klar'
     TASK_OVERDUE = 'task_overdue', 'Opgave forsinket'
+    TASK_DUE_SOON = 'task_due_soon', 'Opgave har snart deadline'
+    TASKS_REASSIGNED = 'tasks_reassigned', 'Opgaver overdraget'
     ONBOARDING_COMPLETED = 'onboarding_completed', 'Onboarding færdig'
 
 
@@ -30,12 +33,77 @@ class Notification(models.Model):
     )
     is_read = models.BooleanField(default=False, verbose_name='Læst')
     email_sent = models.BooleanField(default=False)
+    # Identifies the event (rule, task, trigger, window) so repeats of it
+    # are rejected by the database; empty when the notification is not deduplicated
+    dedupe_key = models.CharField(max_length=200, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'dedupe_key'], condition=~models.Q(dedupe_key=''),
+                name='notification_dedupe_uniq',
+            ),
+        ]
+        indexes = [
+            # The inbox pages through one read state at a time in (created_at, id) order
+            models.Index(fields=['recipient', 'is_read', 'created_at', 'id'], name='notification_inbox_idx'),
+            # purge_notifications selects by type, read state and age
+            models.Index(fields=['notification_type', 'is_read', 'created_at'], name='notification_retention_idx'),
+        ]
         verbose_name = 'Notifikation'
         verbose_name_plural = 'Notifikationer'
 
     def __str__(self):
         return f"{self.recipient}: {self.title}"
+
+
+class EmailOutbox(models.Model):
+    """Email waiting to be delivered by the send_outbox worker.
+
+    Rows are written in the same transaction as their Notification, so a
+    rolled-back request never sends mail and a committed one never loses it.
+    """
+    notification = models.ForeignKey(
+        Notification, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='outbox_entries'
+    )
+    to_email = models.EmailField(verbose_name='Modtager')
+    # Empty for immediate delivery, otherwise the digest window it waits for
+    digest = models.CharField(max_length=20, blank=True, default='', verbose_name='Opsummering')
+    related_onboarding = models.ForeignKey(
+        'onboarding.OnboardingProcess', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='+'
+    )
+    subject = models.CharField(max_length=300, verbose_name='Emne')
+    body = models.TextField(verbose_name='Indhold')
+    html_body = models.TextField(blank=True, verbose_name='HTML-indhold')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Sendt')
+    last_error = models.TextField(blank=True, verbose_name='Seneste fejl')
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name='Forsøg')
+    # When the worker may try again; cleared when the entry is dead-lettered
+    next_attempt_at = models.DateTimeField(null=True, blank=True, default=timezone.now, verbose_name='Næste forsøg')
+    dead_at = models.DateTimeField(null=True, blank=True, verbose_name='Opgivet')
+    # The notification's dedupe_key; also set for email-only notifications,
+    # which have no Notification row to be deduplicated by
+    dedupe_key = models.CharField(max_length=200, blank=True, default='', editable=False)
+
+    class Meta:
+        ordering = ['created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['to_email', 'dedupe_key'], condition=~models.Q(dedupe_key=''),
+                name='outbox_dedupe_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['digest', 'sent_at', 'next_attempt_at'], name='outbox_pending_idx'),
+            models.Index(fields=['digest', 'sent_at', 'to_email'], name='outbox_digest_idx'),
+        ]
+        verbose_name = 'Udgående email'
+        verbose_name_plural = 'Udgående emails'
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject}"
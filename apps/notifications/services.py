@@ -1,43 +1,548 @@
-from django.core.mail import send_mail
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import partial
+from itertools import groupby
+
 from django.conf import settings
+from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .events import publish_new_notifications, publish_unread_counts
+from .models import EmailOutbox, Notification, NotificationType
+
+logger = logging.getLogger(__name__)
 
-from .models import Notification, NotificationType
+OUTBOX_BATCH_SIZE = 100
+# Ids per UPDATE when marking delivered entries, well under SQLite's variable limit
+OUTBOX_MARK_CHUNK_SIZE = 500
+# Failed emails are retried after 1, 2, 4, ... minutes (capped) and
+# dead-lettered after OUTBOX_MAX_ATTEMPTS; both can be set in settings
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE = timedelta(minutes=1)
+OUTBOX_RETRY_MAX = timedelta(hours=6)
 
 
 def send_notification(recipient, notification_type, title, message,
                       related_onboarding=None, related_task=None,
-                      send_email=True, send_in_app=True):
-    """Central notification dispatch function."""
-    notification = None
-
-    if send_in_app:
-        notification = Notification.objects.create(
-            recipient=recipient,
-            notification_type=notification_type,
-            title=title,
-            message=message,
-            related_onboarding=related_onboarding,
-            related_task=related_task,
+                      send_email=True, send_in_app=True, dedupe_key='', text=''):
+    """Central notification dispatch function.
+
+    Email is not sent here; it is queued in the outbox within the same
+    transaction and delivered by the send_outbox worker. ``message`` is HTML;
+    ``text`` is the plain email body, by default ``message`` without tags.
+    A notification whose ``dedupe_key`` the recipient already has is
+    dropped, email too, and None is returned. An email whose key was
+    already queued for the address is dropped as well, so the key also
+    holds for email-only notifications.
+    """
+    return send_notifications([{
+        'recipient': recipient,
+        'notification_type': notification_type,
+        'title': title,
+        'message': message,
+        'text': text,
+        'related_onboarding': related_onboarding,
+        'related_task': related_task,
+        'send_email': send_email,
+        'send_in_app': send_in_app,
+        'dedupe_key': dedupe_key,
+    }])[0]
+
+
+def send_notifications(items):
+    """Dispatch many notifications at once.
+
+    ``items`` are dicts holding the keyword arguments of send_notification.
+    In-app notifications and queued emails are each written with one bulk
+    insert. Returns the created notifications, None where send_in_app is off
+    or the item was a duplicate.
+    """
+    notifications = [
+        Notification(
+            recipient=item['recipient'],
+            notification_type=item['notification_type'],
+            title=item['title'],
+            message=item['message'],
+            related_onboarding=item.get('related_onboarding'),
+            related_task=item.get('related_task'),
+            dedupe_key=item.get('dedupe_key', ''),
+        ) if item.get('send_in_app', True) else None
+        for item in items
+    ]
+
+    with transaction.atomic():
+        created = Notification.objects.bulk_create(
+            [n for n in notifications if n is not None and not n.dedupe_key]
         )
+        keyed = [n for n in notifications if n is not None and n.dedupe_key]
+        if keyed:
+            created += _insert_deduplicated(keyed)
+        # Duplicates were left unsaved; they get no email and are returned as None
+        kept = [n is None or n.pk is not None for n in notifications]
+        notifications = [n if keep else None for n, keep in zip(notifications, kept)]
+        adjust_unread_counts(Counter(n.recipient_id for n in created))
+        transaction.on_commit(partial(publish_new_notifications, created))
+        emails = [
+            EmailOutbox(
+                notification=notification,
+                to_email=item['recipient'].email,
+                digest=_digest_window(item['recipient']),
+                related_onboarding=item.get('related_onboarding'),
+                subject=item['title'],
+                body=item.get('text') or strip_tags(item['message']),
+                html_body=item['message'],
+                dedupe_key=item.get('dedupe_key', ''),
+            )
+            for item, notification, keep in zip(items, notifications, kept)
+            if keep and item.get('send_email', True) and item['recipient'].email
+        ]
+        EmailOutbox.objects.bulk_create([e for e in emails if not e.dedupe_key])
+        # outbox_dedupe_uniq drops emails already queued under the same key
+        EmailOutbox.objects.bulk_create([e for e in emails if e.dedupe_key], ignore_conflicts=True)
+
+    return notifications
+
+
+def _insert_deduplicated(notifications):
+    """Insert notifications carrying a dedupe_key, letting the unique
+    constraint drop the ones a recipient already has.
+
+    INSERT OR IGNORE returns no ids, so the surviving rows are read back in
+    one query and their ids set on the instances; duplicates keep pk=None.
+    Returns the inserted instances.
+    """
+    started = timezone.now()
+    Notification.objects.bulk_create(notifications, ignore_conflicts=True)
+    inserted = {
+        (recipient_id, key): pk
+        for pk, recipient_id, key in Notification.objects.filter(
+            dedupe_key__in={n.dedupe_key for n in notifications}, created_at__gte=started,
+        ).values_list('pk', 'recipient_id', 'dedupe_key')
+    }
+    created = []
+    for notification in notifications:
+        # A key repeated within the batch is claimed by its first instance
+        pk = inserted.pop((notification.recipient_id, notification.dedupe_key), None)
+        if pk is not None:
+            notification.pk = pk
+            notification._state.adding = False
+            notification._state.db = Notification.objects.db
+            created.append(notification)
+    return created
+
+
+def _digest_window(recipient):
+    from apps.core.models import EmailDelivery
+    delivery = getattr(recipient, 'email_delivery', EmailDelivery.IMMEDIATE)
+    return '' if delivery == EmailDelivery.IMMEDIATE else delivery
+
+
+def send_outbox_batch(batch_size=OUTBOX_BATCH_SIZE, connection=None):
+    """Deliver up to batch_size due outbox emails over one connection.
+
+    Sent entries and their notifications are marked in bulk. A failed entry
+    is rescheduled with exponential backoff, or dead-lettered once it has
+    used up its attempts. Returns (sent, failed).
+    """
+    now = timezone.now()
+    entries = list(
+        EmailOutbox.objects
+        .filter(digest='', sent_at__isnull=True, next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'pk')[:batch_size]
+    )
+    if not entries:
+        return 0, 0
+
+    connection = connection or get_connection()
+    sent_ids = []
+    errors = {}
+    try:
+        with connection:
+            for entry in entries:
+                email = EmailMultiAlternatives(
+                    subject=entry.subject,
+                    body=entry.body,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[entry.to_email],
+                    connection=connection,
+                )
+                if entry.html_body:
+                    email.attach_alternative(entry.html_body, 'text/html')
+                try:
+                    connection.send_messages([email])
+                except Exception as exc:
+                    logger.warning('Outbox email %s to %s failed: %s', entry.pk, entry.to_email, exc)
+                    errors[entry.pk] = str(exc)
+                else:
+                    sent_ids.append(entry.pk)
+    except Exception as exc:
+        # The relay could not be reached (or dropped us); the rest of the batch failed with it
+        logger.warning('Outbox connection failed: %s', exc)
+        for entry in entries:
+            if entry.pk not in errors and entry.pk not in sent_ids:
+                errors[entry.pk] = str(exc)
+
+    with transaction.atomic():
+        if sent_ids:
+            sent = set(sent_ids)
+            _mark_sent([e for e in entries if e.pk in sent])
+        if errors:
+            failed = [e for e in entries if e.pk in errors]
+            for entry in failed:
+                _schedule_retry(entry, errors[entry.pk], now)
+            EmailOutbox.objects.bulk_update(failed, ['attempts', 'next_attempt_at', 'dead_at', 'last_error'])
+
+    return len(sent_ids), len(errors)
 
-    if send_email and recipient.email:
-        try:
-            send_mail(
-                subject=title,
-                message=message,
+
+def _mark_sent(entries):
+    """Mark delivered outbox entries and their notifications as sent."""
+    now = timezone.now()
+    with transaction.atomic():
+        for start in range(0, len(entries), OUTBOX_MARK_CHUNK_SIZE):
+            chunk = entries[start:start + OUTBOX_MARK_CHUNK_SIZE]
+            EmailOutbox.objects.filter(pk__in=[e.pk for e in chunk]).update(sent_at=now, last_error='')
+            Notification.objects.filter(
+                pk__in=[e.notification_id for e in chunk if e.notification_id],
+            ).update(email_sent=True)
+
+
+def _schedule_retry(entry, error, now):
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', OUTBOX_MAX_ATTEMPTS)
+    entry.attempts += 1
+    entry.last_error = error
+    if entry.attempts >= max_attempts:
+        entry.next_attempt_at = None
+        entry.dead_at = now
+        logger.error('Outbox email %s to %s dead-lettered after %d attempts',
+                     entry.pk, entry.to_email, entry.attempts)
+    else:
+        base = getattr(settings, 'OUTBOX_RETRY_BASE', OUTBOX_RETRY_BASE)
+        cap = getattr(settings, 'OUTBOX_RETRY_MAX', OUTBOX_RETRY_MAX)
+        entry.next_attempt_at = now + min(base * 2 ** (entry.attempts - 1), cap)
+
+
+def redrive_dead_letters(queryset=None):
+    """Put dead-lettered emails back in the queue with fresh attempts.
+
+    Returns the number of entries re-queued.
+    """
+    if queryset is None:
+        queryset = EmailOutbox.objects.all()
+    return queryset.filter(dead_at__isnull=False, sent_at__isnull=True).update(
+        dead_at=None, attempts=0, next_attempt_at=timezone.now(),
+    )
+
+
+def send_digests(window, connection=None):
+    """Send one summary email per recipient for all pending mail in a digest window.
+
+    Recipients are walked in order, their due entries rendered grouped by
+    onboarding and delivered over one connection. Each recipient's entries
+    are marked sent right after their digest goes out, so an interrupted
+    run resends nothing. A failed digest is retried with the outbox's
+    backoff and dead-lettered like any other email. Returns
+    (digests_sent, entries_included, failed).
+    """
+    from apps.core.models import EmailDelivery
+
+    now = timezone.now()
+    due = EmailOutbox.objects.filter(digest=window, sent_at__isnull=True, next_attempt_at__lte=now)
+    label = EmailDelivery(window).label.lower()
+    connection = connection or get_connection()
+    digests_sent = entries_sent = failed = 0
+    last_email = ''
+    with connection:
+        while True:
+            to_email = (
+                due.filter(to_email__gt=last_email)
+                .order_by('to_email')
+                .values_list('to_email', flat=True)
+                .first()
+            )
+            if to_email is None:
+                break
+            last_email = to_email
+            group = list(
+                due.filter(to_email=to_email)
+                .select_related('related_onboarding')
+                .order_by('related_onboarding_id', 'pk')
+            )
+            sections = [
+                {'onboarding': onboarding, 'entries': list(items)}
+                for onboarding, items in groupby(group, key=lambda e: e.related_onboarding)
+            ]
+            context = {'entries': group, 'sections': sections, 'window_label': label}
+            email = EmailMessage(
+                subject=f'Opsummering: {len(group)} notifikationer',
+                body=strip_tags(render_to_string('notifications/email/digest.txt', context)),
                 from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient.email],
-                fail_silently=True,
+                to=[to_email],
+                connection=connection,
             )
-            if notification:
-                notification.email_sent = True
-                notification.save(update_fields=['email_sent'])
-        except Exception:
-            pass
+            try:
+                connection.send_messages([email])
+            except Exception as exc:
+                logger.warning('Digest to %s failed: %s', to_email, exc)
+                for entry in group:
+                    _schedule_retry(entry, str(exc), now)
+                EmailOutbox.objects.bulk_update(
+                    group, ['attempts', 'next_attempt_at', 'dead_at', 'last_error'],
+                    batch_size=OUTBOX_MARK_CHUNK_SIZE,
+                )
+                failed += 1
+            else:
+                _mark_sent(group)
+                entries_sent += len(group)
+                digests_sent += 1
+
+    return digests_sent, entries_sent, failed
+
+
+# ---------------------------------------------------------------------------
+# Unread counter — SystemUser.unread_count mirrors unread Notification rows
+# ---------------------------------------------------------------------------
+
+def adjust_unread_counts(deltas):
+    """Apply {user_id: delta} to SystemUser.unread_count in one UPDATE."""
+    from apps.core.models import SystemUser
+
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    change = Case(
+        *[When(pk=user_id, then=Value(delta)) for user_id, delta in deltas.items()],
+        default=Value(0),
+    )
+    SystemUser.objects.filter(pk__in=deltas).update(
+        unread_count=Greatest(F('unread_count') + change, Value(0)),
+    )
+    transaction.on_commit(partial(publish_unread_counts, list(deltas)))
+
+
+def mark_read(user, notification):
+    with transaction.atomic():
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            adjust_unread_counts({user.pk: -1})
+
 
-    return notification
+def mark_all_read(user):
+    with transaction.atomic():
+        updated = Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+        adjust_unread_counts({user.pk: -updated})
+
+
+def delete_notification(user, pk):
+    with transaction.atomic():
+        unread = Notification.objects.filter(pk=pk, recipient=user, is_read=False).delete()[0]
+        Notification.objects.filter(pk=pk, recipient=user).delete()
+        adjust_unread_counts({user.pk: -unread})
+
+
+def delete_all_read(user):
+    # Chunked so a user with a long history does not hold the write lock
+    return purge_notifications(Notification.objects.filter(recipient=user, is_read=True))
+
+
+def repair_unread_counts(user_ids=None):
+    """Recompute drifted unread counters from the Notification table.
+
+    Returns the number of users whose counter was corrected.
+    """
+    from apps.core.models import SystemUser
+
+    actual = (
+        Notification.objects
+        .filter(recipient=OuterRef('pk'), is_read=False)
+        .order_by()
+        .values('recipient')
+        .annotate(c=Count('pk'))
+        .values('c')
+    )
+    users = SystemUser.objects.annotate(actual_unread=Coalesce(Subquery(actual), Value(0)))
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    drifted = list(users.filter(~Q(unread_count=F('actual_unread'))).values_list('pk', flat=True))
+    if drifted:
+        SystemUser.objects.filter(pk__in=drifted).update(
+            unread_count=Coalesce(Subquery(actual), Value(0)),
+        )
+        transaction.on_commit(partial(publish_unread_counts, drifted))
+    return len(drifted)
+
+
+def render_unread_badge(count):
+    if count > 0:
+        return (
+            f'<span class="absolute -top-1 -right-1 bg-red-500 text-white text-xs '
+            f'rounded-full w-5 h-5 flex items-center justify-center badge-pulse">'
+            f'{count}</span>'
+        )
+    return ''
+
+
+# ---------------------------------------------------------------------------
+# Inbox — keyset pagination over notification_inbox_idx
+# ---------------------------------------------------------------------------
+
+INBOX_PAGE_SIZE = 25
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_inbox_cursor(notification):
+    micros = (notification.created_at - _EPOCH) // timedelta(microseconds=1)
+    return f'{micros}-{notification.pk}'
+
+
+def decode_inbox_cursor(value):
+    """Return ``(created_at, pk)`` from a cursor string, or None if malformed."""
+    try:
+        micros, pk = value.split('-')
+        return _EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def get_inbox_page(user, newest_first=True, read=None, notification_type='',
+                   onboarding_id=None, cursor=None, page_size=INBOX_PAGE_SIZE):
+    """One page of ``user``'s notifications after ``cursor``.
+
+    Each read state is a single ordered range scan of notification_inbox_idx
+    starting at the cursor; without a read filter the unread and read scans
+    are merged here. Either way a deep page costs the same as the first.
+    Returns ``(notifications, next_cursor, has_read)`` where ``has_read`` is
+    None when read notifications were not scanned.
+    """
+    queryset = Notification.objects.filter(recipient=user)
+    if notification_type:
+        queryset = queryset.filter(notification_type=notification_type)
+    if onboarding_id:
+        queryset = queryset.filter(related_onboarding_id=onboarding_id)
+    position = decode_inbox_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        if newest_first:
+            queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, pk__gte=pk)
+        else:
+            queryset = queryset.filter(created_at__gte=created_at).exclude(created_at=created_at, pk__lte=pk)
+    ordering = ('-created_at', '-id') if newest_first else ('created_at', 'id')
+    queryset = queryset.select_related('related_onboarding', 'related_task').order_by(*ordering)
+
+    has_read = None
+    rows = []
+    for state in ([read] if read is not None else [False, True]):
+        # is_read=True compiles to a bare boolean column, which SQLite cannot
+        # match against an index column; IN (...) is a proper equality term
+        scanned = list(queryset.filter(is_read__in=[state])[:page_size + 1])
+        if state:
+            has_read = bool(scanned)
+        rows.extend(scanned)
+    rows.sort(key=lambda n: (n.created_at, n.pk), reverse=newest_first)
+
+    page = rows[:page_size]
+    next_cursor = encode_inbox_cursor(page[-1]) if len(rows) > page_size else None
+    return page, next_cursor, has_read
 
 
 def get_unread_count(user):
     """Get unread notification count for a user."""
-    return Notification.objects.filter(recipient=user, is_read=False).count()
+    return user.unread_count
+
+
+# ---------------------------------------------------------------------------
+# Retention — expired notifications are purged in short, separate transactions
+# ---------------------------------------------------------------------------
+
+PURGE_CHUNK_SIZE = 500
+
+# Days a read notification is kept; settings.NOTIFICATION_RETENTION_DAYS
+# overrides individual types
+NOTIFICATION_RETENTION_DAYS = {
+    NotificationType.TASK_READY: 90,
+    NotificationType.TASK_ASSIGNED: 90,
+    NotificationType.TASK_COMPLETED: 90,
+    NotificationType.TASK_OVERDUE: 180,
+    NotificationType.TASK_DUE_SOON: 90,
+    NotificationType.TASKS_REASSIGNED: 90,
+    NotificationType.ONBOARDING_COMPLETED: 365,
+}
+# Unread notifications are kept this long whatever their type
+UNREAD_RETENTION_DAYS = 365
+
+ARCHIVE_FIELDS = (
+    'id', 'recipient_id', 'notification_type', 'title', 'message',
+    'related_onboarding_id', 'related_task_id', 'is_read', 'created_at',
+)
+
+
+def get_retention_policy():
+    policy = dict(NOTIFICATION_RETENTION_DAYS)
+    policy.update(getattr(settings, 'NOTIFICATION_RETENTION_DAYS', {}))
+    return policy
+
+
+def expired_notifications(now=None):
+    """Notifications past the retention period for their type and read state."""
+    now = now or timezone.now()
+    unread_days = getattr(settings, 'NOTIFICATION_UNREAD_RETENTION_DAYS', UNREAD_RETENTION_DAYS)
+    expired = Q(is_read=False, created_at__lt=now - timedelta(days=unread_days))
+    for notification_type, days in get_retention_policy().items():
+        expired |= Q(
+            notification_type=notification_type, is_read=True,
+            created_at__lt=now - timedelta(days=days),
+        )
+    return Notification.objects.filter(expired)
+
+
+def purge_notifications(queryset=None, chunk_size=PURGE_CHUNK_SIZE, pause=0.0, archive=None):
+    """Delete notifications matching ``queryset`` (default: expired ones) in chunks.
+
+    Each chunk is deleted in its own transaction so the write lock is held
+    briefly, with ``pause`` seconds between chunks for interactive writes
+    to get through. ``archive`` is called with each chunk's rows (dicts of
+    ARCHIVE_FIELDS) before they are deleted. Returns the purge metrics.
+    """
+    if queryset is None:
+        queryset = expired_notifications()
+    stats = {
+        'deleted': 0, 'chunks': 0, 'lock_seconds': 0.0, 'max_lock_seconds': 0.0,
+        'by_type': Counter(),
+    }
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(pk__gt=last_id).order_by('pk').values(*ARCHIVE_FIELDS)[:chunk_size])
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        ids = [row['id'] for row in rows]
+        if archive is not None:
+            archive(rows)
+
+        started = time.monotonic()
+        with transaction.atomic():
+            # Read state may have changed since the rows were selected
+            unread = Counter(
+                Notification.objects.filter(pk__in=ids, is_read=False)
+                .values_list('recipient_id', flat=True)
+            )
+            deleted = Notification.objects.filter(pk__in=ids).delete()[1].get(Notification._meta.label, 0)
+            adjust_unread_counts({user_id: -count for user_id, count in unread.items()})
+        held = time.monotonic() - started
+
+        stats['deleted'] += deleted
+        stats['chunks'] += 1
+        stats['lock_seconds'] += held
+        stats['max_lock_seconds'] = max(stats['max_lock_seconds'], held)
+        stats['by_type'].update(row['notification_type'] for row in rows)
+        if len(rows) < chunk_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return stats
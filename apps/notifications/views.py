@@ -1,25 +1,31 @@
-from django.http import HttpResponse
+import asyncio
+import json
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views import View
 
 from apps.core.models import SystemUser
-from .models import Notification
-from .services import get_unread_count
-
+from apps.onboarding.models import OnboardingProcess
+from .events import broker
+from .models import Notification, NotificationType
+from .services import (
+    delete_all_read, delete_notification, get_inbox_page, get_unread_count, mark_all_read,
+    mark_read, render_unread_badge,
+)
 
-def _get_current_user(request):
-    user_id = request.session.get('current_user_id')
-    if user_id:
-        try:
-            return SystemUser.objects.get(id=user_id, is_active=True)
-        except SystemUser.DoesNotExist:
-            pass
-    return None
+# Seconds between keep-alives; each one also re-reads the counter to catch
+# changes published by other processes
+STREAM_HEARTBEAT = 25
 
 
 class NotificationListView(View):
+    READ_STATES = {'unread': False, 'read': True}
+
     def get(self, request):
-        user = _get_current_user(request)
+        user = request.current_user
         if not user:
             return render(request, 'notifications/notification_list.html', {
                 'notifications': [],
@@ -27,47 +33,123 @@ class NotificationListView(View):
 
         # Sorting: default newest first, allow ?sort=oldest
         sort = request.GET.get('sort', 'newest')
-        if sort == 'oldest':
-            ordering = 'created_at'
-        else:
-            ordering = '-created_at'
+        if sort != 'oldest':
             sort = 'newest'
 
-        notifications = Notification.objects.filter(recipient=user).select_related(
-            'related_onboarding', 'related_task'
-        ).order_by(ordering)[:50]
-
-        has_read = Notification.objects.filter(recipient=user, is_read=True).exists()
-
-        return render(request, 'notifications/notification_list.html', {
+        # Filters
+        state = request.GET.get('state', '')
+        if state not in self.READ_STATES:
+            state = ''
+        notification_type = request.GET.get('type', '')
+        if notification_type not in NotificationType.values:
+            notification_type = ''
+        onboarding_id = request.GET.get('onboarding', '')
+        onboarding_id = int(onboarding_id) if onboarding_id.isdigit() else None
+
+        notifications, next_cursor, has_read = get_inbox_page(
+            user,
+            newest_first=(sort == 'newest'),
+            read=self.READ_STATES.get(state),
+            notification_type=notification_type,
+            onboarding_id=onboarding_id,
+            cursor=request.GET.get('cursor'),
+        )
+
+        filters = {'state': state, 'type': notification_type, 'onboarding': onboarding_id or ''}
+        filter_query = urlencode({key: value for key, value in filters.items() if value})
+        context = {
             'notifications': notifications,
+            'next_cursor': next_cursor,
             'current_sort': sort,
-            'has_read': has_read,
+            'filters': filters,
+            'filter_query': filter_query,
+        }
+        # Infinite scroll asks for the next page only
+        if request.htmx and request.GET.get('cursor'):
+            return render(request, 'notifications/partials/_notification_page.html', context)
+
+        context.update({
+            # Unknown when only unread were scanned; offer the action anyway
+            'has_read': has_read is not False,
+            'type_choices': NotificationType.choices,
+            'onboarding_choices': OnboardingProcess.objects.filter(
+                pk__in=Notification.objects.filter(recipient=user).values('related_onboarding_id'),
+            ).order_by('new_employee_name'),
         })
+        return render(request, 'notifications/notification_list.html', context)
 
 
 class UnreadCountView(View):
     def get(self, request):
-        user = _get_current_user(request)
+        user = request.current_user
         if not user:
             return HttpResponse('')
-        count = get_unread_count(user)
-        if count > 0:
-            return HttpResponse(
-                f'<span class="absolute -top-1 -right-1 bg-red-500 text-white text-xs '
-                f'rounded-full w-5 h-5 flex items-center justify-center badge-pulse">'
-                f'{count}</span>'
-            )
-        return HttpResponse('')
+        return HttpResponse(render_unread_badge(get_unread_count(user)))
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {data}\n\n'
+
+
+class NotificationStreamView(View):
+    """Server-sent events with the unread badge and new notifications.
+
+    A ``heartbeat`` event every STREAM_HEARTBEAT seconds drives the navbar
+    counters. Only served under ASGI; under WSGI it answers 204 so the
+    browser stops reconnecting and the navbar polls the heartbeat instead.
+    """
+
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+        user_id = await request.session.aget('current_user_id')
+        user = None
+        if user_id:
+            user = await SystemUser.objects.filter(id=user_id, is_active=True).afirst()
+        if not user:
+            return HttpResponse(status=204)
+
+        response = StreamingHttpResponse(
+            self._stream(user.pk, user.unread_count), content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _stream(self, user_id, count):
+        queue = broker.subscribe(user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            yield _sse('unread', render_unread_badge(count))
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    latest = await (
+                        SystemUser.objects.filter(pk=user_id)
+                        .values_list('unread_count', flat=True).afirst()
+                    )
+                    if latest is not None and latest != count:
+                        count = latest
+                        yield _sse('unread', render_unread_badge(count))
+                    # Also keeps the connection alive; the page refreshes its counters on it
+                    yield _sse('heartbeat', '')
+                    continue
+                if event == 'unread':
+                    count = data
+                    yield _sse('unread', render_unread_badge(count))
+                else:
+                    yield _sse(event, json.dumps(data))
+        finally:
+            broker.unsubscribe(user_id, queue)
 
 
 class MarkReadView(View):
     def post(self, request, pk):
-        user = _get_current_user(request)
+        user = request.current_user
         if user:
             notification = get_object_or_404(Notification, pk=pk, recipient=user)
-            notification.is_read = True
-            notification.save(update_fields=['is_read'])
+            mark_read(user, notification)
         if request.htmx:
             return HttpResponse('')
         return redirect('notifications:list')
@@ -75,23 +157,23 @@ class MarkReadView(View):
 
 class MarkAllReadView(View):
     def post(self, request):
-        user = _get_current_user(request)
+        user = request.current_user
         if user:
-            Notification.objects.filter(recipient=user, is_read=False).update(is_read=True)
+            mark_all_read(user)
         return redirect('notifications:list')
 
 
 class DeleteNotificationView(View):
     def post(self, request, pk):
-        user = _get_current_user(request)
+        user = request.current_user
         if user:
-            Notification.objects.filter(pk=pk, recipient=user).delete()
+            delete_notification(user, pk)
         return redirect('notifications:list')
 
 
 class DeleteAllReadView(View):
     def post(self, request):
-        user = _get_current_user(request)
+        user = request.current_user
         if user:
-            Notification.objects.filter(recipient=user, is_read=True).delete()
+            delete_all_read(user)
         return redirect('notifications:list')
@@ -0,0 +1,14 @@
+"""Per-process change channel for open onboarding detail pages.
+
+Publishing only wakes the streams; they read the changed rows from the
+database using the process version stamp, so a missed wake-up (another
+worker process, a dropped connection) is caught up on the next read.
+"""
+from apps.notifications.events import EventBroker
+
+process_broker = EventBroker()
+
+
+def publish_process_change(process_id):
+    if process_broker.has_subscribers(process_id):
+        process_broker.publish(process_id, 'changed', None)
@@ -1,40 +1,63 @@
-from django.core.management.base import BaseCommand
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.utils import timezone
 
-from apps.notifications.models import NotificationType
-from apps.notifications.services import send_notification
-from apps.onboarding.models import OnboardingTask, TaskStatus
+from apps.onboarding.services import OVERDUE_CHUNK_SIZE, notify_overdue_tasks, overdue_id_ranges
+
+
+def _notify_range(now, chunk_size, id_range):
+    try:
+        return notify_overdue_tasks(now=now, chunk_size=chunk_size, id_range=id_range)
+    finally:
+        connections.close_all()
 
 
 class Command(BaseCommand):
-    help = 'Check for overdue tasks and send notifications'
+    help = 'Notify assignees of newly overdue tasks and send reminders for those still overdue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=OVERDUE_CHUNK_SIZE)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Split the scan by task id range across this many processes. '
+                                 'Selecting and rendering run in parallel; on SQLite the chunk '
+                                 'commits still take turns.')
 
     def handle(self, *args, **options):
-        today = timezone.now().date()
-        overdue_tasks = OnboardingTask.objects.filter(
-            deadline__lt=today,
-            status__in=[TaskStatus.PENDING, TaskStatus.READY, TaskStatus.IN_PROGRESS],
-        ).select_related('assignee', 'onboarding')
-
-        count = 0
-        for task in overdue_tasks:
-            if task.assignee:
-                send_notification(
-                    recipient=task.assignee,
-                    notification_type=NotificationType.TASK_OVERDUE,
-                    title=f'Forsinket opgave: {task.name}',
-                    message=(
-                        f'Opgaven "{task.name}" i onboarding for '
-                        f'{task.onboarding.new_employee_name} er forsinket. '
-                        f'Deadline var {task.deadline}.'
-                    ),
-                    related_onboarding=task.onboarding,
-                    related_task=task,
-                    send_email=True,
-                    send_in_app=True,
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        now = timezone.now()
+        started = time.monotonic()
+        if options['workers'] == 1:
+            results = [notify_overdue_tasks(now=now, chunk_size=options['chunk_size'])]
+        else:
+            ranges = overdue_id_ranges(options['workers'], now=now)
+            # Forked workers must not inherit this process's connection
+            connections.close_all()
+            # Spawned workers (the default outside Linux) set Django up first;
+            # this module can't be imported before that, hence django.setup itself
+            with ProcessPoolExecutor(max_workers=len(ranges) or 1, initializer=django.setup) as pool:
+                results = list(pool.map(
+                    _notify_range, [now] * len(ranges), [options['chunk_size']] * len(ranges), ranges,
+                ))
+            for id_range, result in zip(ranges, results):
+                self.stdout.write(
+                    f'  ids {id_range[0]}-{id_range[1] - 1}: {result["notified"]} notifications '
+                    f'in {result["chunks"]} chunks'
                 )
-                count += 1
+        elapsed = time.monotonic() - started
 
-        self.stdout.write(
-            self.style.SUCCESS(f'Checked overdue tasks. Sent {count} notifications.')
+        total = {key: sum(result[key] for result in results) for key in ('checked', 'notified', 'reminders', 'chunks')}
+        timings = ', '.join(
+            f'{phase} {sum(result["timings"][phase] for result in results):.3f}s'
+            for phase in ('select', 'render', 'write')
         )
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked overdue tasks. Sent {total["notified"]} notifications '
+            f'({total["reminders"]} reminders) for {total["checked"]} tasks '
+            f'in {total["chunks"]} chunks in {elapsed:.2f}s [{timings}].'
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.onboarding.services import REMINDER_CHUNK_SIZE, send_due_soon_reminders
+
+
+class Command(BaseCommand):
+    help = 'Remind assignees of tasks whose deadline is coming up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=REMINDER_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checked, sent = send_due_soon_reminders(chunk_size=options['chunk_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} reminders for {checked} due tasks in {elapsed:.2f}s.'
+        ))
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:56
+
+from django.db import migrations, models
+
+RULE_FIELDS = (
+    'notify_user_id', 'notify_assignee', 'notify_dependent_assignees',
+    'trigger_status', 'send_email', 'send_in_app',
+)
+
+
+def collapse_copied_rules(apps, schema_editor):
+    """Drop per-task rule copies that still match their template entity.
+
+    Tasks whose rules differ from the template keep their rows and are
+    marked as overridden.
+    """
+    OnboardingTask = apps.get_model('onboarding', 'OnboardingTask')
+    TaskNotificationRule = apps.get_model('onboarding', 'TaskNotificationRule')
+    TemplateEntityNotificationRule = apps.get_model('templates_mgmt', 'TemplateEntityNotificationRule')
+
+    template_rules = {}
+    for row in TemplateEntityNotificationRule.objects.values('template_entity_id', *RULE_FIELDS):
+        template_rules.setdefault(row['template_entity_id'], []).append(
+            tuple(row[f] for f in RULE_FIELDS)
+        )
+
+    task_rules = {}
+    task_sources = {}
+    for row in TaskNotificationRule.objects.values(
+        'task_id', 'task__source_template_entity_id', *RULE_FIELDS,
+    ):
+        task_rules.setdefault(row['task_id'], []).append(tuple(row[f] for f in RULE_FIELDS))
+        task_sources[row['task_id']] = row['task__source_template_entity_id']
+
+    overridden = [
+        task_id for task_id, rules in task_rules.items()
+        if task_sources[task_id] is None
+        or sorted(rules, key=repr) != sorted(template_rules.get(task_sources[task_id], []), key=repr)
+    ]
+    OnboardingTask.objects.filter(pk__in=overridden).update(notification_rules_overridden=True)
+    TaskNotificationRule.objects.exclude(task_id__in=overridden).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0003_tasknotificationrule_notify_dependent_assignees'),
+        ('templates_mgmt', '0004_onboardingtemplate_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='notification_rules_overridden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(collapse_copied_rules, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:57
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_changed_assignees(apps, schema_editor):
+    # Tasks whose assignee no longer matches their template entity's default
+    # were changed by hand; a template sync must not reset them
+    OnboardingTask = apps.get_model('onboarding', 'OnboardingTask')
+    (
+        OnboardingTask.objects
+        .filter(source_template_entity__isnull=False)
+        .exclude(assignee=F('source_template_entity__default_assignee'))
+        .exclude(assignee__isnull=True, source_template_entity__default_assignee__isnull=True)
+        .update(assignee_overridden=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0004_shared_notification_rules'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='assignee_overridden',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_changed_assignees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('onboarding', '0005_onboardingtask_assignee_overridden'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingprocess',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='changed_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
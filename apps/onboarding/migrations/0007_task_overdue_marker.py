@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_systemuser_unread_count'),
+        ('entities', '0004_add_show_on_overview'),
+        ('onboarding', '0006_process_version'),
+        ('templates_mgmt', '0004_onboardingtemplate_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='overdue_level',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='overdue_notified_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='onboardingtask',
+            index=models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+        ),
+    ]
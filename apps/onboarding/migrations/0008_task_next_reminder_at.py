@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_job_lease_and_run'),
+        ('entities', '0004_add_show_on_overview'),
+        ('onboarding', '0007_task_overdue_marker'),
+        ('templates_mgmt', '0005_templateentity_remind_days_before'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtask',
+            name='next_reminder_at',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='onboardingtask',
+            index=models.Index(fields=['next_reminder_at'], name='task_next_reminder_idx'),
+        ),
+    ]
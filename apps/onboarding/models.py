@@ -29,6 +29,9 @@ class OnboardingProcess(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every task change; open detail pages fetch rows stamped
+    # with a newer OnboardingTask.changed_version
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         ordering = ['-start_date']
@@ -86,12 +89,22 @@ class OnboardingTask(models.Model):
         null=True, blank=True, related_name='assigned_tasks',
         verbose_name='Ansvarlig'
     )
+    assignee_overridden = models.BooleanField(default=False)
     deadline = models.DateField(null=True, blank=True, verbose_name='Deadline')
     deadline_overridden = models.BooleanField(default=False)
+    # Overdue notifications sent for the current deadline; reset when it moves
+    overdue_level = models.PositiveSmallIntegerField(default=0, editable=False)
+    overdue_notified_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Day the due-soon reminder goes out; cleared once it has been handled
+    next_reminder_at = models.DateField(null=True, blank=True, editable=False)
+    # When False the task inherits notification rules from its
+    # source_template_entity; when True its own TaskNotificationRule rows apply.
+    notification_rules_overridden = models.BooleanField(default=False)
     dependencies = models.ManyToManyField(
         'self', symmetrical=False, blank=True, related_name='dependents'
     )
     sort_order = models.PositiveIntegerField(default=0)
+    changed_version = models.PositiveIntegerField(default=0, editable=False)
     completed_at = models.DateTimeField(null=True, blank=True)
     completed_by = models.ForeignKey(
         'core.SystemUser', on_delete=models.SET_NULL,
@@ -101,6 +114,10 @@ class OnboardingTask(models.Model):
 
     class Meta:
         ordering = ['sort_order']
+        indexes = [
+            models.Index(fields=['status', 'deadline'], name='task_status_deadline_idx'),
+            models.Index(fields=['next_reminder_at'], name='task_next_reminder_idx'),
+        ]
         verbose_name = 'Onboarding-opgave'
         verbose_name_plural = 'Onboarding-opgaver'
 
@@ -186,3 +203,8 @@ class TaskNotificationRule(models.Model):
 
     class Meta:
         pass
+
+    @property
+    def dedupe_ref(self):
+        # Own namespace; inherited template rules use 'template-rule-{pk}'
+        return f'task-rule-{self.pk}'
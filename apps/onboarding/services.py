@@ -1,8 +1,20 @@
+import time
+from collections import namedtuple
+from datetime import timedelta
+from functools import lru_cache, partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery
+from django.urls import reverse
 from django.utils import timezone
 
-from .models import OnboardingTask, TaskStatus
+from .events import publish_process_change
+from .models import OnboardingProcess, OnboardingTask, TaskNotificationRule, TaskStatus
 
 
+@transaction.atomic
 def complete_task(task, completed_by):
     """Mark a task as completed and cascade status updates."""
     task.status = TaskStatus.COMPLETED
@@ -10,13 +22,20 @@ def complete_task(task, completed_by):
     task.completed_by = completed_by
     task.save(update_fields=['status', 'completed_at', 'completed_by'])
 
+    # Notifications for the task and the whole cascade are written together
+    rule_index = _get_rule_index(task)
+    pending = []
+
     # Fire notification rules for "completed" trigger
-    _fire_notification_rules(task, 'completed')
+    _fire_notification_rules(task, 'completed', rule_index=rule_index, pending=pending)
 
     # Cascade: unlock dependent tasks
-    _cascade_status_updates(task)
+    _cascade_status_updates(task, rule_index=rule_index, pending=pending)
+    _send_pending_notifications(pending)
+    record_task_change(task)
 
 
+@transaction.atomic
 def skip_task(task, skipped_by):
     """Mark a task as skipped and cascade status updates."""
     task.status = TaskStatus.SKIPPED
@@ -24,13 +43,20 @@ def skip_task(task, skipped_by):
     task.completed_by = skipped_by
     task.save(update_fields=['status', 'completed_at', 'completed_by'])
 
+    # Notifications for the task and the whole cascade are written together
+    rule_index = _get_rule_index(task)
+    pending = []
+
     # Fire notification rules for "skipped" trigger
-    _fire_notification_rules(task, 'skipped')
+    _fire_notification_rules(task, 'skipped', rule_index=rule_index, pending=pending)
 
     # Cascade: unlock dependent tasks
-    _cascade_status_updates(task)
+    _cascade_status_updates(task, rule_index=rule_index, pending=pending)
+    _send_pending_notifications(pending)
+    record_task_change(task)
 
 
+@transaction.atomic
 def start_task(task):
     """Mark a task as in progress."""
     if task.status == TaskStatus.READY:
@@ -39,8 +65,10 @@ def start_task(task):
 
         # Fire notification rules for "in_progress" trigger
         _fire_notification_rules(task, 'in_progress')
+        record_task_change(task)
 
 
+@transaction.atomic
 def change_task_status(task, new_status, user=None):
     """Change a task to an arbitrary valid status, delegating to the right handler."""
     if new_status == task.status:
@@ -68,6 +96,81 @@ def change_task_status(task, new_status, user=None):
         # that relied on this task being done must revert to PENDING.
         if old_status in [TaskStatus.COMPLETED, TaskStatus.SKIPPED]:
             _cascade_revert_dependents(task)
+        record_task_change(task)
+
+
+@transaction.atomic
+def record_task_change(task):
+    """Stamp ``task`` and its dependents with a new process version.
+
+    Dependents are included because their rows show this task's status
+    and may have been promoted or reverted by it. The bump and the stamps
+    commit together, so a reader never sees a version without its rows.
+    """
+    process_id = task.onboarding_id
+    OnboardingProcess.objects.filter(pk=process_id).update(version=F('version') + 1)
+    OnboardingTask.objects.filter(Q(pk=task.pk) | Q(dependencies=task.pk)).update(
+        changed_version=Subquery(
+            OnboardingProcess.objects.filter(pk=process_id).values('version')[:1]
+        ),
+    )
+    transaction.on_commit(partial(publish_process_change, process_id))
+    transaction.on_commit(invalidate_task_counters)
+
+
+@transaction.atomic
+def record_task_changes(task_ids, process_ids):
+    """record_task_change for many tasks of ``process_ids`` at once.
+
+    Each process is bumped once and the tasks and their dependents are
+    stamped with one UPDATE.
+    """
+    task_ids = list(task_ids)
+    OnboardingProcess.objects.filter(pk__in=process_ids).update(version=F('version') + 1)
+    OnboardingTask.objects.filter(Q(pk__in=task_ids) | Q(dependencies__in=task_ids)).update(
+        changed_version=Subquery(
+            OnboardingProcess.objects.filter(pk=OuterRef('onboarding_id')).values('version')[:1]
+        ),
+    )
+    for process_id in process_ids:
+        transaction.on_commit(partial(publish_process_change, process_id))
+    transaction.on_commit(invalidate_task_counters)
+
+
+# ---------------------------------------------------------------------------
+# Per-user task counters for the navbar heartbeat
+# ---------------------------------------------------------------------------
+
+TASK_COUNTERS_TTL = 300
+TASK_COUNTERS_GENERATION_KEY = 'task-counters-generation'
+
+
+def get_task_counters(user):
+    """Open and overdue task counts for ``user``, cached between task changes.
+
+    Any task change moves the shared generation so stale entries are never
+    read again; the date in the key rolls the overdue count over at midnight.
+    """
+    today = timezone.now().date()
+    generation = cache.get_or_set(TASK_COUNTERS_GENERATION_KEY, 0, None)
+    key = f'task-counters:{user.pk}:{generation}:{today.isoformat()}'
+    counters = cache.get(key)
+    if counters is None:
+        counters = (
+            OnboardingTask.objects
+            .filter(assignee=user)
+            .exclude(status__in=[TaskStatus.COMPLETED, TaskStatus.SKIPPED])
+            .aggregate(open=Count('pk'), overdue=Count('pk', filter=Q(deadline__lt=today)))
+        )
+        cache.set(key, counters, TASK_COUNTERS_TTL)
+    return counters
+
+
+def invalidate_task_counters():
+    try:
+        cache.incr(TASK_COUNTERS_GENERATION_KEY)
+    except ValueError:
+        cache.set(TASK_COUNTERS_GENERATION_KEY, 1, None)
 
 
 def _cascade_revert_dependents(reverted_task):
@@ -80,14 +183,84 @@ def _cascade_revert_dependents(reverted_task):
             dependent.save(update_fields=['status'])
 
 
-def _cascade_status_updates(completed_task):
-    """Check dependent tasks and promote them to READY if all deps are met."""
-    for dependent in completed_task.dependents.filter(status=TaskStatus.PENDING):
+def _cascade_status_updates(completed_task, rule_index=None, pending=None):
+    """Check dependent tasks and promote them to READY if all deps are met.
+
+    Notifications are appended to ``pending`` when given, otherwise they are
+    sent together once the cascade is done.
+    """
+    own_pending = pending is None
+    if own_pending:
+        pending = []
+    dependents = (
+        completed_task.dependents
+        .filter(status=TaskStatus.PENDING)
+        .select_related('onboarding', 'assignee')
+    )
+    for dependent in dependents:
         if not dependent.is_blocked:
             dependent.status = TaskStatus.READY
             dependent.save(update_fields=['status'])
+            # All dependents share the process template, so compile its rules once
+            if rule_index is None:
+                rule_index = _get_rule_index(completed_task)
             # Fire notification rules for the dependent task becoming "ready"
-            _fire_notification_rules(dependent, 'ready')
+            _fire_notification_rules(dependent, 'ready', rule_index=rule_index, pending=pending)
+    if own_pending:
+        _send_pending_notifications(pending)
+
+
+# ---------------------------------------------------------------------------
+# Notification rules — inherited from the template, copied onto the tasks
+# only when their template entity is deleted
+# ---------------------------------------------------------------------------
+
+def _get_rule_index(task):
+    from apps.templates_mgmt.services import get_notification_rule_index
+
+    template_id = task.onboarding.template_id
+    if template_id is None:
+        return {}
+    return get_notification_rule_index(template_id)
+
+
+def get_task_notification_rules(task, trigger_status, rule_index=None):
+    """Return the rules that apply to a task for the given trigger status."""
+    if task.notification_rules_overridden:
+        return list(task.notification_rules.filter(trigger_status=trigger_status))
+    if task.source_template_entity_id is None:
+        return []
+    if rule_index is None:
+        rule_index = _get_rule_index(task)
+    return rule_index.get((task.source_template_entity_id, trigger_status), [])
+
+
+def override_notification_rules_for_template_entity(template_entity):
+    """Materialize a template entity's rules on every task still inheriting them."""
+    task_ids = list(
+        OnboardingTask.objects
+        .filter(source_template_entity=template_entity, notification_rules_overridden=False)
+        .values_list('pk', flat=True)
+    )
+    if not task_ids:
+        return
+    rules = list(template_entity.notification_rules.all())
+    TaskNotificationRule.objects.bulk_create([
+        _copy_rule(task_id, rule) for task_id in task_ids for rule in rules
+    ])
+    OnboardingTask.objects.filter(pk__in=task_ids).update(notification_rules_overridden=True)
+
+
+def _copy_rule(task_id, rule):
+    return TaskNotificationRule(
+        task_id=task_id,
+        notify_user_id=rule.notify_user_id,
+        notify_assignee=rule.notify_assignee,
+        notify_dependent_assignees=rule.notify_dependent_assignees,
+        trigger_status=rule.trigger_status,
+        send_email=rule.send_email,
+        send_in_app=rule.send_in_app,
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -109,81 +282,397 @@ NOTIFICATION_TYPE_MAP = {
 }
 
 
-def _fire_notification_rules(task, trigger_status):
-    """Evaluate all notification rules for this task and send where trigger matches."""
+def _send_pending_notifications(pending):
+    """Write the notifications collected during a transition in one go."""
+    if not pending:
+        return
     try:
-        from apps.notifications.services import send_notification
+        from apps.notifications.services import send_notifications
     except ImportError:
         return
-    from django.urls import reverse
+    send_notifications(pending)
+
 
-    rules = task.notification_rules.select_related('notify_user').filter(
-        trigger_status=trigger_status,
+@lru_cache(maxsize=1)
+def _task_url_pattern():
+    # Reverse once with placeholder ids instead of once per linked task
+    return (
+        reverse('onboarding:task_detail', args=[111111111, 222222222])
+        .replace('111111111', '{onboarding_id}')
+        .replace('222222222', '{task_id}')
+    )
+
+
+def _fire_notification_rules(task, trigger_status, rule_index=None, pending=None):
+    """Evaluate all notification rules for this task and send where trigger matches.
+
+    Notifications are appended to ``pending`` when given so a caller can write
+    a whole cascade at once; otherwise they are written before returning.
+    """
+    from apps.core.models import SystemUser
+    from apps.notifications.messages import render_message
+
+    rules = get_task_notification_rules(task, trigger_status, rule_index=rule_index)
+    if not rules:
+        return
+    own_pending = pending is None
+    if own_pending:
+        pending = []
+
+    notify_users = SystemUser.objects.in_bulk(
+        {rule.notify_user_id for rule in rules if rule.notify_user_id}
     )
 
     status_label = STATUS_LABELS.get(trigger_status, trigger_status)
     notification_type = NOTIFICATION_TYPE_MAP.get(trigger_status, 'task_completed')
-    base_message = (
-        f'Opgaven "{task.name}" i onboarding for '
-        f'{task.onboarding.new_employee_name} er nu {status_label}.'
-    )
+    # A rule fires at most once per task, trigger and day; repeats are
+    # dropped by the unique constraint when the batch is written
+    window = timezone.now().date().isoformat()
+    title = f'Opgave {status_label}: {task.name}'
+    context = {
+        'task_name': task.name,
+        'employee_name': task.onboarding.new_employee_name,
+        'status_label': status_label,
+    }
+    message, text = render_message(notification_type, context)
+
+    # Dependent tasks grouped by assignee, resolved at most once per task
+    assignee_tasks = None
 
     for rule in rules:
         # Collect direct recipients (notify_user and/or assignee)
         direct_recipients = set()
-        if rule.notify_user:
-            direct_recipients.add(rule.notify_user)
+        if rule.notify_user_id in notify_users:
+            direct_recipients.add(notify_users[rule.notify_user_id])
         if rule.notify_assignee and task.assignee:
             direct_recipients.add(task.assignee)
 
         # Send to direct recipients (standard message)
         for recipient in direct_recipients:
-            send_notification(
-                recipient=recipient,
-                notification_type=notification_type,
-                title=f'Opgave {status_label}: {task.name}',
-                message=base_message,
-                related_onboarding=task.onboarding,
-                related_task=task,
-                send_email=rule.send_email,
-                send_in_app=rule.send_in_app,
-            )
+            pending.append({
+                'recipient': recipient,
+                'notification_type': notification_type,
+                'title': title,
+                'message': message,
+                'text': text,
+                'related_onboarding': task.onboarding,
+                'related_task': task,
+                'send_email': rule.send_email,
+                'send_in_app': rule.send_in_app,
+                'dedupe_key': f'{rule.dedupe_ref}:task-{task.pk}:{trigger_status}:{window}',
+            })
 
         # Send to dependent task assignees with links to their tasks
         if rule.notify_dependent_assignees:
-            dep_tasks = list(
-                task.dependents.select_related('assignee').all()
-            )
-            # Group dependent tasks by assignee
-            assignee_tasks = {}
-            for dep_task in dep_tasks:
-                if dep_task.assignee:
-                    assignee_tasks.setdefault(dep_task.assignee, []).append(dep_task)
+            if assignee_tasks is None:
+                assignee_tasks = {}
+                for dep_task in task.dependents.select_related('assignee').all():
+                    if dep_task.assignee:
+                        assignee_tasks.setdefault(dep_task.assignee, []).append(dep_task)
 
+            url_pattern = _task_url_pattern()
             for recipient, their_tasks in assignee_tasks.items():
                 if recipient in direct_recipients:
                     # Already notified as direct recipient — skip duplicate
                     continue
-                # Build message with links to dependent tasks
-                task_links = []
-                for dt in their_tasks:
-                    url = reverse('onboarding:task_detail', args=[dt.onboarding_id, dt.pk])
-                    task_links.append(
-                        f'<a href="{url}" class="text-indigo-600 hover:text-indigo-900 '
-                        f'underline">{dt.name}</a>'
-                    )
-                links_html = ', '.join(task_links)
-                dep_message = (
-                    f'{base_message}<br>'
-                    f'Dine afhængige opgaver: {links_html}'
-                )
-                send_notification(
-                    recipient=recipient,
-                    notification_type=notification_type,
-                    title=f'Opgave {status_label}: {task.name}',
-                    message=dep_message,
-                    related_onboarding=task.onboarding,
-                    related_task=task,
-                    send_email=rule.send_email,
-                    send_in_app=rule.send_in_app,
-                )
+                # Message with links to their dependent tasks
+                dependent_message, dependent_text = render_message(notification_type, {
+                    **context,
+                    'dependent_tasks': [
+                        {'name': dt.name, 'url': url_pattern.format(onboarding_id=dt.onboarding_id, task_id=dt.pk)}
+                        for dt in their_tasks
+                    ],
+                })
+                pending.append({
+                    'recipient': recipient,
+                    'notification_type': notification_type,
+                    'title': title,
+                    'message': dependent_message,
+                    'text': dependent_text,
+                    'related_onboarding': task.onboarding,
+                    'related_task': task,
+                    'send_email': rule.send_email,
+                    'send_in_app': rule.send_in_app,
+                    'dedupe_key': f'{rule.dedupe_ref}:task-{task.pk}:{trigger_status}:{window}',
+                })
+
+    if own_pending:
+        _send_pending_notifications(pending)
+
+
+# ---------------------------------------------------------------------------
+# Overdue notifications — each task is notified once per deadline, then
+# reminded every OVERDUE_ESCALATION_DAYS while it stays open
+# ---------------------------------------------------------------------------
+
+OVERDUE_ESCALATION_DAYS = 7
+OVERDUE_CHUNK_SIZE = 500
+OPEN_STATUSES = [TaskStatus.PENDING, TaskStatus.READY, TaskStatus.IN_PROGRESS]
+
+
+def overdue_candidates(now):
+    """Open, assigned tasks that are newly overdue or due a reminder at ``now``."""
+    escalation = timedelta(days=getattr(settings, 'OVERDUE_ESCALATION_DAYS', OVERDUE_ESCALATION_DAYS))
+    return (
+        OnboardingTask.objects
+        .filter(status__in=OPEN_STATUSES, deadline__lt=now.date(), assignee__isnull=False)
+        .filter(Q(overdue_notified_at__isnull=True) | Q(overdue_notified_at__lte=now - escalation))
+    )
+
+
+def overdue_id_ranges(workers, now=None):
+    """Split the candidates' id span into ``workers`` half-open (start, stop) ranges."""
+    bounds = overdue_candidates(now or timezone.now()).aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return []
+    step = -(-(bounds['hi'] - bounds['lo'] + 1) // workers)
+    return [
+        (start, min(start + step, bounds['hi'] + 1))
+        for start in range(bounds['lo'], bounds['hi'] + 1, step)
+    ]
+
+
+def notify_overdue_tasks(now=None, chunk_size=OVERDUE_CHUNK_SIZE, id_range=None):
+    """Notify assignees of tasks that are newly overdue or due a reminder.
+
+    Candidates (optionally only those with ids in ``id_range``) are read in
+    keyset chunks through task_status_deadline_idx. Each chunk's
+    notifications and its marker UPDATE are committed together, so memory
+    stays flat and an interrupted run resumes with the unmarked tasks.
+    Returns the counts and the seconds spent per phase.
+    """
+    from apps.notifications.messages import render_message
+    from apps.notifications.models import NotificationType
+    from apps.notifications.services import send_notifications
+
+    now = now or timezone.now()
+    candidates = overdue_candidates(now).select_related('assignee', 'onboarding')
+    if id_range is not None:
+        candidates = candidates.filter(pk__gte=id_range[0], pk__lt=id_range[1])
+    stats = {
+        'checked': 0, 'notified': 0, 'reminders': 0, 'chunks': 0,
+        'timings': {'select': 0.0, 'render': 0.0, 'write': 0.0},
+    }
+    timings = stats['timings']
+    last_id = 0
+    while True:
+        started = time.monotonic()
+        tasks = list(candidates.filter(pk__gt=last_id).order_by('pk')[:chunk_size])
+        timings['select'] += time.monotonic() - started
+        if not tasks:
+            break
+        last_id = tasks[-1].pk
+
+        started = time.monotonic()
+        items = []
+        for task in tasks:
+            level = task.overdue_level + 1
+            message, text = render_message(NotificationType.TASK_OVERDUE, {
+                'task_name': task.name,
+                'employee_name': task.onboarding.new_employee_name,
+                'deadline': task.deadline,
+                'reminder': level > 1,
+            })
+            # The first notice keeps the key used before reminders existed
+            dedupe_key = f'overdue:task-{task.pk}:{task.deadline.isoformat()}'
+            items.append({
+                'recipient': task.assignee,
+                'notification_type': NotificationType.TASK_OVERDUE,
+                'title': f'Forsinket opgave: {task.name}',
+                'message': message,
+                'text': text,
+                'related_onboarding': task.onboarding,
+                'related_task': task,
+                'dedupe_key': dedupe_key if level == 1 else f'{dedupe_key}:{level}',
+            })
+        timings['render'] += time.monotonic() - started
+
+        started = time.monotonic()
+        with transaction.atomic():
+            sent = send_notifications(items)
+            OnboardingTask.objects.filter(pk__in=[task.pk for task in tasks]).update(
+                overdue_notified_at=now, overdue_level=F('overdue_level') + 1,
+            )
+        timings['write'] += time.monotonic() - started
+
+        stats['checked'] += len(tasks)
+        # Notifications dropped by the dedupe constraint come back as None
+        delivered = [task for task, notification in zip(tasks, sent) if notification is not None]
+        stats['notified'] += len(delivered)
+        stats['reminders'] += sum(1 for task in delivered if task.overdue_level > 0)
+        stats['chunks'] += 1
+        if len(tasks) < chunk_size:
+            break
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Due-soon reminders — next_reminder_at is set from the template entity's
+# remind_days_before whenever a deadline is set, and cleared once handled
+# ---------------------------------------------------------------------------
+
+REMINDER_CHUNK_SIZE = 500
+
+
+def send_due_soon_reminders(today=None, chunk_size=REMINDER_CHUNK_SIZE):
+    """Remind assignees of open tasks whose reminder day has come.
+
+    Tasks are found through task_next_reminder_idx. Reminders are only sent
+    while the deadline is still ahead (or today); every handled task has its
+    next_reminder_at cleared in the same transaction as the inserts.
+    Returns (checked, sent).
+    """
+    from apps.notifications.messages import render_message
+    from apps.notifications.models import NotificationType
+    from apps.notifications.services import send_notifications
+
+    today = today or timezone.now().date()
+    due = OnboardingTask.objects.filter(next_reminder_at__lte=today).select_related('assignee', 'onboarding')
+    checked = sent = 0
+    last_id = 0
+    while True:
+        tasks = list(due.filter(pk__gt=last_id).order_by('pk')[:chunk_size])
+        if not tasks:
+            break
+        last_id = tasks[-1].pk
+
+        items = []
+        for task in tasks:
+            if task.status not in OPEN_STATUSES or task.assignee is None or task.deadline < today:
+                continue
+            message, text = render_message(NotificationType.TASK_DUE_SOON, {
+                'task_name': task.name,
+                'employee_name': task.onboarding.new_employee_name,
+                'deadline': task.deadline,
+                'days_left': (task.deadline - today).days,
+            })
+            items.append({
+                'recipient': task.assignee,
+                'notification_type': NotificationType.TASK_DUE_SOON,
+                'title': f'Snart deadline: {task.name}',
+                'message': message,
+                'text': text,
+                'related_onboarding': task.onboarding,
+                'related_task': task,
+                'dedupe_key': f'due-soon:task-{task.pk}:{task.deadline.isoformat()}',
+            })
+
+        with transaction.atomic():
+            notifications = send_notifications(items)
+            OnboardingTask.objects.filter(pk__in=[task.pk for task in tasks]).update(next_reminder_at=None)
+        checked += len(tasks)
+        sent += sum(1 for notification in notifications if notification is not None)
+        if len(tasks) < chunk_size:
+            break
+    return checked, sent
+
+
+# ---------------------------------------------------------------------------
+# Reassigning a user's work when they leave
+# ---------------------------------------------------------------------------
+
+REASSIGNED_TASKS_LISTED = 10
+
+OpenWork = namedtuple('OpenWork', ['tasks', 'template_entities', 'category_ids'])
+Reassignment = namedtuple('Reassignment', ['assignee', 'tasks', 'template_entities'])
+
+
+def get_open_work(user):
+    """Counts of ``user``'s open tasks and template defaults, and the entity
+    categories they fall in."""
+    from apps.templates_mgmt.models import TemplateEntity
+
+    tasks = OnboardingTask.objects.filter(assignee=user, status__in=OPEN_STATUSES)
+    defaults = TemplateEntity.objects.filter(default_assignee=user)
+    category_ids = (
+        set(tasks.exclude(entity__category=None).values_list('entity__category_id', flat=True).distinct())
+        | set(defaults.exclude(entity__category=None).values_list('entity__category_id', flat=True).distinct())
+    )
+    return OpenWork(tasks.count(), defaults.count(), category_ids)
+
+
+def reassign_user_work(user, assignee=None, category_assignees=None):
+    """Move ``user``'s open tasks and template default assignments.
+
+    Work on an entity whose category is in ``category_assignees``
+    ({category_id: SystemUser}) goes to that user, everything else to
+    ``assignee``; work without a target stays where it is. Each new
+    assignee costs one UPDATE per table and gets a single summary
+    notification. Returns a Reassignment per new assignee.
+    """
+    from apps.notifications.messages import render_message
+    from apps.notifications.models import NotificationType
+    from apps.notifications.services import send_notifications
+    from apps.templates_mgmt.models import OnboardingTemplate, TemplateEntity
+
+    category_assignees = category_assignees or {}
+
+    def target(category_id):
+        new = category_assignees.get(category_id) or assignee
+        return new if new is not None and new.pk != user.pk else None
+
+    tasks = (
+        OnboardingTask.objects
+        .filter(assignee=user, status__in=OPEN_STATUSES)
+        .order_by('deadline', 'pk')
+        .values_list('pk', 'name', 'onboarding_id', 'onboarding__new_employee_name', 'entity__category_id')
+    )
+    defaults = (
+        TemplateEntity.objects
+        .filter(default_assignee=user)
+        .values_list('pk', 'template_id', 'entity__category_id')
+    )
+    # new assignee pk -> [assignee, task rows, template entity rows]
+    moves = {}
+    for row in tasks:
+        new = target(row[4])
+        if new is not None:
+            moves.setdefault(new.pk, [new, [], []])[1].append(row)
+    for row in defaults:
+        new = target(row[2])
+        if new is not None:
+            moves.setdefault(new.pk, [new, [], []])[2].append(row)
+    if not moves:
+        return []
+
+    url_pattern = _task_url_pattern()
+    items = []
+    with transaction.atomic():
+        for new, task_rows, default_rows in moves.values():
+            if task_rows:
+                OnboardingTask.objects.filter(
+                    pk__in=[row[0] for row in task_rows], assignee=user,
+                ).update(assignee=new)
+            if default_rows:
+                TemplateEntity.objects.filter(
+                    pk__in=[row[0] for row in default_rows], default_assignee=user,
+                ).update(default_assignee=new)
+            message, text = render_message(NotificationType.TASKS_REASSIGNED, {
+                'previous_name': user.name,
+                'task_count': len(task_rows),
+                'template_count': len(default_rows),
+                'tasks': [
+                    {'name': name, 'employee_name': employee_name,
+                     'url': url_pattern.format(onboarding_id=onboarding_id, task_id=pk)}
+                    for pk, name, onboarding_id, employee_name, _ in task_rows[:REASSIGNED_TASKS_LISTED]
+                ],
+                'more': max(len(task_rows) - REASSIGNED_TASKS_LISTED, 0),
+            })
+            items.append({
+                'recipient': new,
+                'notification_type': NotificationType.TASKS_REASSIGNED,
+                'title': f'Opgaver overdraget fra {user.name}',
+                'message': message,
+                'text': text,
+            })
+
+        task_rows = [row for move in moves.values() for row in move[1]]
+        if task_rows:
+            record_task_changes([row[0] for row in task_rows], {row[2] for row in task_rows})
+        template_ids = {row[1] for move in moves.values() for row in move[2]}
+        if template_ids:
+            # Template snapshots cache the default assignee per version
+            OnboardingTemplate.objects.filter(pk__in=template_ids).update(version=F('version') + 1)
+        send_notifications(items)
+
+    return [Reassignment(new, len(task_rows), len(default_rows)) for new, task_rows, default_rows in moves.values()]
@@ -6,7 +6,10 @@ app_name = 'onboarding'
 urlpatterns = [
     path('', views.OnboardingListView.as_view(), name='list'),
     path('create/', views.OnboardingCreateView.as_view(), name='create'),
+    path('create/preview/', views.OnboardingPreviewView.as_view(), name='create_preview'),
     path('<int:pk>/', views.OnboardingDetailView.as_view(), name='detail'),
+    path('<int:pk>/events/', views.ProcessEventsView.as_view(), name='events'),
+    path('<int:pk>/changes/', views.TaskChangesView.as_view(), name='changes'),
     path('<int:pk>/delete/', views.OnboardingDeleteView.as_view(), name='delete'),
     path('<int:pk>/tasks/<int:task_pk>/', views.TaskDetailView.as_view(), name='task_detail'),
     path('<int:pk>/tasks/<int:task_pk>/complete/', views.TaskCompleteView.as_view(), name='task_complete'),
@@ -1,24 +1,44 @@
+import asyncio
 import json
+from datetime import date
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.middleware.csrf import get_token
 from django.views import View
 
-from apps.core.models import SystemUser
-from apps.templates_mgmt.services import create_onboarding_from_template
+from apps.notifications.models import Notification
+from apps.notifications.services import repair_unread_counts
+from apps.templates_mgmt.services import (
+    create_onboarding_from_template, preview_onboarding_from_template, reminder_date,
+)
 from .forms import OnboardingCreateForm, TaskEditForm
 from .models import OnboardingProcess, OnboardingTask, OnboardingTaskFieldValue, TaskStatus
-from .services import change_task_status, complete_task, skip_task, start_task
+from .events import process_broker
+from .services import (
+    change_task_status, complete_task, invalidate_task_counters, record_task_change, skip_task,
+    start_task,
+)
 
+# Seconds between keep-alives on the detail page stream; each one also
+# re-checks the process version for changes made by other processes
+PROCESS_STREAM_HEARTBEAT = 25
 
-def _get_tasks_with_overview(process):
+
+def _get_tasks_with_overview(process, changed_since=None):
     """Fetch tasks for a process and pre-compute overview_fields on each."""
+    tasks = process.tasks.all()
+    if changed_since is not None:
+        tasks = tasks.filter(changed_version__gt=changed_since)
     tasks = list(
-        process.tasks
+        tasks
         .select_related('assignee', 'entity')
         .prefetch_related('dependencies', 'field_values__field_definition')
-        .all()
     )
     for task in tasks:
         task.overview_fields = [
@@ -53,14 +73,6 @@ class OnboardingCreateView(View):
     def post(self, request):
         form = OnboardingCreateForm(request.POST)
         if form.is_valid():
-            current_user = None
-            user_id = request.session.get('current_user_id')
-            if user_id:
-                try:
-                    current_user = SystemUser.objects.get(id=user_id)
-                except SystemUser.DoesNotExist:
-                    pass
-
             process = create_onboarding_from_template(
                 template=form.cleaned_data['template'],
                 new_employee_name=form.cleaned_data['new_employee_name'],
@@ -68,7 +80,7 @@ class OnboardingCreateView(View):
                 new_employee_department=form.cleaned_data['new_employee_department'],
                 new_employee_position=form.cleaned_data['new_employee_position'],
                 start_date=form.cleaned_data['start_date'],
-                created_by=current_user,
+                created_by=request.current_user or None,
             )
             if form.cleaned_data['notes']:
                 process.notes = form.cleaned_data['notes']
@@ -79,6 +91,28 @@ class OnboardingCreateView(View):
         return render(request, 'onboarding/onboarding_create.html', {'form': form})
 
 
+class OnboardingPreviewView(View):
+    """HTMX fragment previewing the tasks and notifications of a new onboarding.
+
+    Rendered without the request context so that, apart from the template
+    version lookup, no query is made per keystroke.
+    """
+
+    def get(self, request):
+        preview = None
+        try:
+            template_id = int(request.GET.get('template', ''))
+            start_date = date.fromisoformat(request.GET.get('start_date', ''))
+        except ValueError:
+            pass
+        else:
+            preview = preview_onboarding_from_template(template_id, start_date)
+        return HttpResponse(render_to_string('onboarding/partials/_create_preview.html', {
+            'preview': preview,
+            'today': timezone.now().date(),
+        }))
+
+
 class OnboardingDeleteView(View):
     def get(self, request, pk):
         process = get_object_or_404(OnboardingProcess, pk=pk)
@@ -95,7 +129,15 @@ class OnboardingDeleteView(View):
     def post(self, request, pk):
         process = get_object_or_404(OnboardingProcess, pk=pk)
         name = process.new_employee_name
+        # Notifications cascade with the process; resync their recipients' unread counters
+        recipient_ids = set(
+            Notification.objects.filter(related_onboarding=process, is_read=False)
+            .values_list('recipient_id', flat=True)
+        )
         process.delete()
+        invalidate_task_counters()
+        if recipient_ids:
+            repair_unread_counts(recipient_ids)
         messages.success(request, f'Onboarding for "{name}" er slettet.')
         return redirect('onboarding:list')
 
@@ -164,6 +206,87 @@ class OnboardingDetailView(View):
         })
 
 
+def _render_task_changes(process_id, since, csrf_token):
+    """Return ``(version, html)`` for rows changed after ``since``, or None."""
+    process = OnboardingProcess.objects.filter(pk=process_id).first()
+    if process is None or process.version <= since:
+        return None
+    return process.version, render_to_string('onboarding/partials/_task_changes.html', {
+        'process': process,
+        'tasks': _get_tasks_with_overview(process, changed_since=since),
+        'csrf_token': csrf_token,
+    })
+
+
+def _parse_version(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class TaskChangesView(View):
+    """Rows changed since ``?since=<version>``; polled when the stream is unavailable."""
+
+    def get(self, request, pk):
+        get_object_or_404(OnboardingProcess, pk=pk)
+        changes = _render_task_changes(pk, _parse_version(request.GET.get('since')), get_token(request))
+        if changes is None:
+            return HttpResponse(status=204)
+        version, html = changes
+        response = HttpResponse(html)
+        response['X-Process-Version'] = version
+        return response
+
+
+def _sse(event, data, event_id):
+    lines = [f'id: {event_id}', f'event: {event}']
+    lines.extend(f'data: {line}' for line in data.splitlines())
+    return '\n'.join(lines) + '\n\n'
+
+
+class ProcessEventsView(View):
+    """Server-sent events with changed task rows for one onboarding.
+
+    The event id is the process version, so a reconnecting browser resumes
+    from where it left off via Last-Event-ID. Under WSGI it answers 204 and
+    the page polls TaskChangesView instead.
+    """
+
+    async def get(self, request, pk):
+        if not isinstance(request, ASGIRequest):
+            return HttpResponse(status=204)
+        if not await OnboardingProcess.objects.filter(pk=pk).aexists():
+            raise Http404
+        since = _parse_version(request.headers.get('Last-Event-ID') or request.GET.get('since'))
+        response = StreamingHttpResponse(
+            self._stream(pk, since, get_token(request)), content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def _stream(self, process_id, since, csrf_token):
+        queue = process_broker.subscribe(process_id)
+        try:
+            yield 'retry: 5000\n\n'
+            woken = True
+            while True:
+                changes = await sync_to_async(_render_task_changes)(process_id, since, csrf_token)
+                if changes is not None:
+                    since, html = changes
+                    yield _sse('tasks', html, since)
+                elif not woken:
+                    yield ': keep-alive\n\n'
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=PROCESS_STREAM_HEARTBEAT)
+                    woken = True
+                except asyncio.TimeoutError:
+                    woken = False
+        finally:
+            process_broker.unsubscribe(process_id, queue)
+
+
 class TaskDetailView(View):
     def get(self, request, pk, task_pk):
         process = get_object_or_404(OnboardingProcess, pk=pk)
@@ -183,15 +306,7 @@ class TaskCompleteView(View):
         process = get_object_or_404(OnboardingProcess, pk=pk)
         task = get_object_or_404(OnboardingTask, pk=task_pk, onboarding=process)
 
-        current_user = None
-        user_id = request.session.get('current_user_id')
-        if user_id:
-            try:
-                current_user = SystemUser.objects.get(id=user_id)
-            except SystemUser.DoesNotExist:
-                pass
-
-        complete_task(task, current_user)
+        complete_task(task, request.current_user or None)
         messages.success(request, f'Opgaven "{task.name}" er markeret som færdig.')
 
         if request.htmx:
@@ -208,15 +323,7 @@ class TaskSkipView(View):
         process = get_object_or_404(OnboardingProcess, pk=pk)
         task = get_object_or_404(OnboardingTask, pk=task_pk, onboarding=process)
 
-        current_user = None
-        user_id = request.session.get('current_user_id')
-        if user_id:
-            try:
-                current_user = SystemUser.objects.get(id=user_id)
-            except SystemUser.DoesNotExist:
-                pass
-
-        skip_task(task, current_user)
+        skip_task(task, request.current_user or None)
         messages.success(request, f'Opgaven "{task.name}" er sprunget over.')
 
         if request.htmx:
@@ -265,11 +372,16 @@ class TaskEditView(View):
         form = TaskEditForm(request.POST)
 
         if form.is_valid():
-            task.assignee = form.cleaned_data['assignee']
+            if form.cleaned_data['assignee'] != task.assignee:
+                task.assignee = form.cleaned_data['assignee']
+                task.assignee_overridden = True
             new_deadline = form.cleaned_data['deadline']
             if new_deadline and new_deadline != task.deadline:
                 task.deadline = new_deadline
                 task.deadline_overridden = True
+                task.overdue_level = 0
+                task.overdue_notified_at = None
+                task.next_reminder_at = reminder_date(task.source_template_entity, new_deadline)
             task.save()
 
             # Update custom field values
@@ -288,6 +400,7 @@ class TaskEditView(View):
                 else:
                     fv.value_text = request.POST.get(field_key, '')
                     fv.save(update_fields=['value_text'])
+            record_task_change(task)
 
             messages.success(request, f'Opgaven "{task.name}" er opdateret.')
             return redirect('onboarding:task_detail', pk=process.pk, task_pk=task.pk)
@@ -311,15 +424,7 @@ class TaskChangeStatusView(View):
             messages.error(request, 'Ugyldig status.')
             return redirect('onboarding:task_detail', pk=process.pk, task_pk=task.pk)
 
-        current_user = None
-        user_id = request.session.get('current_user_id')
-        if user_id:
-            try:
-                current_user = SystemUser.objects.get(id=user_id)
-            except SystemUser.DoesNotExist:
-                pass
-
-        change_task_status(task, new_status, current_user)
+        change_task_status(task, new_status, request.current_user or None)
         messages.success(request, f'Status for "{task.name}" er ændret til {task.get_status_display()}.')
         return redirect('onboarding:task_detail', pk=process.pk, task_pk=task.pk)
 
@@ -363,5 +468,6 @@ class TaskTodoToggleView(View):
 
         fv.value_text = json.dumps(items, ensure_ascii=False)
         fv.save(update_fields=['value_text'])
+        record_task_change(task)
 
         return JsonResponse({'status': 'ok', 'items': items})
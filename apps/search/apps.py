@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class SearchConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.search'
+    verbose_name = 'Søgning'
+
+    def ready(self):
+        from . import signals  # noqa: F401
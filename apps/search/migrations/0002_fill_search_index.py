@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def fill_index(apps, schema_editor):
+    from apps.search.services import rebuild_index
+    rebuild_index(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0001_search_index'),
+        ('core', '0006_directory_sync'),
+        ('entities', '0004_add_show_on_overview'),
+        ('onboarding', '0008_task_next_reminder_at'),
+        ('templates_mgmt', '0005_templateentity_remind_days_before'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,200 @@
+"""Global search over users, entities, templates and onboardings.
+
+On SQLite every searchable object is a row in the FTS5 table search_index,
+kept current by the signals in apps.search.signals and rebuilt with the
+rebuild_search_index command. The rowid encodes the object (id * 8 + kind
+code), so an object is replaced or removed by rowid. Other backends fall
+back to icontains queries over the same fields.
+"""
+import re
+from collections import namedtuple
+
+from django.apps import apps as installed_apps
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.urls import reverse
+
+SEARCH_LIMIT = 20
+REBUILD_CHUNK_SIZE = 500
+
+SearchKind = namedtuple('SearchKind', ['code', 'label', 'url_name', 'queryset', 'fields', 'document'])
+SearchHit = namedtuple('SearchHit', ['kind', 'label', 'object_id', 'title', 'detail', 'url'])
+
+
+def _join(*parts):
+    return ' · '.join(part for part in parts if part)
+
+
+def get_search_kinds(apps=None):
+    """kind -> SearchKind; ``document`` maps an object to (title, detail, body).
+
+    ``apps`` is a migration's app registry; the installed models by default.
+    """
+    get_model = (apps or installed_apps).get_model
+    SystemUser = get_model('core', 'SystemUser')
+    Entity = get_model('entities', 'Entity')
+    OnboardingProcess = get_model('onboarding', 'OnboardingProcess')
+    OnboardingTemplate = get_model('templates_mgmt', 'OnboardingTemplate')
+
+    return {
+        'user': SearchKind(
+            1, 'Bruger', 'core:user_detail', SystemUser.objects.all,
+            ['name', 'email', 'department', 'title'],
+            lambda u: (u.name, _join(u.email, u.department), u.title),
+        ),
+        'entity': SearchKind(
+            2, 'Enhed', 'entities:detail', Entity.objects.select_related('category').all,
+            ['name', 'description', 'category__name'],
+            lambda e: (e.name, e.category.name if e.category else '', e.description),
+        ),
+        'template': SearchKind(
+            3, 'Skabelon', 'templates_mgmt:detail', OnboardingTemplate.objects.all,
+            ['name', 'description'],
+            lambda t: (t.name, '' if t.is_active else 'Inaktiv', t.description),
+        ),
+        'onboarding': SearchKind(
+            4, 'Onboarding', 'onboarding:detail', OnboardingProcess.objects.all,
+            ['new_employee_name', 'new_employee_email', 'new_employee_department', 'new_employee_position'],
+            lambda p: (
+                p.new_employee_name,
+                _join(p.new_employee_position, p.new_employee_department, f'start {p.start_date:%d.%m.%Y}'),
+                p.new_employee_email,
+            ),
+        ),
+    }
+
+
+def fts_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def _rowid(kind, object_id):
+    return object_id * 8 + kind.code
+
+
+def index_objects(kind_name, objects):
+    """Add or replace the index rows for ``objects`` of one kind."""
+    if fts_enabled():
+        _write_rows(get_search_kinds()[kind_name], objects)
+
+
+def _write_rows(kind, objects):
+    rows = [(_rowid(kind, obj.pk), *kind.document(obj)) for obj in objects]
+    if not rows:
+        return
+    # One transaction per batch; in autocommit SQLite would commit every row
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM search_index WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            'INSERT INTO search_index (rowid, title, detail, body) VALUES (%s, %s, %s, %s)', rows,
+        )
+
+
+def remove_objects(kind_name, object_ids):
+    if not fts_enabled() or not object_ids:
+        return
+    kind = get_search_kinds()[kind_name]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            'DELETE FROM search_index WHERE rowid = %s', [(_rowid(kind, pk),) for pk in object_ids],
+        )
+
+
+def rebuild_index(chunk_size=REBUILD_CHUNK_SIZE, apps=None):
+    """Re-index everything from scratch. Returns {kind: documents}.
+
+    The search_index migration passes its ``apps`` to fill a new index.
+    """
+    if not fts_enabled():
+        return {}
+    counts = {}
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM search_index')
+    for name, kind in get_search_kinds(apps).items():
+        batch = []
+        counts[name] = 0
+        for obj in kind.queryset().iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) == chunk_size:
+                _write_rows(kind, batch)
+                counts[name] += len(batch)
+                batch = []
+        _write_rows(kind, batch)
+        counts[name] += len(batch)
+    with connection.cursor() as cursor:
+        cursor.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    return counts
+
+
+def _match_expression(query):
+    # Every word must match as a prefix; quoting keeps FTS5 syntax out of user input
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def _ranked(query, names, limit):
+    """(kind, object_id, title, detail) rows for ``query``, best match first."""
+    all_kinds = get_search_kinds()
+    if not names or not re.search(r'\w', query):
+        return []
+    if not fts_enabled():
+        return _ranked_orm(query, names, limit)
+
+    by_code = {all_kinds[name].code: name for name in names}
+    sql = (
+        'SELECT rowid, title, detail FROM search_index WHERE search_index MATCH %s'
+        f' AND rowid %% 8 IN ({", ".join("%s" for _ in by_code)})'
+        ' ORDER BY bm25(search_index, 10.0, 2.0, 1.0) LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [_match_expression(query), *by_code, -1 if limit is None else limit])
+        return [(by_code[rowid % 8], rowid // 8, title, detail) for rowid, title, detail in cursor.fetchall()]
+
+
+def _orm_condition(kind, query):
+    condition = Q()
+    for word in query.split():
+        condition &= Q(*[Q(**{f'{field}__icontains': word}) for field in kind.fields], _connector=Q.OR)
+    return condition
+
+
+def _ranked_orm(query, names, limit):
+    all_kinds = get_search_kinds()
+    rows = []
+    for name in names:
+        kind = all_kinds[name]
+        objects = kind.queryset().filter(_orm_condition(kind, query))
+        for obj in objects if limit is None else objects[:limit]:
+            rows.append((name, obj.pk, *kind.document(obj)[:2]))
+    # Title matches first, then shorter titles
+    needle = query.lower()
+    rows.sort(key=lambda row: (needle not in row[2].lower(), len(row[2])))
+    return rows if limit is None else rows[:limit]
+
+
+def search(query, kinds=None, limit=SEARCH_LIMIT):
+    """Ranked SearchHits for ``query``, optionally only of the given kinds."""
+    all_kinds = get_search_kinds()
+    names = [name for name in all_kinds if kinds is None or name in kinds]
+    return [
+        SearchHit(name, all_kinds[name].label, object_id, title, detail,
+                  reverse(all_kinds[name].url_name, args=[object_id]))
+        for name, object_id, title, detail in _ranked(query, names, limit)
+    ]
+
+
+def search_filter(kind_name, query):
+    """A Q selecting the objects of one kind that match ``query``.
+
+    On SQLite the match is a subquery against search_index, so a query
+    hitting thousands of objects never becomes a list of bound ids.
+    """
+    kind = get_search_kinds()[kind_name]
+    if not re.search(r'\w', query):
+        return Q(pk__in=[])
+    if not fts_enabled():
+        return _orm_condition(kind, query)
+    return Q(pk__in=RawSQL(
+        'SELECT rowid / 8 FROM search_index WHERE search_index MATCH %s AND rowid %% 8 = %s',
+        [_match_expression(query), kind.code],
+    ))
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.core.models import SystemUser
+from apps.entities.models import Category, Entity
+from apps.onboarding.models import OnboardingProcess
+from apps.templates_mgmt.models import OnboardingTemplate
+
+from .services import index_objects, remove_objects
+
+INDEXED_MODELS = {
+    SystemUser: 'user',
+    Entity: 'entity',
+    OnboardingTemplate: 'template',
+    OnboardingProcess: 'onboarding',
+}
+
+
+def _object_saved(sender, instance, raw=False, **kwargs):
+    # Fixture loading (raw) is followed by rebuild_search_index instead
+    if not raw:
+        index_objects(INDEXED_MODELS[sender], [instance])
+
+
+def _object_deleted(sender, instance, **kwargs):
+    remove_objects(INDEXED_MODELS[sender], [instance.pk])
+
+
+for model in INDEXED_MODELS:
+    post_save.connect(_object_saved, sender=model, dispatch_uid=f'search-save-{model.__name__}')
+    post_delete.connect(_object_deleted, sender=model, dispatch_uid=f'search-delete-{model.__name__}')
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, raw=False, **kwargs):
+    """Entities carry their category name in the index."""
+    if not raw:
+        index_objects('entity', Entity.objects.filter(category=instance).select_related('category'))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_entities(sender, instance, **kwargs):
+    instance._search_entity_ids = list(instance.entities.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    # The entities' category was set to NULL without signals
+    entity_ids = getattr(instance, '_search_entity_ids', [])
+    index_objects('entity', Entity.objects.filter(pk__in=entity_ids).select_related('category'))
@@ -0,0 +1,27 @@
+import time
+
+from django.shortcuts import render
+from django.views import View
+
+from .services import SEARCH_LIMIT, get_search_kinds, search
+
+
+class SearchView(View):
+    """Global search; htmx requests from the navbar get just the result list."""
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()
+        kind = request.GET.get('type', '')
+        kinds = [kind] if kind in get_search_kinds() else None
+        started = time.monotonic()
+        hits = search(query, kinds=kinds, limit=8 if request.htmx else SEARCH_LIMIT * 5) if query else []
+        context = {
+            'query': query,
+            'hits': hits,
+            'kind': kind,
+            'kinds': [(name, k.label) for name, k in get_search_kinds().items()],
+            'elapsed_ms': (time.monotonic() - started) * 1000,
+        }
+        if request.htmx:
+            return render(request, 'search/_results.html', context)
+        return render(request, 'search/search.html', context)
@@ -22,6 +22,6 @@ class OnboardingTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(TemplateEntity)
 class TemplateEntityAdmin(admin.ModelAdmin):
-    list_display = ['template', 'entity', 'days_before_start', 'default_assignee', 'sort_order']
+    list_display = ['template', 'entity', 'days_before_start', 'remind_days_before', 'default_assignee', 'sort_order']
     list_filter = ['template']
     inlines = [NotificationRuleInline]
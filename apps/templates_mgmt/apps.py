@@ -5,3 +5,6 @@ class TemplatesMgmtConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.templates_mgmt'
     verbose_name = 'Skabeloner'
+
+    def ready(self):
+        from . import signals  # noqa: F401
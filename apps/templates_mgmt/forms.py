@@ -30,13 +30,17 @@ class OnboardingTemplateForm(forms.ModelForm):
 class TemplateEntityForm(forms.ModelForm):
     class Meta:
         model = TemplateEntity
-        fields = ['entity', 'days_before_start', 'default_assignee', 'sort_order']
+        fields = ['entity', 'days_before_start', 'remind_days_before', 'default_assignee', 'sort_order']
         widgets = {
             'entity': forms.Select(attrs={'class': WIDGET_CLASSES}),
             'days_before_start': forms.NumberInput(attrs={
                 'class': WIDGET_CLASSES,
                 'placeholder': 'F.eks. 5',
             }),
+            'remind_days_before': forms.NumberInput(attrs={
+                'class': WIDGET_CLASSES,
+                'placeholder': 'F.eks. 2',
+            }),
             'default_assignee': forms.Select(attrs={'class': WIDGET_CLASSES}),
             'sort_order': forms.NumberInput(attrs={
                 'class': 'w-24 rounded-lg border-gray-300 shadow-sm focus:border-indigo-500 focus:ring-indigo-500',
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.templates_mgmt.models import OnboardingTemplate
+from apps.templates_mgmt.services import SYNC_CHUNK_SIZE, SYNC_COUNTERS, sync_onboardings_from_template
+
+
+class Command(BaseCommand):
+    help = 'Propagate template changes to running onboardings created from it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_id', type=int)
+        parser.add_argument(
+            '--process', type=int, action='append', dest='process_ids',
+            help='Only sync this onboarding (may be given several times)',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report changes without writing them')
+        parser.add_argument('--chunk-size', type=int, default=SYNC_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            template = OnboardingTemplate.objects.get(pk=options['template_id'])
+        except OnboardingTemplate.DoesNotExist:
+            raise CommandError(f'Template {options["template_id"]} does not exist.')
+
+        started = time.monotonic()
+        report = sync_onboardings_from_template(
+            template,
+            process_ids=options['process_ids'],
+            dry_run=options['dry_run'],
+            chunk_size=options['chunk_size'],
+        )
+        elapsed = time.monotonic() - started
+
+        for entry in report['processes']:
+            changes = ', '.join(f'{key}={entry[key]}' for key in SYNC_COUNTERS if entry[key])
+            self.stdout.write(f'  #{entry["process_id"]} {entry["new_employee_name"]}: {changes}')
+
+        totals = ', '.join(f'{key}={value}' for key, value in report['totals'].items())
+        prefix = 'Dry run: ' if report['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}Checked {report["processes_checked"]} onboardings, '
+            f'{len(report["processes"])} changed in {elapsed:.2f}s. {totals}'
+        ))
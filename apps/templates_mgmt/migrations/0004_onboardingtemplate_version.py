@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_mgmt', '0003_templateentitynotificationrule_notify_dependent_assignees'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='onboardingtemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 07:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('templates_mgmt', '0004_onboardingtemplate_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templateentity',
+            name='remind_days_before',
+            field=models.PositiveIntegerField(blank=True, help_text='Den ansvarlige får en påmindelse så mange dage før deadline', null=True, verbose_name='Påmindelse dage før deadline'),
+        ),
+    ]
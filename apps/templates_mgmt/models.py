@@ -1,10 +1,14 @@
 from django.db import models
+from django.db.models import F
 
 
 class OnboardingTemplate(models.Model):
     name = models.CharField(max_length=300, verbose_name='Navn')
     description = models.TextField(blank=True, verbose_name='Beskrivelse')
     is_active = models.BooleanField(default=True, verbose_name='Aktiv')
+    # Bumped whenever entities, dependencies or notification rules change,
+    # so compiled per-template data can be cached per version.
+    version = models.PositiveIntegerField(default=1, editable=False, verbose_name='Version')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -16,6 +20,10 @@ class OnboardingTemplate(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def bump_version(cls, template_id):
+        cls.objects.filter(pk=template_id).update(version=F('version') + 1)
+
 
 class TemplateEntity(models.Model):
     template = models.ForeignKey(
@@ -31,6 +39,11 @@ class TemplateEntity(models.Model):
         verbose_name='Dage før start',
         help_text='Antal dage før startdato denne opgave skal være færdig'
     )
+    remind_days_before = models.PositiveIntegerField(
+        null=True, blank=True,
+        verbose_name='Påmindelse dage før deadline',
+        help_text='Den ansvarlige får en påmindelse så mange dage før deadline'
+    )
     default_assignee = models.ForeignKey(
         'core.SystemUser', on_delete=models.SET_NULL,
         null=True, blank=True, related_name='assigned_template_entities',
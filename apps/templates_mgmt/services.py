@@ -1,7 +1,9 @@
 import json
+from collections import namedtuple
 from datetime import timedelta
 
 from django.db import transaction
+from django.utils import timezone
 
 
 def would_create_cycle(template_entity, proposed_dependency):
@@ -29,14 +31,218 @@ def validate_dependencies(template_entity, dependency_ids):
     return cycles
 
 
-@transaction.atomic
+# ---------------------------------------------------------------------------
+# Per-version template caches — compiled once, then served from memory
+# ---------------------------------------------------------------------------
+
+CompiledRule = namedtuple('CompiledRule', [
+    'notify_user_id', 'notify_assignee', 'notify_dependent_assignees',
+    'send_email', 'send_in_app', 'dedupe_ref',
+])
+
+TemplateTaskSnapshot = namedtuple('TemplateTaskSnapshot', [
+    'template_entity_id', 'entity_id', 'days_before_start', 'sort_order',
+    'assignee_id', 'dependency_ids', 'dependent_ids',
+])
+
+# template_id -> (version, {(template_entity_id, trigger_status): [CompiledRule]})
+_rule_index_cache = {}
+# template_id -> (version, {'tasks': [TemplateTaskSnapshot], 'user_ids': {id}})
+# Names are not part of the snapshot: renaming a user or an entity does not
+# bump the template version, so they are looked up per preview
+_snapshot_cache = {}
+
+
+def _get_template_version(template_id):
+    from .models import OnboardingTemplate
+    return (
+        OnboardingTemplate.objects
+        .filter(pk=template_id)
+        .values_list('version', flat=True)
+        .first()
+    )
+
+
+def _cached_for_version(cache, template_id, version, build):
+    cached = cache.get(template_id)
+    if cached and cached[0] == version:
+        return cached[1]
+    value = build(template_id)
+    cache[template_id] = (version, value)
+    return value
+
+
+def get_notification_rule_index(template_id):
+    """Return the notification rules of a template, keyed by
+    (template_entity_id, trigger_status).
+
+    The index is compiled once per template version and kept in memory, so the
+    only query on a cache hit is the version lookup.
+    """
+    version = _get_template_version(template_id)
+    if version is None:
+        return {}
+    return _cached_for_version(_rule_index_cache, template_id, version, _compile_rule_index)
+
+
+def _compile_rule_index(template_id):
+    from .models import TemplateEntityNotificationRule
+
+    index = {}
+    rules = TemplateEntityNotificationRule.objects.filter(
+        template_entity__template_id=template_id,
+    ).order_by('pk')
+    for rule in rules:
+        index.setdefault((rule.template_entity_id, rule.trigger_status), []).append(
+            CompiledRule(
+                notify_user_id=rule.notify_user_id,
+                notify_assignee=rule.notify_assignee,
+                notify_dependent_assignees=rule.notify_dependent_assignees,
+                send_email=rule.send_email,
+                send_in_app=rule.send_in_app,
+                dedupe_ref=f'template-rule-{rule.pk}',
+            )
+        )
+    return index
+
+
+def _build_template_snapshot(template_id):
+    from .models import TemplateEntity, TemplateEntityNotificationRule
+
+    template_entities = list(
+        TemplateEntity.objects
+        .filter(template_id=template_id)
+        .prefetch_related('dependencies', 'dependents')
+    )
+    te_ids = {te.pk for te in template_entities}
+    user_ids = {te.default_assignee_id for te in template_entities if te.default_assignee_id}
+    user_ids.update(
+        TemplateEntityNotificationRule.objects
+        .filter(template_entity__template_id=template_id, notify_user__isnull=False)
+        .values_list('notify_user_id', flat=True)
+    )
+
+    return {
+        'tasks': [
+            TemplateTaskSnapshot(
+                template_entity_id=te.pk,
+                entity_id=te.entity_id,
+                days_before_start=te.days_before_start,
+                sort_order=te.sort_order,
+                assignee_id=te.default_assignee_id,
+                dependency_ids=tuple(d.pk for d in te.dependencies.all() if d.pk in te_ids),
+                dependent_ids=tuple(d.pk for d in te.dependents.all() if d.pk in te_ids),
+            )
+            for te in template_entities
+        ],
+        'user_ids': user_ids,
+    }
+
+
+def preview_onboarding_from_template(template_id, start_date):
+    """Compute what create_onboarding_from_template would produce, without writing.
+
+    Returns the generated tasks with deadlines and initial status, and the
+    "ready" notifications that would fire. Served from the per-version template
+    caches, so a warm preview costs the version lookup and one name lookup
+    each for entities and users. Returns None if the template does not exist.
+    """
+    from apps.core.models import SystemUser
+    from apps.entities.models import Entity
+    from apps.onboarding.models import TaskStatus
+    from apps.onboarding.services import STATUS_LABELS
+
+    version = _get_template_version(template_id)
+    if version is None:
+        return None
+    snapshot = _cached_for_version(_snapshot_cache, template_id, version, _build_template_snapshot)
+    rule_index = _cached_for_version(_rule_index_cache, template_id, version, _compile_rule_index)
+    entity_names = dict(
+        Entity.objects
+        .filter(pk__in={t.entity_id for t in snapshot['tasks']})
+        .values_list('pk', 'name')
+    )
+    user_names = dict(SystemUser.objects.filter(pk__in=snapshot['user_ids']).values_list('pk', 'name'))
+    by_te = {t.template_entity_id: t for t in snapshot['tasks']}
+
+    tasks = []
+    notifications = []
+    for t in snapshot['tasks']:
+        status = TaskStatus.PENDING if t.dependency_ids else TaskStatus.READY
+        tasks.append({
+            'name': entity_names[t.entity_id],
+            'deadline': _template_deadline(t, start_date),
+            'assignee_name': user_names.get(t.assignee_id, ''),
+            'status': status,
+            'dependency_names': [entity_names[by_te[d].entity_id] for d in t.dependency_ids],
+        })
+        if status != TaskStatus.READY:
+            continue
+        for rule in rule_index.get((t.template_entity_id, 'ready'), []):
+            direct = set()
+            if rule.notify_user_id:
+                direct.add(rule.notify_user_id)
+            if rule.notify_assignee and t.assignee_id:
+                direct.add(t.assignee_id)
+            recipients = set(direct)
+            if rule.notify_dependent_assignees:
+                recipients.update(
+                    by_te[d].assignee_id for d in t.dependent_ids if by_te[d].assignee_id
+                )
+            for user_id in sorted(recipients, key=lambda pk: user_names.get(pk, '')):
+                notifications.append({
+                    'recipient_name': user_names.get(user_id, ''),
+                    'title': f'Opgave {STATUS_LABELS["ready"]}: {entity_names[t.entity_id]}',
+                    'send_email': rule.send_email,
+                    'send_in_app': rule.send_in_app,
+                })
+
+    return {
+        'start_date': start_date,
+        'tasks': tasks,
+        'ready_count': sum(1 for t in tasks if t['status'] == TaskStatus.READY),
+        'notifications': notifications,
+    }
+
+
+def _initial_field_text(field_def):
+    """Initial value_text for a task field created from a field definition."""
+    if field_def.field_type == 'todolist':
+        # default_value stores newline-separated items; convert to JSON
+        if field_def.default_value.strip():
+            lines = [l.strip() for l in field_def.default_value.split('\n') if l.strip()]
+            return json.dumps(
+                [{'text': t, 'done': False} for t in lines],
+                ensure_ascii=False,
+            )
+        return '[]'
+    elif field_def.field_type == 'text':
+        return field_def.default_value
+    return ''
+
+
 def create_onboarding_from_template(template, new_employee_name, new_employee_email,
                                      new_employee_department, new_employee_position,
-                                     start_date, created_by):
-    """Instantiate an onboarding process from a template."""
+                                     start_date, created_by, preview=False):
+    """Instantiate an onboarding process from a template.
+
+    With ``preview`` nothing is written and the result of
+    preview_onboarding_from_template is returned instead of a process.
+    """
+    if preview:
+        return preview_onboarding_from_template(template.pk, start_date)
+    return _instantiate_template(
+        template, new_employee_name, new_employee_email, new_employee_department,
+        new_employee_position, start_date, created_by,
+    )
+
+
+@transaction.atomic
+def _instantiate_template(template, new_employee_name, new_employee_email,
+                          new_employee_department, new_employee_position,
+                          start_date, created_by):
     from apps.onboarding.models import (
-        OnboardingProcess, OnboardingTask, OnboardingTaskFieldValue,
-        TaskNotificationRule, TaskStatus,
+        OnboardingProcess, OnboardingTask, OnboardingTaskFieldValue, TaskStatus,
     )
 
     process = OnboardingProcess.objects.create(
@@ -67,45 +273,22 @@ def create_onboarding_from_template(template, new_employee_name, new_employee_em
             status=TaskStatus.PENDING,
             assignee=te.default_assignee,
             deadline=deadline,
+            next_reminder_at=reminder_date(te, deadline),
             sort_order=te.sort_order,
         )
         te_to_task[te.id] = task
 
         # Create field values
         for field_def in te.entity.custom_fields.all():
-            if field_def.field_type == 'todolist':
-                # default_value stores newline-separated items; convert to JSON
-                if field_def.default_value.strip():
-                    lines = [l.strip() for l in field_def.default_value.split('\n') if l.strip()]
-                    initial_text = json.dumps(
-                        [{'text': t, 'done': False} for t in lines],
-                        ensure_ascii=False,
-                    )
-                else:
-                    initial_text = '[]'
-            elif field_def.field_type == 'text':
-                initial_text = field_def.default_value
-            else:
-                initial_text = ''
             OnboardingTaskFieldValue.objects.create(
                 task=task,
                 field_definition=field_def,
-                value_text=initial_text,
+                value_text=_initial_field_text(field_def),
                 value_number=None,
                 value_checkbox=False,
             )
 
-        # Copy notification rules
-        for rule in te.notification_rules.all():
-            TaskNotificationRule.objects.create(
-                task=task,
-                notify_user=rule.notify_user,
-                notify_assignee=rule.notify_assignee,
-                notify_dependent_assignees=rule.notify_dependent_assignees,
-                trigger_status=rule.trigger_status,
-                send_email=rule.send_email,
-                send_in_app=rule.send_in_app,
-            )
+        # Notification rules are inherited from the template entity, not copied
 
     # Wire up dependencies
     for te in template.template_entities.prefetch_related('dependencies').all():
@@ -115,13 +298,19 @@ def create_onboarding_from_template(template, new_employee_name, new_employee_em
                 task.dependencies.add(te_to_task[dep_te.id])
 
     # Resolve initial statuses: tasks with no dependencies become READY
-    from apps.onboarding.services import _fire_notification_rules
+    from apps.onboarding.services import (
+        _fire_notification_rules, _send_pending_notifications, invalidate_task_counters,
+    )
 
-    for task in process.tasks.all():
+    rule_index = get_notification_rule_index(template.pk)
+    pending = []
+    for task in process.tasks.select_related('onboarding', 'assignee'):
         if not task.dependencies.exists():
             task.status = TaskStatus.READY
             task.save(update_fields=['status'])
-            _fire_notification_rules(task, 'ready')
+            _fire_notification_rules(task, 'ready', rule_index=rule_index, pending=pending)
+    _send_pending_notifications(pending)
+    transaction.on_commit(invalidate_task_counters)
 
     return process
 
@@ -170,3 +359,319 @@ def duplicate_template(template):
                 new_te.dependencies.add(old_to_new[dep.pk])
 
     return new_template
+
+
+# ---------------------------------------------------------------------------
+# Sync from template — propagate template edits to running onboardings
+# ---------------------------------------------------------------------------
+
+SYNC_CHUNK_SIZE = 100
+
+SYNC_COUNTERS = (
+    'tasks_added', 'deadlines_updated', 'assignees_updated', 'sort_orders_updated',
+    'dependencies_added', 'dependencies_removed', 'tasks_readied', 'tasks_blocked',
+)
+
+
+def _template_deadline(template_entity, start_date):
+    if template_entity.days_before_start is None:
+        return None
+    return start_date - timedelta(days=template_entity.days_before_start)
+
+
+def reminder_date(template_entity, deadline):
+    """Day the due-soon reminder for a task with ``deadline`` is sent, or None."""
+    if deadline is None or template_entity is None or template_entity.remind_days_before is None:
+        return None
+    return deadline - timedelta(days=template_entity.remind_days_before)
+
+
+def get_running_processes(template):
+    """Onboardings created from this template that still have open tasks."""
+    from apps.onboarding.models import OnboardingProcess, TaskStatus
+    return OnboardingProcess.objects.filter(
+        template=template,
+        tasks__status__in=[TaskStatus.PENDING, TaskStatus.READY, TaskStatus.IN_PROGRESS],
+    ).distinct()
+
+
+def sync_onboardings_from_template(template, process_ids=None, dry_run=False,
+                                   chunk_size=SYNC_CHUNK_SIZE):
+    """Bring running onboardings in line with the current template.
+
+    Adds tasks for new template entities, updates deadlines, reminder dates,
+    assignees and sort order of open tasks (unless overridden by hand),
+    mirrors template dependencies and re-resolves PENDING/READY statuses.
+    Processes are handled in chunks, each chunk in its own transaction with
+    set-based writes.
+
+    Returns a report with the changes per process and in total. With
+    ``dry_run`` the report is computed without writing anything.
+    """
+    running = get_running_processes(template)
+    if process_ids is not None:
+        running = running.filter(pk__in=process_ids)
+    all_ids = list(running.order_by('pk').values_list('pk', flat=True))
+
+    template_entities = list(
+        template.template_entities
+        .select_related('entity')
+        .prefetch_related('entity__custom_fields', 'dependencies')
+    )
+    te_by_id = {te.pk: te for te in template_entities}
+    desired_edges = {
+        (te.pk, dep.pk)
+        for te in template_entities
+        for dep in te.dependencies.all()
+        if dep.pk in te_by_id
+    }
+
+    report = {
+        'dry_run': dry_run,
+        'processes_checked': len(all_ids),
+        'processes': [],
+        'totals': dict.fromkeys(SYNC_COUNTERS, 0),
+    }
+    for start in range(0, len(all_ids), chunk_size):
+        chunk = all_ids[start:start + chunk_size]
+        with transaction.atomic():
+            entries = _sync_chunk(template, chunk, te_by_id, desired_edges, dry_run)
+        for entry in entries:
+            report['processes'].append(entry)
+            for key in SYNC_COUNTERS:
+                report['totals'][key] += entry[key]
+    return report
+
+
+def _sync_chunk(template, process_ids, te_by_id, desired_edges, dry_run):
+    """Compute (and unless dry_run, apply) the template diff for a chunk of processes."""
+    from apps.onboarding.models import (
+        OnboardingProcess, OnboardingTask, OnboardingTaskFieldValue, TaskStatus,
+    )
+    from apps.onboarding.services import (
+        _fire_notification_rules, _send_pending_notifications, record_task_changes,
+    )
+
+    done = {TaskStatus.COMPLETED, TaskStatus.SKIPPED}
+    today = timezone.now().date()
+    Dependency = OnboardingTask.dependencies.through
+
+    processes = {
+        p['pk']: p for p in OnboardingProcess.objects.filter(pk__in=process_ids).values(
+            'pk', 'new_employee_name', 'start_date',
+        )
+    }
+    tasks = list(OnboardingTask.objects.filter(onboarding_id__in=process_ids).only(
+        'pk', 'onboarding_id', 'source_template_entity_id', 'status', 'assignee_id',
+        'assignee_overridden', 'deadline', 'deadline_overridden', 'sort_order',
+        'overdue_level', 'overdue_notified_at', 'next_reminder_at',
+    ))
+    task_by_id = {t.pk: t for t in tasks}
+    tasks_by_process = {}
+    for t in tasks:
+        tasks_by_process.setdefault(t.onboarding_id, []).append(t)
+    edges_by_process = {}
+    for edge_pk, from_id, to_id in Dependency.objects.filter(
+        from_onboardingtask__onboarding_id__in=process_ids,
+    ).values_list('pk', 'from_onboardingtask_id', 'to_onboardingtask_id'):
+        process_id = task_by_id[from_id].onboarding_id
+        edges_by_process.setdefault(process_id, []).append((edge_pk, from_id, to_id))
+
+    # (process_id, template_entity_id) -> task pk, filled in for new tasks after insert
+    te_task_ids = {}
+    new_tasks = []
+    new_ready = []
+    changed_tasks = []
+    assignee_updates = {}
+    edges_to_add = []
+    edge_pks_to_remove = []
+    readied_ids = []
+    blocked_ids = []
+    entries = []
+
+    for process_id in process_ids:
+        process = processes[process_id]
+        counts = dict.fromkeys(SYNC_COUNTERS, 0)
+
+        by_te = {}
+        for t in tasks_by_process.get(process_id, []):
+            if t.source_template_entity_id in te_by_id:
+                by_te.setdefault(t.source_template_entity_id, t)
+
+        def node(task):
+            # Template tasks are keyed by template entity so new tasks fit the same graph
+            te_id = task.source_template_entity_id
+            if by_te.get(te_id) is task:
+                return ('te', te_id)
+            return ('task', task.pk)
+
+        status = {node(t): t.status for t in tasks_by_process.get(process_id, [])}
+        for te_id, t in by_te.items():
+            te_task_ids[(process_id, te_id)] = t.pk
+        missing = [te_id for te_id in te_by_id if te_id not in by_te]
+        for te_id in missing:
+            status[('te', te_id)] = TaskStatus.PENDING
+        counts['tasks_added'] = len(missing)
+
+        # Field changes on existing template tasks
+        for te_id, t in by_te.items():
+            te = te_by_id[te_id]
+            changed = False
+            if t.sort_order != te.sort_order:
+                t.sort_order = te.sort_order
+                counts['sort_orders_updated'] += 1
+                changed = True
+            if t.status not in done:
+                deadline = _template_deadline(te, process['start_date'])
+                if not t.deadline_overridden and t.deadline != deadline:
+                    t.deadline = deadline
+                    t.overdue_level = 0
+                    t.overdue_notified_at = None
+                    t.next_reminder_at = reminder_date(te, deadline)
+                    counts['deadlines_updated'] += 1
+                    changed = True
+                else:
+                    # Follow a changed reminder setting unless the reminder has gone out
+                    reminder = reminder_date(te, t.deadline)
+                    if t.next_reminder_at != reminder and (
+                        t.next_reminder_at is not None or (reminder and reminder >= today)
+                    ):
+                        t.next_reminder_at = reminder
+                        changed = True
+                if not t.assignee_overridden and t.assignee_id != te.default_assignee_id:
+                    assignee_updates.setdefault(te.default_assignee_id, []).append(t.pk)
+                    counts['assignees_updated'] += 1
+            if changed:
+                changed_tasks.append(t)
+
+        # Dependencies between template tasks mirror the template; others are kept
+        deps = {}
+        existing_te_edges = {}
+        for edge_pk, from_id, to_id in edges_by_process.get(process_id, []):
+            a, b = node(task_by_id[from_id]), node(task_by_id[to_id])
+            if a[0] == 'te' and b[0] == 'te':
+                existing_te_edges[(a[1], b[1])] = edge_pk
+            else:
+                deps.setdefault(a, set()).add(b)
+        for edge, edge_pk in existing_te_edges.items():
+            if edge not in desired_edges:
+                edge_pks_to_remove.append(edge_pk)
+                counts['dependencies_removed'] += 1
+        for te_id, dep_id in desired_edges:
+            deps.setdefault(('te', te_id), set()).add(('te', dep_id))
+            if (te_id, dep_id) not in existing_te_edges:
+                edges_to_add.append((process_id, te_id, dep_id))
+                counts['dependencies_added'] += 1
+
+        # Re-resolve READY/PENDING against the new dependency graph
+        new_status = {}
+        for n, st in status.items():
+            if n[0] != 'te' or st not in (TaskStatus.PENDING, TaskStatus.READY):
+                continue
+            blocked = any(status[d] not in done for d in deps.get(n, ()))
+            is_new = n[1] in missing
+            if st == TaskStatus.PENDING and not blocked:
+                new_status[n[1]] = TaskStatus.READY
+                counts['tasks_readied'] += 1
+                if is_new:
+                    new_ready.append((process_id, n[1]))
+                else:
+                    readied_ids.append(by_te[n[1]].pk)
+            elif st == TaskStatus.READY and blocked:
+                blocked_ids.append(by_te[n[1]].pk)
+                counts['tasks_blocked'] += 1
+
+        for te_id in missing:
+            te = te_by_id[te_id]
+            deadline = _template_deadline(te, process['start_date'])
+            new_tasks.append(OnboardingTask(
+                onboarding_id=process_id,
+                source_template_entity_id=te_id,
+                entity_id=te.entity_id,
+                name=te.entity.name,
+                description=te.entity.description,
+                status=new_status.get(te_id, TaskStatus.PENDING),
+                assignee_id=te.default_assignee_id,
+                deadline=deadline,
+                next_reminder_at=reminder_date(te, deadline),
+                sort_order=te.sort_order,
+            ))
+
+        if any(counts.values()):
+            entries.append({
+                'process_id': process_id,
+                'new_employee_name': process['new_employee_name'],
+                **counts,
+            })
+
+    if dry_run:
+        return entries
+
+    if new_tasks:
+        OnboardingTask.objects.bulk_create(new_tasks, batch_size=500)
+        # Re-read the new pks; not every backend returns them from bulk inserts
+        for pk, process_id, te_id in OnboardingTask.objects.filter(
+            onboarding_id__in=process_ids,
+            source_template_entity_id__in={t.source_template_entity_id for t in new_tasks},
+        ).exclude(pk__in=task_by_id).values_list('pk', 'onboarding_id', 'source_template_entity_id'):
+            te_task_ids[(process_id, te_id)] = pk
+        OnboardingTaskFieldValue.objects.bulk_create([
+            OnboardingTaskFieldValue(
+                task_id=te_task_ids[(t.onboarding_id, t.source_template_entity_id)],
+                field_definition=field_def,
+                value_text=_initial_field_text(field_def),
+            )
+            for t in new_tasks
+            for field_def in te_by_id[t.source_template_entity_id].entity.custom_fields.all()
+        ], batch_size=500)
+
+    if changed_tasks:
+        OnboardingTask.objects.bulk_update(
+            changed_tasks,
+            ['deadline', 'sort_order', 'overdue_level', 'overdue_notified_at', 'next_reminder_at'],
+            batch_size=500,
+        )
+    for assignee_id, task_ids in assignee_updates.items():
+        OnboardingTask.objects.filter(pk__in=task_ids).update(assignee_id=assignee_id)
+
+    if edge_pks_to_remove:
+        Dependency.objects.filter(pk__in=edge_pks_to_remove).delete()
+    if edges_to_add:
+        Dependency.objects.bulk_create([
+            Dependency(
+                from_onboardingtask_id=te_task_ids[(process_id, te_id)],
+                to_onboardingtask_id=te_task_ids[(process_id, dep_id)],
+            )
+            for process_id, te_id, dep_id in edges_to_add
+        ], batch_size=500)
+
+    if readied_ids:
+        OnboardingTask.objects.filter(pk__in=readied_ids).update(status=TaskStatus.READY)
+    if blocked_ids:
+        OnboardingTask.objects.filter(pk__in=blocked_ids).update(status=TaskStatus.PENDING)
+
+    if entries:
+        # Stamp every written task so open detail pages pick the changes up
+        touched = {t.pk for t in changed_tasks} | set(readied_ids) | set(blocked_ids)
+        touched.update(pk for task_ids in assignee_updates.values() for pk in task_ids)
+        touched.update(te_task_ids[(t.onboarding_id, t.source_template_entity_id)] for t in new_tasks)
+        touched.update(te_task_ids[(process_id, te_id)] for process_id, te_id, _ in edges_to_add)
+        removed = set(edge_pks_to_remove)
+        touched.update(
+            from_id
+            for edges in edges_by_process.values()
+            for edge_pk, from_id, _ in edges
+            if edge_pk in removed
+        )
+        record_task_changes(touched, [entry['process_id'] for entry in entries])
+
+    ready_ids = readied_ids + [te_task_ids[key] for key in new_ready]
+    if ready_ids:
+        rule_index = get_notification_rule_index(template.pk)
+        pending = []
+        ready = OnboardingTask.objects.filter(pk__in=ready_ids).select_related('onboarding', 'assignee')
+        for task in ready:
+            _fire_notification_rules(task, 'ready', rule_index=rule_index, pending=pending)
+        _send_pending_notifications(pending)
+
+    return entries
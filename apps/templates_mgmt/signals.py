@@ -0,0 +1,37 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import OnboardingTemplate, TemplateEntity, TemplateEntityNotificationRule
+
+
+@receiver(post_save, sender=TemplateEntity)
+@receiver(post_delete, sender=TemplateEntity)
+def template_entity_changed(sender, instance, **kwargs):
+    OnboardingTemplate.bump_version(instance.template_id)
+
+
+@receiver(m2m_changed, sender=TemplateEntity.dependencies.through)
+def template_dependencies_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        OnboardingTemplate.bump_version(instance.template_id)
+
+
+@receiver(post_save, sender=TemplateEntityNotificationRule)
+@receiver(post_delete, sender=TemplateEntityNotificationRule)
+def template_rule_changed(sender, instance, **kwargs):
+    template_id = (
+        TemplateEntity.objects
+        .filter(pk=instance.template_entity_id)
+        .values_list('template_id', flat=True)
+        .first()
+    )
+    # When the whole template entity is being deleted its own signal bumps the version
+    if template_id is not None:
+        OnboardingTemplate.bump_version(template_id)
+
+
+@receiver(pre_delete, sender=TemplateEntity)
+def detach_inheriting_tasks(sender, instance, **kwargs):
+    """Tasks that inherit rules from a template entity keep them when it is removed."""
+    from apps.onboarding.services import override_notification_rules_for_template_entity
+    override_notification_rules_for_template_entity(instance)
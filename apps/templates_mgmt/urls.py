@@ -16,4 +16,5 @@ urlpatterns = [
     path('<int:pk>/entities/<int:te_pk>/notifications/', views.ManageNotificationRulesView.as_view(), name='notifications'),
     path('<int:pk>/reorder/', views.ReorderEntitiesView.as_view(), name='reorder'),
     path('<int:pk>/duplicate/', views.TemplateDuplicateView.as_view(), name='duplicate'),
+    path('<int:pk>/sync/', views.TemplateSyncView.as_view(), name='sync'),
 ]
@@ -12,7 +12,7 @@ from .forms import (
     TemplateEntityDependencyForm, TemplateEntityForm,
 )
 from .models import OnboardingTemplate, TemplateEntity, TemplateEntityNotificationRule
-from .services import duplicate_template, validate_dependencies
+from .services import duplicate_template, sync_onboardings_from_template, validate_dependencies
 
 
 class TemplateListView(View):
@@ -260,3 +260,25 @@ class TemplateDuplicateView(View):
         new_template = duplicate_template(template)
         messages.success(request, f'Skabelonen "{template.name}" er kopieret til "{new_template.name}".')
         return redirect('templates_mgmt:detail', pk=new_template.pk)
+
+
+class TemplateSyncView(View):
+    """Preview (GET) and apply (POST) template changes to running onboardings."""
+
+    def get(self, request, pk):
+        template = get_object_or_404(OnboardingTemplate, pk=pk)
+        report = sync_onboardings_from_template(template, dry_run=True)
+        return render(request, 'templates_mgmt/template_sync.html', {
+            'template': template,
+            'report': report,
+        })
+
+    def post(self, request, pk):
+        template = get_object_or_404(OnboardingTemplate, pk=pk)
+        process_ids = [int(p) for p in request.POST.getlist('process_ids') if p.isdigit()]
+        report = sync_onboardings_from_template(template, process_ids=process_ids)
+        messages.success(
+            request,
+            f'{len(report["processes"])} igangværende onboardings er opdateret fra skabelonen.',
+        )
+        return redirect('templates_mgmt:detail', pk=template.pk)
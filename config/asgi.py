@@ -3,6 +3,9 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving through ASGI (e.g. ``uvicorn config.asgi:application``) enables the
+live notification stream; under WSGI the navbar falls back to polling.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -27,6 +27,7 @@ INSTALLED_APPS = [
     'apps.templates_mgmt',
     'apps.onboarding',
     'apps.notifications',
+    'apps.search',
 ]
 
 MIDDLEWARE = [
@@ -38,6 +39,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_htmx.middleware.HtmxMiddleware',
+    'apps.core.middleware.CurrentUserMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -65,6 +67,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Writers from several processes (check_overdue --workers, run_scheduler)
+        # queue for the write lock at BEGIN instead of failing as "locked"
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
     }
 }
 
@@ -85,6 +90,19 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Shared by every process on this host (web workers, run_scheduler, management
+# commands), so an invalidation in one reaches the others. SQLite already keeps
+# the app on a single host.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
 # Email (console for development)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 DEFAULT_FROM_EMAIL = 'onboarding@kentaur.dk'
+# Prefixed to links in plain-text notification emails
+SITE_URL = 'http://localhost:8000'
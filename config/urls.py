@@ -8,4 +8,5 @@ urlpatterns = [
     path('templates/', include('apps.templates_mgmt.urls')),
     path('onboarding/', include('apps.onboarding.urls')),
     path('notifications/', include('apps.notifications.urls')),
+    path('search/', include('apps.search.urls')),
 ]
@@ -8,3 +8,42 @@ document.body.addEventListener('htmx:configRequest', function(event) {
         event.detail.headers['X-CSRFToken'] = csrfToken.value;
     }
 });
+
+// Navbar counters: the heartbeat follows the notification stream's events
+// and falls back to polling only while no stream is connected
+(function() {
+    const heartbeat = document.getElementById('heartbeat');
+    const badge = document.getElementById('notification-badge');
+    if (!heartbeat) {
+        return;
+    }
+    let polling = null;
+    function beat() {
+        htmx.trigger(heartbeat, 'heartbeat');
+    }
+    function poll() {
+        if (!polling) {
+            polling = setInterval(beat, 30000);
+        }
+    }
+    if (!window.EventSource) {
+        poll();
+        return;
+    }
+    const source = new EventSource(badge.dataset.streamUrl);
+    source.addEventListener('open', function() {
+        clearInterval(polling);
+        polling = null;
+    });
+    source.addEventListener('error', poll);
+    source.addEventListener('heartbeat', beat);
+    source.addEventListener('unread', function(event) {
+        badge.innerHTML = event.data;
+    });
+    source.addEventListener('notification', function(event) {
+        beat();
+        document.body.dispatchEvent(new CustomEvent('notification:new', {
+            detail: JSON.parse(event.data),
+        }));
+    });
+})();
@@ -9,6 +9,9 @@ entire database after each test. TestCase uses transaction rollback instead.
 import os
 import sys
 import json
+import socketserver
+import tempfile
+import threading
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 sys.path.insert(0, os.path.dirname(__file__))
@@ -17,7 +20,7 @@ import django
 django.setup()
 
 from datetime import date, timedelta
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from apps.core.models import SystemUser
 from apps.entities.models import Entity, CustomFieldDefinition, FieldType, Category
 from apps.templates_mgmt.models import OnboardingTemplate, TemplateEntity
@@ -26,6 +29,121 @@ from apps.onboarding.models import OnboardingProcess, OnboardingTask, Onboarding
 from apps.onboarding.services import change_task_status, complete_task, skip_task, start_task
 
 
+class LocalSMTPServer:
+    """Minimal in-process SMTP stand-in. Recipients in ``reject`` get a 550;
+    those in ``flaky`` get a 451 for their first N deliveries."""
+
+    def __init__(self, reject=(), flaky=None):
+        self.messages = []
+        self.connections = 0
+        self.reject = set(reject)
+        self.flaky = dict(flaky or {})
+        smtp = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(line.encode() + b'\r\n')
+
+            def handle(self):
+                smtp.connections += 1
+                self.reply('220 localhost ready')
+                recipients = []
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode().strip()
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.reply('250 localhost')
+                    elif verb == 'MAIL':
+                        recipients = []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        address = command.split(':', 1)[1].strip().strip('<>')
+                        if address in smtp.reject:
+                            self.reply('550 Mailbox unavailable')
+                        elif smtp.flaky.get(address):
+                            smtp.flaky[address] -= 1
+                            self.reply('451 Try again later')
+                        else:
+                            recipients.append(address)
+                            self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        data = []
+                        for data_line in iter(self.rfile.readline, b'.\r\n'):
+                            data.append(data_line)
+                        smtp.messages.append((recipients, b''.join(data)))
+                        self.reply('250 OK')
+                    elif verb in ('RSET', 'NOOP'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Not implemented')
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self):
+        return {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': '127.0.0.1',
+            'EMAIL_PORT': self.port,
+        }
+
+
+class LocalDirectoryServer:
+    """In-process stand-in for a Graph-style directory endpoint. ``pages``
+    maps a request path (with query) to the JSON page served for it."""
+
+    def __init__(self, pages):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.pages = pages
+        self.requests = []
+        directory = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                directory.requests.append(self.path)
+                page = directory.pages.get(self.path)
+                body = json.dumps(page).encode()
+                self.send_response(200 if page is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+    'LOCATION': tempfile.mkdtemp(),
+}})
 class AllFeaturesTest(TestCase):
     """Each test wrapped in a transaction that rolls back — production data is NEVER affected."""
 
@@ -416,6 +534,1628 @@ class AllFeaturesTest(TestCase):
         self.assertIn('href=', latest.message)
         self._p("Notification message has HTML links")
 
+    # ------------------------------------------------------------------
+    # Test 12: Notification rules are shared with the template
+    # ------------------------------------------------------------------
+    def test_12_shared_notification_rules(self):
+        print("\n=== Test 12: Shared template notification rules ===")
+        from apps.onboarding.models import TaskNotificationRule
+        from apps.onboarding.services import get_task_notification_rules
+        from apps.notifications.models import Notification
+        from apps.templates_mgmt.models import TemplateEntityNotificationRule
+
+        rule = TemplateEntityNotificationRule.objects.create(
+            template_entity=self.te, notify_user=self.user2, trigger_status='in_progress',
+        )
+        self.assertFalse(TaskNotificationRule.objects.filter(task=self.task).exists())
+        self._p("No per-task rule copies created")
+
+        start_task(self.task)
+        self.assertEqual(Notification.objects.filter(recipient=self.user2).count(), 1)
+        self._p("Inherited rule fires")
+
+        rule.trigger_status = 'completed'
+        rule.save()
+        self.assertEqual(len(get_task_notification_rules(self.task, 'in_progress')), 0)
+        self.assertEqual(len(get_task_notification_rules(self.task, 'completed')), 1)
+        self._p("Template rule edits reach running tasks")
+
+        self.te.delete()
+        self.task.refresh_from_db()
+        self.assertTrue(self.task.notification_rules_overridden)
+        self.assertEqual(self.task.notification_rules.count(), 1)
+        self.assertEqual(len(get_task_notification_rules(self.task, 'completed')), 1)
+        self._p("Tasks keep their rules when the template entity is deleted")
+
+    # ------------------------------------------------------------------
+    # Test 13: Sync template changes to running onboardings
+    # ------------------------------------------------------------------
+    def test_13_sync_from_template(self):
+        print("\n=== Test 13: Sync from template ===")
+        from apps.templates_mgmt.services import sync_onboardings_from_template
+
+        e2 = Entity.objects.create(name='_Test Sync E2', description='', category=self.cat)
+        CustomFieldDefinition.objects.create(entity=e2, name='Note', field_type=FieldType.TEXT)
+        te2 = TemplateEntity.objects.create(
+            template=self.template, entity=e2, sort_order=1,
+            default_assignee=self.user2, days_before_start=3,
+        )
+        te2.dependencies.add(self.te)
+        self.te.default_assignee = self.user1
+        self.te.save()
+
+        resp = Client().get(f'/templates/{self.template.pk}/sync/')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('Test Person X', resp.content.decode())
+        self._p("Sync preview page lists the onboarding")
+
+        report = sync_onboardings_from_template(self.template, dry_run=True)
+        self.assertEqual(report['totals']['tasks_added'], 1)
+        self.assertEqual(report['totals']['assignees_updated'], 1)
+        self.assertEqual(report['totals']['dependencies_added'], 1)
+        self.assertEqual(self.process.tasks.count(), 1)
+        self._p("Dry run reports changes without writing")
+
+        sync_onboardings_from_template(self.template)
+        new_task = self.process.tasks.get(source_template_entity=te2)
+        self.assertEqual(new_task.status, TaskStatus.PENDING)
+        self.assertEqual(new_task.assignee, self.user2)
+        self.assertEqual(new_task.deadline, self.process.start_date - timedelta(days=3))
+        self.assertEqual(list(new_task.dependencies.all()), [self.task])
+        self.assertEqual(new_task.field_values.count(), 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.assignee, self.user1)
+        self._p("New task, dependency and assignee applied")
+
+        report = sync_onboardings_from_template(self.template, dry_run=True)
+        self.assertEqual(report['processes'], [])
+        self._p("Second sync is a no-op")
+
+        complete_task(self.task, self.user1)
+        new_task.refresh_from_db()
+        self.assertEqual(new_task.status, TaskStatus.READY)
+        self._p("Synced dependency cascades")
+
+    # ------------------------------------------------------------------
+    # Test 14: Dry-run instantiation preview
+    # ------------------------------------------------------------------
+    def test_14_instantiation_preview(self):
+        print("\n=== Test 14: Dry-run instantiation preview ===")
+        from apps.onboarding.models import OnboardingProcess
+        from apps.templates_mgmt.models import TemplateEntityNotificationRule
+
+        e2 = Entity.objects.create(name='_Test Preview E2', description='', category=self.cat)
+        te2 = TemplateEntity.objects.create(
+            template=self.template, entity=e2, sort_order=1,
+            default_assignee=self.user2, days_before_start=2,
+        )
+        te2.dependencies.add(self.te)
+        TemplateEntityNotificationRule.objects.create(
+            template_entity=self.te, notify_dependent_assignees=True, trigger_status='ready',
+        )
+        start = date.today() + timedelta(days=10)
+        processes_before = OnboardingProcess.objects.count()
+
+        preview = create_onboarding_from_template(
+            template=self.template, new_employee_name='Preview X', new_employee_email='',
+            new_employee_department='', new_employee_position='',
+            start_date=start, created_by=self.user1, preview=True,
+        )
+        self.assertEqual(OnboardingProcess.objects.count(), processes_before)
+        self._p("Preview writes nothing")
+        self.assertEqual([t['status'] for t in preview['tasks']], ['ready', 'pending'])
+        self.assertEqual(preview['tasks'][1]['deadline'], start - timedelta(days=2))
+        self.assertEqual(preview['ready_count'], 1)
+        self.assertEqual([n['recipient_name'] for n in preview['notifications']], [self.user2.name])
+        self._p("Preview has statuses, deadlines and notifications")
+
+        url = f'/onboarding/create/preview/?template={self.template.pk}&start_date={start.isoformat()}'
+        with self.assertNumQueries(3):
+            resp = Client().get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('_Test Preview E2', resp.content.decode())
+        self._p("Warm HTMX preview costs a version lookup and two name lookups")
+
+        Entity.objects.filter(pk=e2.pk).update(name='_Test Omdøbt E2')
+        SystemUser.objects.filter(pk=self.user2.pk).update(name='Omdøbt X2')
+        html = Client().get(url).content.decode()
+        self.assertIn('_Test Omdøbt E2', html)
+        self.assertIn('Omdøbt X2', html)
+        self._p("Renamed entities and users show up without a template change")
+
+        resp = Client().get('/onboarding/create/')
+        self.assertIn(b'onboarding-preview', resp.content)
+        self._p("Create page wires up the preview fragment")
+
+    # ------------------------------------------------------------------
+    # Test 15: Transactional email outbox
+    # ------------------------------------------------------------------
+    def test_15_email_outbox(self):
+        print("\n=== Test 15: Transactional email outbox ===")
+        from django.core import mail
+        from django.core.management import call_command
+        from django.test import override_settings
+        from apps.notifications.models import EmailOutbox, Notification
+        from apps.notifications.services import send_notification
+
+        self.user2.email = 'reject@test.dk'
+        self.user2.save()
+        for recipient in (self.user1, self.user1, self.user2):
+            send_notification(recipient, 'task_ready', 'Titel', 'Besked')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutbox.objects.filter(sent_at__isnull=True).count(), 3)
+        self._p("Emails are queued, not sent inline")
+
+        with LocalSMTPServer(reject={'reject@test.dk'}) as smtp:
+            with override_settings(**smtp.settings()):
+                call_command('send_outbox', stdout=open(os.devnull, 'w'))
+        self.assertEqual(len(smtp.messages), 2)
+        self.assertEqual(smtp.connections, 1)
+        self._p("Two emails delivered over one SMTP connection")
+
+        self.assertEqual(Notification.objects.filter(recipient=self.user1, email_sent=True).count(), 2)
+        failed = EmailOutbox.objects.get(sent_at__isnull=True)
+        self.assertEqual(failed.to_email, 'reject@test.dk')
+        self.assertIn('550', failed.last_error)
+        self._p("Sent marked in bulk, rejected mail stays queued with its error")
+
+    # ------------------------------------------------------------------
+    # Test 16: Cascade notifications are written in one statement
+    # ------------------------------------------------------------------
+    def test_16_batched_cascade_notifications(self):
+        print("\n=== Test 16: Batched cascade notifications ===")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.notifications.models import Notification
+        from apps.templates_mgmt.models import TemplateEntityNotificationRule
+
+        tmpl = OnboardingTemplate.objects.create(name='_Test Fanout Tmpl')
+        root = TemplateEntity.objects.create(
+            template=tmpl, entity=self.entity, sort_order=0, default_assignee=self.user1,
+        )
+        TemplateEntityNotificationRule.objects.create(
+            template_entity=root, notify_dependent_assignees=True, trigger_status='completed',
+        )
+        for i in range(30):
+            entity = Entity.objects.create(name=f'_Test Fanout {i:02d}', category=self.cat)
+            te = TemplateEntity.objects.create(
+                template=tmpl, entity=entity, sort_order=i + 1, default_assignee=self.user2,
+            )
+            te.dependencies.add(root)
+            TemplateEntityNotificationRule.objects.create(
+                template_entity=te, notify_assignee=True, trigger_status='ready',
+            )
+        proc = create_onboarding_from_template(
+            template=tmpl, new_employee_name='Fanout X', new_employee_email='',
+            new_employee_department='', new_employee_position='',
+            start_date=date.today() + timedelta(days=30), created_by=self.user1,
+        )
+        root_task = proc.tasks.get(source_template_entity=root)
+
+        with CaptureQueriesContext(connection) as ctx:
+            complete_task(root_task, self.user1)
+        inserts = [q for q in ctx.captured_queries
+                   if q['sql'].startswith('INSERT')
+                   and 'INTO "notifications_notification"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        self._p("One INSERT for the whole cascade")
+
+        self.assertEqual(proc.tasks.filter(status=TaskStatus.READY).count(), 30)
+        # 30 "ready" notifications plus one dependent-assignee summary
+        self.assertEqual(Notification.objects.filter(related_onboarding=proc).count(), 31)
+        summary = Notification.objects.get(related_task=root_task)
+        self.assertEqual(summary.message.count('href='), 30)
+        self._p("All 31 notifications persisted with task links")
+
+    # ------------------------------------------------------------------
+    # Test 17: Per-recipient digests
+    # ------------------------------------------------------------------
+    def test_17_notification_digests(self):
+        print("\n=== Test 17: Per-recipient digests ===")
+        from django.core import mail
+        from apps.core.models import EmailDelivery
+        from apps.notifications.models import EmailOutbox, Notification
+        from apps.notifications.services import send_digests, send_notification, send_outbox_batch
+
+        self.user2.email_delivery = EmailDelivery.HOURLY
+        self.user2.save()
+        other = create_onboarding_from_template(
+            template=self.template, new_employee_name='Digest Y', new_employee_email='',
+            new_employee_department='', new_employee_position='',
+            start_date=date.today() + timedelta(days=14), created_by=self.user1,
+        )
+        for process in (self.process, other, self.process):
+            send_notification(self.user2, 'task_ready', f'Klar i {process.pk}', 'Besked',
+                              related_onboarding=process)
+        send_notification(self.user1, 'task_ready', 'Straks', 'Besked')
+
+        self.assertEqual(send_outbox_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self._p("Immediate mail sent, digest mail held back")
+
+        self.assertEqual(send_digests(EmailDelivery.DAILY), (0, 0, 0))
+        self.assertEqual(send_digests(EmailDelivery.HOURLY), (1, 3, 0))
+        digest = mail.outbox[1]
+        self.assertEqual(digest.to, ['testx2@test.dk'])
+        self.assertIn('Test Person X', digest.body)
+        self.assertIn('Digest Y', digest.body)
+        self.assertEqual(digest.body.count('Test Person X'), 1)
+        self._p("One digest email grouped by onboarding")
+
+        self.assertFalse(EmailOutbox.objects.filter(sent_at__isnull=True).exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.user2, email_sent=True).count(), 3)
+        self._p("Digest entries marked sent in bulk")
+
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.test import override_settings
+        from django.utils import timezone
+
+        class Crash(BaseException):
+            pass
+
+        class FlakyBackend(EmailBackend):
+            def __init__(self, crash=(), fail=(), **kwargs):
+                super().__init__(**kwargs)
+                self.crash, self.fail = set(crash), set(fail)
+
+            def send_messages(self, messages):
+                if messages[0].to[0] in self.crash:
+                    raise Crash
+                if messages[0].to[0] in self.fail:
+                    raise ConnectionError('451 prøv igen')
+                return super().send_messages(messages)
+
+        self.user1.email_delivery = EmailDelivery.HOURLY
+        self.user1.save()
+        for user in (self.user1, self.user2):
+            send_notification(user, 'task_ready', 'Igen', 'Besked')
+        with self.assertRaises(Crash):
+            send_digests(EmailDelivery.HOURLY, connection=FlakyBackend(crash=['testx2@test.dk']))
+        pending = EmailOutbox.objects.filter(sent_at__isnull=True)
+        self.assertEqual(list(pending.values_list('to_email', flat=True)), ['testx2@test.dk'])
+        self._p("Each recipient is marked sent right after their digest, so a crash resends nothing")
+
+        self.assertEqual(send_digests(EmailDelivery.HOURLY, connection=FlakyBackend(fail=['testx2@test.dk'])), (0, 0, 1))
+        entry = pending.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn('451', entry.last_error)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertEqual(send_digests(EmailDelivery.HOURLY), (0, 0, 0))
+        with override_settings(OUTBOX_MAX_ATTEMPTS=2):
+            pending.update(next_attempt_at=timezone.now())
+            send_digests(EmailDelivery.HOURLY, connection=FlakyBackend(fail=['testx2@test.dk']))
+        self.assertIsNotNone(pending.get().dead_at)
+        self._p("Failed digests back off and are dead-lettered like other outbox mail")
+
+    # ------------------------------------------------------------------
+    # Test 18: Denormalized unread counter
+    # ------------------------------------------------------------------
+    def test_18_unread_counter(self):
+        print("\n=== Test 18: Denormalized unread counter ===")
+        from django.core.management import call_command
+        from apps.notifications.models import Notification
+        from apps.notifications.services import send_notifications
+
+        def count():
+            self.user2.refresh_from_db()
+            return self.user2.unread_count
+
+        send_notifications([
+            {'recipient': self.user2, 'notification_type': 'task_ready', 'title': f'T{i}', 'message': ''}
+            for i in range(4)
+        ])
+        self.assertEqual(count(), 4)
+        self._p("Creation increments the counter")
+
+        client = Client()
+        client.post('/switch-user/', {'user_id': self.user2.pk})
+        first, second, third, fourth = Notification.objects.filter(recipient=self.user2).order_by('pk')
+        client.post(f'/notifications/{first.pk}/mark-read/')
+        client.post(f'/notifications/{first.pk}/mark-read/')
+        self.assertEqual(count(), 3)
+        client.post(f'/notifications/{second.pk}/delete/')
+        self.assertEqual(count(), 2)
+        client.post(f'/notifications/{first.pk}/delete/')
+        self.assertEqual(count(), 2)
+        client.post('/notifications/mark-all-read/')
+        self.assertEqual(count(), 0)
+        client.post('/notifications/delete-all-read/')
+        self.assertEqual(count(), 0)
+        self._p("Read/delete views keep the counter in step")
+
+        send_notifications([{'recipient': self.user2, 'notification_type': 'task_ready', 'title': 'X', 'message': ''}])
+        with self.assertNumQueries(2):  # session + user row
+            resp = client.get('/notifications/unread-count/')
+        self.assertIn(b'>1</span>', resp.content)
+        self._p("Badge poll reads the counter from the user row")
+
+        SystemUser.objects.filter(pk=self.user2.pk).update(unread_count=99)
+        call_command('repair_unread_counts', stdout=open(os.devnull, 'w'))
+        self.assertEqual(count(), 1)
+        self._p("Repair command fixes drift")
+
+    # ------------------------------------------------------------------
+    # Test 19: Notification badge stream
+    # ------------------------------------------------------------------
+    def test_19_notification_stream(self):
+        print("\n=== Test 19: Notification badge stream ===")
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from apps.notifications.events import broker
+        from apps.notifications.services import send_notification
+
+        client = Client()
+        client.post('/switch-user/', {'user_id': self.user2.pk})
+        self.assertEqual(client.get('/notifications/stream/').status_code, 204)
+        self._p("WSGI requests get 204 and keep polling")
+
+        async def read_stream():
+            aclient = AsyncClient()
+            aclient.cookies = client.cookies
+            resp = await aclient.get('/notifications/stream/')
+            self.assertEqual(resp['Content-Type'], 'text/event-stream')
+            chunks = aiter(resp.streaming_content)
+            received = [await anext(chunks), await anext(chunks)]
+            broker.publish(self.user2.pk, 'unread', 7)
+            received.append(await anext(chunks))
+            await resp.streaming_content.aclose()
+            return [c.decode() if isinstance(c, bytes) else c for c in received]
+
+        received = async_to_sync(read_stream)()
+        self.assertEqual(received[0], 'retry: 5000\n\n')
+        self.assertTrue(received[1].startswith('event: unread\ndata: \n'))
+        self.assertTrue(received[2].startswith('event: unread\n'))
+        self.assertIn('>7</span>', received[2])
+        self.assertFalse(broker.has_subscribers(self.user2.pk))
+        self._p("ASGI stream sends the badge and pushes published counts")
+
+        with mock.patch.object(broker, 'publish') as publish, \
+                mock.patch.object(broker, 'subscribed', side_effect=lambda ids: list(ids)), \
+                mock.patch.object(broker, 'has_subscribers', return_value=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                send_notification(self.user2, 'task_ready', 'Hej', '')
+        events = {call.args[1]: call.args[2] for call in publish.call_args_list}
+        self.assertEqual(events['unread'], 1)
+        self.assertEqual(events['notification']['title'], 'Hej')
+        self._p("New notifications publish on commit")
+
+    # ------------------------------------------------------------------
+    # Test 20: Live detail page updates
+    # ------------------------------------------------------------------
+    def test_20_live_process_updates(self):
+        print("\n=== Test 20: Live detail page updates ===")
+        from asgiref.sync import async_to_sync, sync_to_async
+        from django.test import AsyncClient
+        from apps.onboarding.events import process_broker
+
+        dependent = OnboardingTask.objects.create(onboarding=self.process, name='Efter', sort_order=1)
+        dependent.dependencies.add(self.task)
+        other = OnboardingTask.objects.create(
+            onboarding=self.process, name='Anden', sort_order=2, status=TaskStatus.READY,
+        )
+        self.process.refresh_from_db()
+        start = self.process.version
+
+        client = Client()
+        resp = client.get(f'/onboarding/{self.process.pk}/')
+        self.assertContains(resp, f'data-version="{start}"')
+        self.assertEqual(client.get(f'/onboarding/{self.process.pk}/changes/?since={start}').status_code, 204)
+        self._p("Up-to-date clients get 204")
+
+        complete_task(self.task, self.user1)
+        resp = client.get(f'/onboarding/{self.process.pk}/changes/?since={start}')
+        version = int(resp['X-Process-Version'])
+        self.assertEqual(version, start + 1)
+        html = resp.content.decode()
+        self.assertIn(f'id="task-{self.task.pk}"', html)
+        self.assertIn(f'id="task-{dependent.pk}"', html)
+        self.assertNotIn(f'id="task-{other.pk}"', html)
+        self.assertIn('id="process-progress"', html)
+        self._p("Only the task, its dependents and the progress bar are sent")
+
+        self.assertEqual(client.get(f'/onboarding/{self.process.pk}/events/').status_code, 204)
+
+        async def read_stream():
+            aclient = AsyncClient()
+            resp = await aclient.get(f'/onboarding/{self.process.pk}/events/', HTTP_LAST_EVENT_ID=str(start))
+            chunks = aiter(resp.streaming_content)
+            received = [await anext(chunks), await anext(chunks)]
+            await sync_to_async(start_task)(other)
+            process_broker.publish(self.process.pk, 'changed', None)
+            received.append(await anext(chunks))
+            await resp.streaming_content.aclose()
+            return [c.decode() if isinstance(c, bytes) else c for c in received]
+
+        received = async_to_sync(read_stream)()
+        self.assertTrue(received[1].startswith(f'id: {version}\nevent: tasks\n'))
+        self.assertIn(f'id="task-{dependent.pk}"', received[1])
+        self.assertTrue(received[2].startswith(f'id: {version + 1}\n'))
+        self.assertIn(f'id="task-{other.pk}"', received[2])
+        self.assertNotIn(f'id="task-{dependent.pk}"', received[2])
+        self.assertFalse(process_broker.has_subscribers(self.process.pk))
+        self._p("Stream resumes from Last-Event-ID and pushes later changes")
+
+        from apps.templates_mgmt.services import sync_onboardings_from_template
+        self.te.sort_order = 5
+        self.te.save()
+        sync_onboardings_from_template(self.template)
+        resp = client.get(f'/onboarding/{self.process.pk}/changes/?since={version + 1}')
+        self.assertEqual(int(resp['X-Process-Version']), version + 2)
+        html = resp.content.decode()
+        self.assertIn(f'id="task-{self.task.pk}"', html)
+        self.assertIn(f'id="task-{dependent.pk}"', html)
+        self.assertNotIn(f'id="task-{other.pk}"', html)
+        self._p("Template syncs reach open pages through the same channel")
+
+        from unittest import mock
+        from apps.onboarding import services as onboarding_services
+        self.process.refresh_from_db()
+        before = self.process.version
+        with mock.patch.object(onboarding_services, 'Subquery', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                change_task_status(other, TaskStatus.COMPLETED, self.user1)
+        self.process.refresh_from_db()
+        self.assertEqual(self.process.version, before)
+        self.assertEqual(OnboardingTask.objects.get(pk=other.pk).status, TaskStatus.IN_PROGRESS)
+        self._p("A status change, its version bump and its stamps commit together")
+
+    # ------------------------------------------------------------------
+    # Test 21: Consolidated navbar heartbeat
+    # ------------------------------------------------------------------
+    def test_21_navbar_heartbeat(self):
+        print("\n=== Test 21: Consolidated navbar heartbeat ===")
+        from django.core.cache import cache
+        from apps.notifications.services import send_notification
+
+        cache.clear()
+        client = Client()
+        self.assertEqual(client.get('/heartbeat/').status_code, 204)
+        client.post('/switch-user/', {'user_id': self.user2.pk})
+
+        OnboardingTask.objects.filter(pk=self.task.pk).update(
+            assignee=self.user2, deadline=date.today() - timedelta(days=1),
+        )
+        OnboardingTask.objects.create(onboarding=self.process, name='Senere', assignee=self.user2)
+        send_notification(self.user2, 'task_ready', 'Hej', '')
+
+        resp = client.get('/heartbeat/')
+        html = resp.content.decode()
+        self.assertIn('id="notification-badge" hx-swap-oob="innerHTML"', html)
+        self.assertIn('>1</span>', html)
+        self.assertIn('>2</span>', html)
+        self.assertIn('1 forsinket', html)
+        etag = resp['ETag']
+        self._p("One response carries unread, open and overdue counters")
+
+        with self.assertNumQueries(2):  # session + user row; task counters come from cache
+            resp = client.get('/heartbeat/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self._p("Unchanged heartbeat answers 304 from cached counts")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_task(self.task, self.user2)
+        resp = client.get('/heartbeat/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('forsinket', resp.content.decode())
+        self.assertNotEqual(resp['ETag'], etag)
+        self._p("Task changes invalidate the cached counters")
+
+        from unittest import mock
+        from django.core.cache import caches
+        from django.core.cache.backends.filebased import FileBasedCache
+        from apps.onboarding import services as onboarding_services
+        etag = resp['ETag']
+        OnboardingTask.objects.create(onboarding=self.process, name='Fra scheduler', assignee=self.user2)
+        other_process = FileBasedCache(caches['default']._dir, {})
+        with mock.patch.object(onboarding_services, 'cache', other_process):
+            onboarding_services.invalidate_task_counters()
+        resp = client.get('/heartbeat/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('>2</span>', resp.content.decode())
+        self._p("Invalidations from another process reach the shared cache")
+
+        html = client.get('/').content.decode()
+        self.assertIn('hx-trigger="load, heartbeat"', html)
+        self.assertNotIn('every 30s', html)
+
+        async def read_stream():
+            from asgiref.sync import sync_to_async
+            from django.test import AsyncClient
+            aclient = AsyncClient()
+            aclient.cookies = client.cookies
+            with mock.patch('apps.notifications.views.STREAM_HEARTBEAT', 0.01):
+                resp = await aclient.get('/notifications/stream/')
+                chunks = aiter(resp.streaming_content)
+                received = [await anext(chunks) for _ in range(3)]
+                await resp.streaming_content.aclose()
+            return [c.decode() if isinstance(c, bytes) else c for c in received]
+
+        from asgiref.sync import async_to_sync
+        received = async_to_sync(read_stream)()
+        self.assertEqual(received[2], 'event: heartbeat\ndata: \n\n')
+        self._p("The navbar polls only on stream heartbeats, not on a fixed interval")
+
+    # ------------------------------------------------------------------
+    # Test 22: Notification retention and chunked purge
+    # ------------------------------------------------------------------
+    def test_22_notification_retention(self):
+        print("\n=== Test 22: Notification retention and chunked purge ===")
+        import gzip
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.notifications.models import Notification
+        from apps.notifications.services import delete_all_read, send_notifications
+
+        def make(kind, days_old, read, count):
+            created = send_notifications([
+                {'recipient': self.user2, 'notification_type': kind, 'title': kind, 'message': ''}
+                for _ in range(count)
+            ])
+            Notification.objects.filter(pk__in=[n.pk for n in created]).update(
+                created_at=timezone.now() - timedelta(days=days_old), is_read=read,
+            )
+
+        make('task_ready', 100, True, 5)       # expired (90 days)
+        make('task_overdue', 100, True, 2)     # kept (180 days)
+        make('task_ready', 10, True, 1)        # kept, recent
+        make('task_ready', 400, False, 1)      # expired unread
+        make('task_ready', 10, False, 1)       # kept unread
+        # Rows were marked read behind the counter's back; match it to the two unread
+        SystemUser.objects.filter(pk=self.user2.pk).update(unread_count=2)
+
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+        self.assertIn('6 notifications would be purged', out.getvalue())
+        self.assertEqual(Notification.objects.filter(recipient=self.user2).count(), 10)
+        self._p("Dry run reports per retention policy")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = os.path.join(tmp, 'notifications.jsonl.gz')
+            out = StringIO()
+            call_command('purge_notifications', '--chunk-size', '2', '--pause', '0',
+                         '--archive', archive, stdout=out)
+            with gzip.open(archive, 'rt') as f:
+                archived = [json.loads(line) for line in f]
+        self.assertIn('Purged 6 notifications in 3 chunks', out.getvalue())
+        self.assertIn('write lock held', out.getvalue())
+        self.assertEqual(len(archived), 6)
+        self.assertEqual(Notification.objects.filter(recipient=self.user2).count(), 4)
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.unread_count, 1)
+        self._p("Expired rows archived and deleted in chunks, unread counter adjusted")
+
+        stats = delete_all_read(self.user2)
+        self.assertEqual(stats['deleted'], 3)
+        self.assertEqual(Notification.objects.filter(recipient=self.user2).count(), 1)
+        self._p("Delete-all-read goes through the chunked purge")
+
+    # ------------------------------------------------------------------
+    # Test 23: Keyset-paginated notification inbox
+    # ------------------------------------------------------------------
+    def test_23_inbox_keyset_pagination(self):
+        print("\n=== Test 23: Keyset-paginated notification inbox ===")
+        import re
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from apps.notifications.models import Notification
+
+        now = timezone.now()
+        rows = Notification.objects.bulk_create([
+            Notification(
+                recipient=self.user2, title=f'N{i}', message='',
+                notification_type='task_overdue' if i % 5 == 0 else 'task_ready',
+                is_read=(i % 3 == 0),
+                related_onboarding=self.process if i % 2 == 0 else None,
+            )
+            for i in range(60)
+        ])
+        for i, row in enumerate(rows):
+            # Pairs share a timestamp so the id tie-breaker is exercised
+            Notification.objects.filter(pk=row.pk).update(created_at=now - timedelta(minutes=i // 2))
+
+        client = Client()
+        client.post('/switch-user/', {'user_id': self.user2.pk})
+
+        def walk(query):
+            titles, cursor, pages = [], None, 0
+            while True:
+                url = f'/notifications/?{query}' + (f'&cursor={cursor}' if cursor else '')
+                resp = client.get(url, HTTP_HX_REQUEST='true') if cursor else client.get(url)
+                html = resp.content.decode()
+                titles += re.findall(r'font-medium text-gray-900">(N\d+)</p>', html)
+                match = re.search(r'cursor=(\d+-\d+)"', html)
+                pages += 1
+                if not match:
+                    return titles, pages
+                cursor = match.group(1)
+
+        # Newest first; within a shared timestamp the higher id comes first
+        expected = sorted(range(60), key=lambda i: (i // 2, -i))
+        newest, pages = walk('sort=newest')
+        self.assertEqual(pages, 3)
+        self.assertEqual(newest, [f'N{i}' for i in expected])
+        oldest, _ = walk('sort=oldest')
+        self.assertEqual(oldest, list(reversed(newest)))
+        self._p("Pages cover every row once in both directions")
+
+        unread_overdue, _ = walk('state=unread&type=task_overdue')
+        self.assertEqual(unread_overdue, [f'N{i}' for i in expected if i % 5 == 0 and i % 3])
+        by_process, _ = walk(f'state=read&onboarding={self.process.pk}')
+        self.assertEqual(by_process, [f'N{i}' for i in expected if i % 6 == 0])
+        self._p("Type, onboarding and read-state filters")
+
+        deep_cursor = re.search(r'cursor=(\d+-\d+)"', client.get('/notifications/').content.decode()).group(1)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(f'/notifications/?sort=newest&cursor={deep_cursor}', HTTP_HX_REQUEST='true')
+        scans = [q['sql'] for q in ctx.captured_queries if 'notifications_notification' in q['sql']]
+        self.assertEqual(len(scans), 2)  # one range scan per read state
+        with connection.cursor() as cursor:
+            for sql in scans:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+                self.assertIn('notification_inbox_idx', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+        self._p("Each page is an ordered index range scan with no sort step")
+
+    # ------------------------------------------------------------------
+    # Test 24: Idempotent notifications
+    # ------------------------------------------------------------------
+    def test_24_notification_dedupe_keys(self):
+        print("\n=== Test 24: Idempotent notifications ===")
+        from io import StringIO
+        from django.core.management import call_command
+        from apps.notifications.models import EmailOutbox, Notification
+        from apps.notifications.services import send_notifications
+        from apps.templates_mgmt.models import TemplateEntityNotificationRule
+
+        TemplateEntityNotificationRule.objects.create(
+            template_entity=self.te, notify_user=self.user2, trigger_status='completed',
+        )
+        complete_task(self.task, self.user1)
+        change_task_status(self.task, TaskStatus.IN_PROGRESS, self.user1)
+        complete_task(self.task, self.user1)
+        completed = Notification.objects.filter(recipient=self.user2, related_task=self.task)
+        self.assertEqual(completed.count(), 1)
+        self.assertEqual(EmailOutbox.objects.filter(notification__in=completed).count(), 1)
+        self.assertEqual(EmailOutbox.objects.filter(to_email=self.user2.email).count(), 1)
+        self.user2.refresh_from_db()
+        self.assertEqual(self.user2.unread_count, 1)
+        self._p("Revert and re-complete notifies once, with one email")
+
+        OnboardingTask.objects.filter(pk=self.task.pk).update(
+            status=TaskStatus.READY, assignee=self.user1, deadline=date.today() - timedelta(days=2),
+        )
+        out = StringIO()
+        call_command('check_overdue', stdout=out)
+        self.assertIn('Sent 1 notifications', out.getvalue())
+        out = StringIO()
+        call_command('check_overdue', stdout=out)
+        self.assertIn('Sent 0 notifications', out.getvalue())
+        self.assertEqual(Notification.objects.filter(notification_type='task_overdue').count(), 1)
+        self._p("Re-running check_overdue does not re-notify")
+
+        item = {'recipient': self.user1, 'notification_type': 'task_ready', 'title': 'X', 'message': '',
+                'dedupe_key': 'batch-test'}
+        result = send_notifications([item, dict(item), {**item, 'dedupe_key': ''}])
+        self.assertIsNotNone(result[0])
+        self.assertIsNone(result[1])
+        self.assertIsNotNone(result[2])
+        self.assertEqual(Notification.objects.filter(dedupe_key='batch-test').count(), 1)
+        self._p("Duplicates within a batch are dropped; unkeyed ones always go through")
+
+        email_only = {**item, 'recipient': self.user2, 'dedupe_key': 'email-only', 'send_in_app': False}
+        send_notifications([email_only])
+        send_notifications([email_only, dict(email_only)])
+        self.assertEqual(EmailOutbox.objects.filter(dedupe_key='email-only').count(), 1)
+        send_notifications([{**email_only, 'send_in_app': True}])
+        self.assertEqual(EmailOutbox.objects.filter(dedupe_key='email-only').count(), 1)
+        self.assertEqual(Notification.objects.filter(dedupe_key='email-only').count(), 1)
+        self._p("Email-only notifications are deduplicated through the outbox")
+
+    # ------------------------------------------------------------------
+    # Test 25: Precompiled per-type message templates
+    # ------------------------------------------------------------------
+    def test_25_message_templates(self):
+        print("\n=== Test 25: Precompiled per-type message templates ===")
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        from apps.notifications import messages
+        from apps.notifications.models import EmailOutbox, NotificationType
+        from apps.notifications.services import send_outbox_batch
+        from apps.templates_mgmt.models import TemplateEntityNotificationRule
+
+        self.assertEqual(set(messages._compiled), set(NotificationType.values))
+        self.assertIs(messages._compiled['task_ready'], messages._compiled['task_completed'])
+        self._p("Templates for every type compiled at startup; rule types share one")
+
+        html, text = messages.render_message('task_ready', {
+            'task_name': '<Laptop>', 'employee_name': 'Ny', 'status_label': 'klar',
+            'dependent_tasks': [{'name': 'Adgang', 'url': '/onboarding/1/tasks/2/'}],
+        })
+        self.assertIn('&lt;Laptop&gt;', html)
+        self.assertIn('<a href="/onboarding/1/tasks/2/"', html)
+        self.assertIn('"<Laptop>"', text)
+        self.assertIn('- Adgang: http://localhost:8000/onboarding/1/tasks/2/', text)
+        self.assertNotIn('<a', text)
+        self._p("HTML variant escapes, text variant has absolute links and no markup")
+
+        TemplateEntityNotificationRule.objects.create(
+            template_entity=self.te, notify_user=self.user2, trigger_status='completed',
+        )
+        complete_task(self.task, self.user1)
+        entry = EmailOutbox.objects.get(to_email=self.user2.email)
+        self.assertNotIn('<', entry.body)
+        self.assertTrue(entry.html_body.startswith('Opgaven'))
+        mail.outbox = []
+        with self.settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            send_outbox_batch()
+        self.assertEqual(mail.outbox[0].body, entry.body)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self._p("Outbox sends text body with the HTML alternative")
+
+        out = StringIO()
+        call_command('benchmark_messages', '--count', '5', stdout=out)
+        self.assertIn('task_overdue', out.getvalue())
+        self._p("Rendering cost reported by benchmark_messages")
+
+    # ------------------------------------------------------------------
+    # Test 26: Outbox retries, backoff and dead letters
+    # ------------------------------------------------------------------
+    def test_26_outbox_retries_and_dead_letters(self):
+        print("\n=== Test 26: Outbox retries, backoff and dead letters ===")
+        from io import StringIO
+        from django.core.management import call_command
+        from django.test import override_settings
+        from django.utils import timezone
+        from apps.notifications.models import EmailOutbox
+        from apps.notifications.services import send_notifications, send_outbox_batch
+
+        def queue(address, count=1):
+            user = SystemUser.objects.create(name=address, email=address)
+            send_notifications([
+                {'recipient': user, 'notification_type': 'task_ready', 'title': 'T', 'message': 'M'}
+                for _ in range(count)
+            ])
+            return EmailOutbox.objects.filter(to_email=address)
+
+        def make_due():
+            EmailOutbox.objects.filter(next_attempt_at__isnull=False).update(next_attempt_at=timezone.now())
+
+        flaky = queue('flaky@test.dk')
+        rejected = queue('reject@test.dk')
+        queue('bulk@test.dk', 50)
+
+        with LocalSMTPServer(reject={'reject@test.dk'}, flaky={'flaky@test.dk': 2}) as smtp:
+            with override_settings(OUTBOX_MAX_ATTEMPTS=3, **smtp.settings()):
+                self.assertEqual(send_outbox_batch(), (50, 2))
+                self.assertEqual(smtp.connections, 1)
+                self._p("50 emails over one connection, failures counted")
+
+                entry = flaky.get()
+                self.assertEqual(entry.attempts, 1)
+                self.assertAlmostEqual(
+                    (entry.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5,
+                )
+                self.assertEqual(send_outbox_batch(), (0, 0))  # nothing due yet
+                make_due()
+                send_outbox_batch()
+                entry.refresh_from_db()
+                self.assertEqual(entry.attempts, 2)
+                self.assertAlmostEqual(
+                    (entry.next_attempt_at - timezone.now()).total_seconds(), 120, delta=5,
+                )
+                make_due()
+                send_outbox_batch()
+                entry.refresh_from_db()
+                self.assertIsNotNone(entry.sent_at)
+                self._p("Temporary failures back off 1m, 2m, then deliver")
+
+                dead = rejected.get()
+                self.assertEqual(dead.attempts, 3)
+                self.assertIsNotNone(dead.dead_at)
+                self.assertIsNone(dead.next_attempt_at)
+                make_due()
+                self.assertEqual(send_outbox_batch(), (0, 0))
+                self._p("Dead-lettered after the last attempt and left alone")
+
+            smtp.reject.clear()
+            out = StringIO()
+            call_command('redrive_outbox', '--to', 'reject@test.dk', stdout=out)
+            self.assertIn('Re-queued 1 dead letters', out.getvalue())
+            with override_settings(**smtp.settings()):
+                self.assertEqual(send_outbox_batch(), (1, 0))
+            self._p("redrive_outbox re-queues dead letters in bulk")
+
+        entry = queue('offline@test.dk').get()
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                               EMAIL_HOST='127.0.0.1', EMAIL_PORT=smtp.port, EMAIL_TIMEOUT=1):
+            self.assertEqual(send_outbox_batch(), (0, 1))
+        entry.refresh_from_db()
+        self.assertEqual(entry.attempts, 1)
+        self._p("An unreachable relay counts as a failed attempt")
+
+    # ------------------------------------------------------------------
+    # Test 27: Incremental overdue notifications
+    # ------------------------------------------------------------------
+    def test_27_incremental_overdue_check(self):
+        print("\n=== Test 27: Incremental overdue notifications ===")
+        from django.db import connection
+        from django.test import Client, override_settings
+        from django.test.utils import CaptureQueriesContext
+        from django.utils import timezone
+        from apps.notifications.models import Notification
+        from apps.onboarding.services import notify_overdue_tasks
+
+        overdue = Notification.objects.filter(notification_type='task_overdue')
+        OnboardingTask.objects.filter(pk=self.task.pk).update(
+            status=TaskStatus.READY, assignee=self.user1, deadline=date.today() - timedelta(days=2),
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            result = notify_overdue_tasks()
+        self.assertEqual((result['notified'], result['reminders']), (1, 0))
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "onboarding_onboardingtask"')]
+        self.assertEqual(len(updates), 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.overdue_level, 1)
+        self.assertIsNotNone(self.task.overdue_notified_at)
+        self._p("A newly overdue task is notified and marked with one UPDATE")
+
+        self.assertEqual(notify_overdue_tasks()['checked'], 0)
+        self.assertEqual(overdue.count(), 1)
+        self._p("Marked tasks are skipped on the next run")
+
+        later = timezone.now() + timedelta(days=8)
+        with override_settings(OVERDUE_ESCALATION_DAYS=7):
+            result = notify_overdue_tasks(now=later)
+        self.assertEqual((result['notified'], result['reminders']), (1, 1))
+        reminder = overdue.latest('created_at')
+        self.assertIn('Påmindelse', reminder.message)
+        self.assertTrue(reminder.dedupe_key.endswith(':2'))
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.overdue_level, 2)
+        self._p("A task still overdue after the escalation interval gets a reminder")
+
+        OnboardingTask.objects.filter(pk=self.task.pk).update(overdue_level=1)
+        with override_settings(OVERDUE_ESCALATION_DAYS=7):
+            result = notify_overdue_tasks(now=later + timedelta(days=8))
+        self.assertEqual((result['checked'], result['notified'], result['reminders']), (1, 0, 0))
+        self._p("Reminders dropped as duplicates are not counted")
+
+        client = Client()
+        client.post(f'/onboarding/{self.process.pk}/tasks/{self.task.pk}/edit/', {
+            'assignee': self.user1.pk, 'deadline': (date.today() - timedelta(days=1)).isoformat(),
+        })
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.overdue_level, self.task.overdue_notified_at), (0, None))
+        self.assertEqual(notify_overdue_tasks()['notified'], 1)
+        self.assertNotIn('Påmindelse', overdue.latest('created_at').message)
+        self._p("Moving the deadline resets the marker")
+
+        sql, params = OnboardingTask.objects.filter(
+            status__in=[TaskStatus.READY], deadline__lt=date.today(),
+        ).values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('task_status_deadline_idx', plan)
+        self._p("Candidates are read through task_status_deadline_idx")
+
+    # ------------------------------------------------------------------
+    # Test 28: Chunked, partitioned overdue scan
+    # ------------------------------------------------------------------
+    def test_28_chunked_overdue_scan(self):
+        print("\n=== Test 28: Chunked, partitioned overdue scan ===")
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from apps.notifications.models import Notification
+        from apps.notifications import services as notification_services
+        from apps.onboarding.services import notify_overdue_tasks, overdue_id_ranges
+
+        for i in range(6):
+            create_onboarding_from_template(
+                template=self.template, new_employee_name=f'Overdue {i}', new_employee_email='',
+                new_employee_department='IT', new_employee_position='Developer',
+                start_date=date.today(), created_by=self.user1,
+            )
+        OnboardingTask.objects.update(
+            status=TaskStatus.READY, assignee=self.user1, deadline=date.today() - timedelta(days=1),
+        )
+        ids = sorted(OnboardingTask.objects.values_list('pk', flat=True))
+
+        ranges = overdue_id_ranges(3)
+        self.assertEqual(len(ranges), 3)
+        covered = [pk for start, stop in ranges for pk in ids if start <= pk < stop]
+        self.assertEqual(covered, ids)
+        self._p("Id ranges partition the candidates without overlap")
+
+        real_send = notification_services.send_notifications
+        calls = []
+
+        def failing_send(items):
+            calls.append(len(items))
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            return real_send(items)
+
+        with mock.patch.object(notification_services, 'send_notifications', failing_send):
+            with self.assertRaises(RuntimeError):
+                notify_overdue_tasks(chunk_size=2, id_range=ranges[0])
+        self.assertEqual(calls, [2, 1])
+        self.assertEqual(OnboardingTask.objects.filter(overdue_level=1).count(), 2)
+        self.assertEqual(Notification.objects.filter(notification_type='task_overdue').count(), 2)
+        self._p("Chunks commit separately; a crash keeps the finished chunks")
+
+        first = notify_overdue_tasks(chunk_size=2, id_range=ranges[0])
+        self.assertEqual(first['notified'], 1)
+        rest = [notify_overdue_tasks(chunk_size=2, id_range=r) for r in ranges[1:]]
+        self.assertEqual(2 + first['notified'] + sum(r['notified'] for r in rest), len(ids))
+        self.assertEqual(Notification.objects.filter(notification_type='task_overdue').count(), len(ids))
+        self._p("The next run resumes with the unmarked tasks")
+
+        OnboardingTask.objects.update(overdue_level=0, overdue_notified_at=None)
+        Notification.objects.all().delete()
+        out = StringIO()
+        call_command('check_overdue', '--chunk-size', '2', stdout=out)
+        self.assertIn(f'Sent {len(ids)} notifications', out.getvalue())
+        self.assertIn(f'in {-(-len(ids) // 2)} chunks', out.getvalue())
+        self._p("check_overdue reads at most --chunk-size tasks at a time")
+
+        # Workers are separate processes, so they run against a throwaway
+        # database file rather than this test's transaction
+        import subprocess
+        import textwrap
+        tmp = tempfile.mkdtemp()
+        with open(os.path.join(tmp, 'worker_settings.py'), 'w') as f:
+            f.write(textwrap.dedent(f"""
+                from config.settings import *
+                DATABASES = {{'default': {{**DATABASES['default'], 'NAME': {os.path.join(tmp, 'db.sqlite3')!r}}}}}
+                CACHES = {{'default': {{**CACHES['default'], 'LOCATION': {os.path.join(tmp, 'cache')!r}}}}}
+            """))
+        script = textwrap.dedent("""
+            import multiprocessing
+            import django
+            multiprocessing.set_start_method('spawn')
+            django.setup()
+            from datetime import date, timedelta
+            from django.core.management import call_command
+            from apps.core.models import SystemUser
+            from apps.notifications.models import Notification
+            from apps.onboarding.models import OnboardingProcess, OnboardingTask, TaskStatus
+            call_command('migrate', verbosity=0)
+            user = SystemUser.objects.create(name='Worker', email='worker@test.dk')
+            process = OnboardingProcess.objects.create(new_employee_name='Ny', start_date=date.today())
+            OnboardingTask.objects.bulk_create([
+                OnboardingTask(onboarding=process, name=f'Opgave {i}', status=TaskStatus.READY,
+                               assignee=user, deadline=date.today() - timedelta(days=1))
+                for i in range(40)
+            ])
+            call_command('check_overdue', '--workers', '3', '--chunk-size', '5')
+            print('notifications', Notification.objects.count())
+        """)
+        env = {
+            **os.environ, 'DJANGO_SETTINGS_MODULE': 'worker_settings',
+            'PYTHONPATH': os.pathsep.join([tmp, os.path.dirname(os.path.abspath(__file__))]),
+        }
+        result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=300)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.count('  ids '), 3)
+        self.assertIn('Sent 40 notifications', result.stdout)
+        self.assertIn('notifications 40', result.stdout)
+        self._p("--workers 3 splits the scan across spawned worker processes")
+
+    # ------------------------------------------------------------------
+    # Test 29: Scheduler with database leases
+    # ------------------------------------------------------------------
+    def test_29_scheduler_leases(self):
+        print("\n=== Test 29: Scheduler with database leases ===")
+        import time
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.utils import timezone
+        from apps.core import scheduler
+        from apps.core.models import JobLease, JobRun
+
+        scheduler.ensure_leases()
+        self.assertTrue(scheduler.acquire_lease('check_overdue', 'node-a'))
+        self.assertFalse(scheduler.acquire_lease('check_overdue', 'node-b'))
+        self._p("Only one node gets a job's lease")
+
+        later = timezone.now() + timedelta(seconds=scheduler.JOB_LEASE_SECONDS + 1)
+        self.assertTrue(scheduler.acquire_lease('check_overdue', 'node-b', now=later))
+        scheduler.release_lease('check_overdue', 'node-a', timezone.now())
+        self.assertEqual(JobLease.objects.get(name='check_overdue').holder, 'node-b')
+        self.assertIsNotNone(JobLease.objects.get(name='check_overdue').locked_until)
+        self._p("An expired lease is taken over and the old holder cannot release it")
+
+        locked_until = timezone.now() + timedelta(seconds=60)
+        JobLease.objects.filter(name='check_overdue').update(locked_until=locked_until)
+        self.assertTrue(scheduler.renew_lease('check_overdue', 'node-b'))
+        self.assertGreater(JobLease.objects.get(name='check_overdue').locked_until, locked_until)
+        self.assertFalse(scheduler.renew_lease('check_overdue', 'node-a'))
+        with mock.patch.object(scheduler, 'JOB_LEASE_RENEW_SECONDS', 0.01), \
+                mock.patch.object(scheduler, 'renew_lease', return_value=True) as renew:
+            with scheduler.keep_lease('check_overdue', 'node-b'):
+                time.sleep(0.1)
+            calls = renew.call_count
+            time.sleep(0.05)
+        self.assertGreater(calls, 1)
+        self.assertEqual(renew.call_count, calls)
+        self._p("A running job keeps renewing its lease until it finishes")
+        JobLease.objects.all().delete()
+        scheduler.ensure_leases()
+
+        OnboardingTask.objects.filter(pk=self.task.pk).update(
+            status=TaskStatus.READY, assignee=self.user1, deadline=date.today() - timedelta(days=1),
+        )
+        runs = scheduler.run_due_jobs('node-a', names=['check_overdue'])
+        self.assertEqual([run.job for run in runs], ['check_overdue'])
+        self.assertTrue(runs[0].succeeded)
+        self.assertIn('Sent 1 notifications', runs[0].output)
+        lease = JobLease.objects.get(name='check_overdue')
+        self.assertIsNone(lease.locked_until)
+        self.assertAlmostEqual((lease.next_run_at - runs[0].started_at).total_seconds(), 3600, delta=1)
+        self.assertEqual(scheduler.run_due_jobs('node-b', names=['check_overdue']), [])
+        self._p("A run is recorded and the job is not due again until its interval has passed")
+
+        broken = scheduler.Job('broken', 60, 'no_such_command', ())
+        with mock.patch.object(scheduler, 'JOBS', [broken]):
+            scheduler.ensure_leases()
+            runs = scheduler.run_due_jobs('node-a')
+        self.assertFalse(runs[0].succeeded)
+        self.assertIn('no_such_command', runs[0].output)
+        self.assertIsNone(JobLease.objects.get(name='broken').locked_until)
+        self._p("A failing job is recorded as failed and releases its lease")
+
+        out = StringIO()
+        with self.settings(SCHEDULER_INTERVALS={'repair_unread_counts': 5}):
+            call_command('run_scheduler', '--once', '--job', 'repair_unread_counts', stdout=out)
+            self.assertIn('repair_unread_counts: ok', out.getvalue())
+            next_run = JobLease.objects.get(name='repair_unread_counts').next_run_at
+            started = JobRun.objects.filter(job='repair_unread_counts').get().started_at
+        self.assertAlmostEqual((next_run - started).total_seconds(), 5, delta=1)
+        self._p("run_scheduler --once runs the due jobs with intervals from settings")
+
+    # ------------------------------------------------------------------
+    # Test 30: Due-soon reminders
+    # ------------------------------------------------------------------
+    def test_30_due_soon_reminders(self):
+        print("\n=== Test 30: Due-soon reminders ===")
+        from django.db import connection
+        from apps.notifications.models import Notification
+        from apps.onboarding.services import send_due_soon_reminders
+        from apps.templates_mgmt.services import sync_onboardings_from_template
+
+        today = date.today()
+        self.te.days_before_start = 2
+        self.te.remind_days_before = 3
+        self.te.default_assignee = self.user1
+        self.te.save()
+        process = create_onboarding_from_template(
+            template=self.template, new_employee_name='Reminder Person', new_employee_email='',
+            new_employee_department='IT', new_employee_position='Developer',
+            start_date=today + timedelta(days=5), created_by=self.user1,
+        )
+        task = process.tasks.get()
+        self.assertEqual(task.next_reminder_at, today)
+        self.assertIsNone(self.task.next_reminder_at)
+        self._p("next_reminder_at is computed when tasks are created")
+
+        self.assertEqual(send_due_soon_reminders(), (1, 1))
+        reminders = Notification.objects.filter(notification_type='task_due_soon', related_task=task)
+        self.assertIn('om 3 dage', reminders.get().message)
+        task.refresh_from_db()
+        self.assertIsNone(task.next_reminder_at)
+        self.assertEqual(send_due_soon_reminders(), (0, 0))
+        self._p("A due reminder is sent once and cleared")
+
+        Client().post(f'/onboarding/{process.pk}/tasks/{task.pk}/edit/', {
+            'assignee': self.user1.pk, 'deadline': (today + timedelta(days=10)).isoformat(),
+        })
+        task.refresh_from_db()
+        self.assertEqual(task.next_reminder_at, today + timedelta(days=7))
+        self.assertEqual(send_due_soon_reminders(), (0, 0))
+        self.assertEqual(send_due_soon_reminders(today=today + timedelta(days=7)), (1, 1))
+        self.assertEqual(reminders.count(), 2)
+        self._p("Moving the deadline schedules a new reminder")
+
+        OnboardingTask.objects.filter(pk=task.pk).update(next_reminder_at=today + timedelta(days=7))
+        self.te.remind_days_before = 1
+        self.te.save()
+        sync_onboardings_from_template(self.template)
+        task.refresh_from_db()
+        self.assertEqual(task.next_reminder_at, today + timedelta(days=9))
+        self._p("Template sync follows a changed reminder setting")
+
+        OnboardingTask.objects.filter(pk=task.pk).update(status=TaskStatus.COMPLETED, next_reminder_at=today)
+        self.assertEqual(send_due_soon_reminders(), (1, 0))
+        task.refresh_from_db()
+        self.assertIsNone(task.next_reminder_at)
+        self._p("Reminders for closed tasks are cleared without sending")
+
+        from datetime import datetime, timezone as dt_timezone
+        from unittest import mock
+        from apps.onboarding.services import overdue_candidates
+        # 23:30 UTC is already the next day in Copenhagen; both scans use the UTC date
+        late = datetime(2026, 3, 9, 23, 30, tzinfo=dt_timezone.utc)
+        OnboardingTask.objects.filter(pk=task.pk).update(
+            status=TaskStatus.READY, next_reminder_at=date(2026, 3, 10), deadline=date(2026, 3, 10),
+        )
+        with mock.patch('django.utils.timezone.now', return_value=late):
+            self.assertEqual(send_due_soon_reminders(), (0, 0))
+            self.assertFalse(overdue_candidates(late).filter(pk=task.pk).exists())
+        self._p("Reminders and overdue checks agree on the date around midnight")
+
+        sql, params = OnboardingTask.objects.filter(next_reminder_at__lte=today).values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('task_next_reminder_idx', plan)
+        self._p("Due reminders are found through task_next_reminder_idx")
+
+    # ------------------------------------------------------------------
+    # Test 31: Cached user picker in the context processor
+    # ------------------------------------------------------------------
+    def test_31_cached_user_picker(self):
+        print("\n=== Test 31: Cached user picker in the context processor ===")
+        from django.db import connection
+        from django.test import RequestFactory
+        from django.test.utils import CaptureQueriesContext
+        from apps.core.context_processors import current_user
+        from apps.core.middleware import invalidate_current_user
+
+        def user_queries(ctx):
+            return sum(
+                1 for q in ctx.captured_queries
+                if 'FROM "core_systemuser"' in q['sql'] and '"core_systemuser"."id" =' not in q['sql']
+            )
+
+        client = Client()
+        client.post('/switch-user/', {'user_id': self.user2.pk})
+        html = client.get('/').content.decode()
+        self.assertIn(f'<option value="{self.user2.pk}" selected>Test Bruger X2</option>', html)
+        self.assertIn(f'<option value="{self.user1.pk}">Test Bruger X1</option>', html)
+        self._p("The picker lists active users with the current one selected")
+
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/')
+        self.assertEqual(user_queries(ctx), 0)
+        request = RequestFactory().get('/')
+        request.session = {'current_user_id': self.user2.pk}
+        context = current_user(request)
+        invalidate_current_user(self.user2.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(context['current_user'](), self.user2)
+            context['current_user']()
+            context['user_options']()
+        self._p("The user list is served from cache and the current user is looked up once per request")
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = client.get('/notifications/?cursor=0-0', HTTP_HX_REQUEST='true')
+        self.assertNotIn('Vælg bruger', resp.content.decode())
+        self.assertEqual(user_queries(ctx), 0)
+        self._p("HTMX partials without the navbar skip the picker entirely")
+
+        self.user1.name = 'Omdøbt Bruger'
+        self.user1.save()
+        self.assertIn('Omdøbt Bruger</option>', client.get('/').content.decode())
+        self.user1.delete()
+        self.assertNotIn('Omdøbt Bruger', client.get('/').content.decode())
+        self._p("Saving or deleting a user refreshes the cached list")
+
+    # ------------------------------------------------------------------
+    # Test 32: Request-scoped current user
+    # ------------------------------------------------------------------
+    def test_32_current_user_middleware(self):
+        print("\n=== Test 32: Request-scoped current user ===")
+        from django.core.cache import cache
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.notifications.services import send_notification
+
+        def lookups(ctx):
+            return sum(
+                1 for q in ctx.captured_queries
+                if 'FROM "core_systemuser"' in q['sql'] and '"core_systemuser"."id" =' in q['sql']
+            )
+
+        client = Client()
+        client.post('/switch-user/', {'user_id': self.user1.pk})
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(client.get('/').status_code, 200)
+        self.assertEqual(lookups(ctx), 1)
+        with CaptureQueriesContext(connection) as ctx:
+            client.get('/')
+        self.assertEqual(lookups(ctx), 0)
+        self._p("The dashboard, navbar and sidebar share one cached lookup")
+
+        client.post(f'/onboarding/{self.process.pk}/tasks/{self.task.pk}/complete/')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.completed_by, self.user1)
+        change_task_status(self.task, TaskStatus.IN_PROGRESS, self.user1)
+        Client().post(f'/onboarding/{self.process.pk}/tasks/{self.task.pk}/complete/')
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.status, TaskStatus.COMPLETED)
+        self.assertIsNone(self.task.completed_by)
+        self._p("Views pass the current user, or None without one, to services")
+
+        send_notification(self.user1, 'task_ready', 'Ny', 'Besked')
+        self.assertIn('>1<', client.get('/notifications/unread-count/').content.decode())
+        self._p("The unread count is read fresh despite the cached user")
+
+        self.user1.is_active = False
+        self.user1.save()
+        self.assertEqual(client.get('/heartbeat/').status_code, 204)
+        self._p("Deactivating the user drops the cached instance")
+
+    # ------------------------------------------------------------------
+    # Test 33: Full-text search
+    # ------------------------------------------------------------------
+    def test_33_full_text_search(self):
+        print("\n=== Test 33: Full-text search ===")
+        from io import StringIO
+        from unittest import mock
+        from django.core.management import call_command
+        from django.db import connection
+        from apps.search import services as search_services
+        from apps.search.services import search
+
+        Entity.objects.create(name='Café adgang', description='Nøglekort til kantinen', category=self.cat)
+        Entity.objects.create(name='Kantine', description='Adgang til café og kantine', category=self.cat)
+        hits = search('cafe')
+        self.assertEqual([hit.title for hit in hits[:2]], ['Café adgang', 'Kantine'])
+        self.assertEqual((hits[0].kind, hits[0].label), ('entity', 'Enhed'))
+        self.assertTrue(hits[0].url.startswith('/entities/'))
+        self._p("Diacritic-insensitive prefix search ranks title matches first")
+
+        kinds = {hit.kind for hit in search('test')}
+        self.assertTrue({'user', 'entity', 'template', 'onboarding'} <= kinds)
+        self.assertEqual({hit.kind for hit in search('test', kinds=['user'])}, {'user'})
+        self._p("Results are typed and can be limited to one kind")
+
+        self.entity.name = 'Omdøbt enhed'
+        self.entity.save()
+        self.assertFalse(search('Med Todo'))
+        self.assertEqual(search('omdøbt')[0].object_id, self.entity.pk)
+        self.cat.name = 'Facilitetsstyring'
+        self.cat.save()
+        self.assertIn(self.entity.pk, [hit.object_id for hit in search('facilitet', kinds=['entity'])])
+        self.user2.delete()
+        self.assertFalse(search('X2'))
+        self._p("Saves and deletes, including category renames, update the index")
+
+        for query in ['"', 'AND OR', 'NEAR(x', '*', "x' OR 1=1 --"]:
+            search(query)
+        self._p("FTS syntax in the query is treated as plain words")
+
+        resp = Client().get('/users/?q=X1')
+        self.assertIn('Test Bruger X1', resp.content.decode())
+        resp = Client().get('/entities/?q=kantine')
+        self.assertIn('Kantine', resp.content.decode())
+        self.assertNotIn('Omdøbt enhed', resp.content.decode())
+        resp = Client().get('/search/?q=kantine', HTTP_HX_REQUEST='true')
+        self.assertIn('Vis alle resultater', resp.content.decode())
+        self.assertNotIn('<html', resp.content.decode())
+        self._p("List views and the navbar search use the index")
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_index')
+        self.assertFalse(search('kantine'))
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed', out.getvalue())
+        self.assertTrue(search('kantine'))
+        self._p("rebuild_search_index restores the index")
+
+        import importlib
+        from django.db.migrations.loader import MigrationLoader
+        migration = importlib.import_module('apps.search.migrations.0002_fill_search_index')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM search_index')
+        state = MigrationLoader(connection).project_state(('search', '0002_fill_search_index'))
+        migration.fill_index(state.apps, None)
+        self.assertEqual(search('kantine')[0].title, 'Kantine')
+        self._p("The search_index migration fills the index from historical models")
+
+        from apps.search.services import search_filter
+        SystemUser.objects.bulk_create([
+            SystemUser(name=f'Massebruger {i}', email=f'masse{i}@test.dk') for i in range(1200)
+        ])
+        index_users = SystemUser.objects.filter(name__startswith='Massebruger')
+        search_services.index_objects('user', index_users)
+        with self.assertNumQueries(1):
+            self.assertEqual(SystemUser.objects.filter(search_filter('user', 'massebruger')).count(), 1200)
+        self.assertIn('search_index MATCH', str(SystemUser.objects.filter(search_filter('user', 'x')).query))
+        self._p("List filters match through a subquery instead of an id list")
+
+        with mock.patch.object(search_services, 'fts_enabled', return_value=False):
+            titles = [hit.title for hit in search('kantine')]
+        self.assertEqual(titles[0], 'Kantine')
+        self.assertIn('Café adgang', titles)
+        with mock.patch.object(search_services, 'fts_enabled', return_value=False):
+            self.assertEqual(Entity.objects.filter(search_filter('entity', 'kantine')).count(), 2)
+        self._p("Other backends fall back to ORM queries")
+
+    # ------------------------------------------------------------------
+    # Test 34: Azure AD directory sync
+    # ------------------------------------------------------------------
+    def test_34_directory_sync(self):
+        print("\n=== Test 34: Azure AD directory sync ===")
+        import csv
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.core.directory import sync_directory
+        from apps.core.models import AuthMethod, DirectorySync
+        from apps.search.services import search
+
+        def graph_user(i, **extra):
+            return {'id': f'oid-{i}', 'displayName': f'Katalog {i}', 'mail': f'Katalog{i}@Corp.dk',
+                    'department': 'IT', 'jobTitle': 'Udvikler', 'accountEnabled': True, **extra}
+
+        tmp = tempfile.mkdtemp()
+        export = os.path.join(tmp, 'users.json')
+        users = [graph_user(i) for i in range(250)]
+        users.append({'id': 'oid-x1', 'displayName': 'Test Bruger X1', 'mail': self.user1.email})
+        users.append({'id': 'oid-nomail', 'displayName': 'Ingen mail'})
+        with open(export, 'w') as f:
+            json.dump({'value': users}, f)
+        stats = sync_directory(export, batch_size=100)
+        self.assertEqual((stats['created'], stats['updated'], stats['skipped']), (250, 1, 1))
+        synced = SystemUser.objects.get(azure_ad_object_id='oid-7')
+        self.assertEqual((synced.email, synced.auth_method), ('katalog7@corp.dk', AuthMethod.AZURE_AD))
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.azure_ad_object_id, 'oid-x1')
+        self.assertEqual(search('Katalog 42')[0].title, 'Katalog 42')
+        self._p("A full export is upserted in batches, linking existing users by email")
+
+        users[7]['mail'] = 'ny.adresse@corp.dk'
+        users[7]['displayName'] = 'Katalog Syv'
+        with open(export, 'w') as f:
+            json.dump({'value': users[:200] + users[250:]}, f)
+        with CaptureQueriesContext(connection) as ctx:
+            stats = sync_directory(export, batch_size=100)
+        self.assertEqual(stats['deactivated'], 50)
+        deactivations = [q for q in ctx.captured_queries
+                         if q['sql'].startswith('UPDATE "core_systemuser" SET "is_active"')]
+        self.assertEqual(len(deactivations), 1)
+        self.assertEqual(SystemUser.objects.get(azure_ad_object_id='oid-7').email, 'ny.adresse@corp.dk')
+        self.assertFalse(SystemUser.objects.get(azure_ad_object_id='oid-220').is_active)
+        self.assertTrue(self.user2.__class__.objects.get(pk=self.user2.pk).is_active)
+        self._p("Users missing from a full export are deactivated in one UPDATE; local users are kept")
+
+        csv_path = os.path.join(tmp, 'users.csv')
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['id', 'displayName', 'mail', 'department', 'jobTitle', 'accountEnabled'])
+            writer.writeheader()
+            writer.writerow({'id': 'oid-csv', 'displayName': 'Fra CSV', 'mail': 'csv@corp.dk',
+                             'department': 'HR', 'jobTitle': '', 'accountEnabled': 'false'})
+        call_command('sync_directory', csv_path, '--delta', stdout=StringIO())
+        self.assertFalse(SystemUser.objects.get(email='csv@corp.dk').is_active)
+        self.assertTrue(SystemUser.objects.get(azure_ad_object_id='oid-3').is_active)
+        self._p("CSV exports work, and --delta applies only the listed changes")
+
+        SystemUser.objects.filter(email='csv@corp.dk').update(is_active=False)
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, ['id', 'displayName', 'mail', 'accountEnabled'])
+            writer.writeheader()
+            writer.writerow({'id': 'oid-csv', 'displayName': 'Fra CSV', 'mail': 'csv@corp.dk', 'accountEnabled': ''})
+            writer.writerow({'id': 'oid-3', 'displayName': 'Katalog 3', 'mail': 'katalog3@corp.dk', 'accountEnabled': ''})
+            writer.writerow({'id': 'oid-csv-ny', 'displayName': 'Ny fra CSV', 'mail': 'csv.ny@corp.dk'})
+        sync_directory(csv_path, incremental=True)
+        self.assertFalse(SystemUser.objects.get(email='csv@corp.dk').is_active)
+        self.assertTrue(SystemUser.objects.get(azure_ad_object_id='oid-3').is_active)
+        self.assertTrue(SystemUser.objects.get(email='csv.ny@corp.dk').is_active)
+        self._p("An empty accountEnabled leaves is_active unchanged; new users start active")
+
+        repeated = [graph_user(400), graph_user(401), graph_user(400, displayName='Sidste', mail='sidste@corp.dk'),
+                    graph_user(401, accountEnabled=False)]
+        with open(export, 'w') as f:
+            json.dump(repeated, f)
+        stats = sync_directory(export, incremental=True, batch_size=3)
+        self.assertEqual((stats['received'], stats['created']), (4, 2))
+        self.assertEqual(SystemUser.objects.get(azure_ad_object_id='oid-400').email, 'sidste@corp.dk')
+        self.assertFalse(SystemUser.objects.get(azure_ad_object_id='oid-401').is_active)
+        self._p("A user listed twice is written once, with the last record winning")
+
+        pages = {
+            '/users': {'value': [graph_user(i) for i in range(300, 310)], '@odata.nextLink': 'PAGE2'},
+            '/users?page=2': {'value': [graph_user(i) for i in range(310, 315)],
+                              '@odata.deltaLink': 'DELTA1'},
+            '/users?delta=1': {'value': [graph_user(301, displayName='Omdøbt'), {'id': 'oid-302', '@removed': {}}],
+                               '@odata.deltaLink': 'DELTA2'},
+        }
+        with LocalDirectoryServer(pages) as directory:
+            for page in pages.values():
+                for key in ('@odata.nextLink', '@odata.deltaLink'):
+                    if page.get(key) == 'PAGE2':
+                        page[key] = f'{directory.url}/users?page=2'
+                    elif page.get(key) == 'DELTA1':
+                        page[key] = f'{directory.url}/users?delta=1'
+                    elif page.get(key) == 'DELTA2':
+                        page[key] = f'{directory.url}/users?delta=2'
+            source = f'{directory.url}/users'
+            out = StringIO()
+            call_command('sync_directory', source, stdout=out)
+            self.assertIn('Full sync: 15 records', out.getvalue())
+            self.assertRegex(out.getvalue(), r'\(\d+/s\)')
+            self.assertFalse(SystemUser.objects.get(azure_ad_object_id='oid-3').is_active)
+            self.assertEqual(DirectorySync.objects.get(source=source).delta_link, f'{directory.url}/users?delta=1')
+
+            stats = sync_directory(source)
+            self.assertTrue(stats['incremental'])
+            self.assertEqual(directory.requests[-1], '/users?delta=1')
+            self.assertEqual(SystemUser.objects.get(azure_ad_object_id='oid-301').name, 'Omdøbt')
+            self.assertFalse(SystemUser.objects.get(azure_ad_object_id='oid-302').is_active)
+            self.assertTrue(SystemUser.objects.get(azure_ad_object_id='oid-303').is_active)
+            self.assertEqual(DirectorySync.objects.get(source=source).delta_link, f'{directory.url}/users?delta=2')
+        self._p("Endpoint pages are followed and the next run only asks for the delta")
+
+    # ------------------------------------------------------------------
+    # Test 35: Bulk reassignment of a user's work
+    # ------------------------------------------------------------------
+    def test_35_reassign_user_work(self):
+        print("\n=== Test 35: Bulk reassignment of a user's work ===")
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.notifications.models import Notification, NotificationType
+        from apps.onboarding.services import get_open_work, reassign_user_work
+
+        leaver = SystemUser.objects.create(name='Test Fratræder', email='leaver@test.dk')
+        hr = Category.objects.create(name='_Test_HR')
+        hr_entity = Entity.objects.create(name='_Test Kontrakt', category=hr)
+        hr_te = TemplateEntity.objects.create(
+            template=self.template, entity=hr_entity, sort_order=1, default_assignee=leaver,
+        )
+        TemplateEntity.objects.filter(pk=self.te.pk).update(default_assignee=leaver)
+        processes = [
+            create_onboarding_from_template(
+                template=self.template, new_employee_name=f'Ny {i}', new_employee_email=f'ny{i}@test.dk',
+                new_employee_department='IT', new_employee_position='Udvikler',
+                start_date=date.today() + timedelta(days=14), created_by=self.user1,
+            )
+            for i in range(15)
+        ]
+        OnboardingTask.objects.filter(onboarding__in=processes).update(assignee=leaver)
+        done = OnboardingTask.objects.filter(onboarding=processes[0], entity=self.entity).get()
+        OnboardingTask.objects.filter(pk=done.pk).update(status=TaskStatus.COMPLETED)
+        work = get_open_work(leaver)
+        self.assertEqual((work.tasks, work.template_entities, work.category_ids), (29, 2, {self.cat.pk, hr.pk}))
+        self._p("get_open_work counts open tasks and template defaults per category")
+
+        version = OnboardingTemplate.objects.get(pk=self.template.pk).version
+        process_version = OnboardingProcess.objects.get(pk=processes[3].pk).version
+        with CaptureQueriesContext(connection) as ctx:
+            result = reassign_user_work(leaver, self.user1, {hr.pk: self.user2})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "onboarding_onboardingtask" SET "assignee_id"')]
+        self.assertEqual(len(updates), 2)
+        self.assertEqual(
+            sorted((r.assignee.pk, r.tasks, r.template_entities) for r in result),
+            sorted([(self.user1.pk, 14, 1), (self.user2.pk, 15, 1)]),
+        )
+        self.assertEqual(OnboardingTask.objects.filter(assignee=self.user2, entity=hr_entity).count(), 15)
+        self.assertEqual(OnboardingTask.objects.filter(assignee=self.user1, entity=self.entity).count(), 14)
+        self.assertEqual(OnboardingTask.objects.get(pk=done.pk).assignee, leaver)
+        self.assertEqual(TemplateEntity.objects.get(pk=hr_te.pk).default_assignee, self.user2)
+        self.assertEqual(TemplateEntity.objects.get(pk=self.te.pk).default_assignee, self.user1)
+        self.assertGreater(OnboardingTemplate.objects.get(pk=self.template.pk).version, version)
+        self.assertGreater(OnboardingProcess.objects.get(pk=processes[3].pk).version, process_version)
+        self._p("Open tasks and template defaults move by category rule in one UPDATE per assignee")
+
+        summaries = Notification.objects.filter(notification_type=NotificationType.TASKS_REASSIGNED)
+        self.assertEqual(summaries.filter(recipient=self.user1).count(), 1)
+        self.assertEqual(summaries.filter(recipient=self.user2).count(), 1)
+        message = summaries.get(recipient=self.user1).message
+        self.assertIn('14 åbne opgaver fra Test Fratræder', message)
+        self.assertIn('og 4 mere', message)
+        self.assertIn('1 skabelonopgave', message)
+        self.assertEqual(reassign_user_work(leaver, self.user1), [])
+        self._p("Each new assignee gets one summary notification")
+
+        other = SystemUser.objects.create(name='Test Kollega', email='kollega@test.dk')
+        OnboardingTask.objects.filter(onboarding__in=processes[:2]).update(assignee=other)
+        client = Client()
+        response = client.post(f'/users/{other.pk}/toggle-active/')
+        self.assertRedirects(response, f'/users/{other.pk}/reassign/', fetch_redirect_response=False)
+        response = client.get(f'/users/{other.pk}/reassign/')
+        self.assertContains(response, f'name="category_{hr.pk}"')
+        client.post(f'/users/{other.pk}/reassign/', {'assignee': self.user2.pk, f'category_{hr.pk}': self.user1.pk})
+        self.assertEqual(OnboardingTask.objects.filter(assignee=self.user1, entity=hr_entity).count(), 2)
+        self.assertEqual(get_open_work(other).tasks, 0)
+        self._p("Deactivating a user with open work leads to the reassignment page")
+
+        OnboardingTask.objects.filter(onboarding=processes[5]).update(assignee=other)
+        response = client.get(f'/users/{other.pk}/delete/')
+        self.assertContains(response, 'Overdrag åbne opgaver til')
+        self.assertContains(response, f'name="category_{hr.pk}"')
+        response = client.post(f'/users/{other.pk}/delete/', {'assignee': 999999})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'text-red-600')
+        self.assertTrue(SystemUser.objects.filter(pk=other.pk).exists())
+        self.assertEqual(get_open_work(other).tasks, 2)
+        self._p("An invalid hand-over re-renders the confirmation and deletes nothing")
+
+        from unittest import mock
+        with mock.patch.object(SystemUser, 'delete', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                client.post(f'/users/{other.pk}/delete/', {'assignee': self.user2.pk})
+        self.assertEqual(get_open_work(other).tasks, 2)
+        self._p("The hand-over rolls back when the delete fails")
+
+        client.post(f'/users/{other.pk}/delete/', {'assignee': self.user2.pk})
+        self.assertFalse(SystemUser.objects.filter(pk=other.pk).exists())
+        self.assertEqual(OnboardingTask.objects.filter(onboarding=processes[5], assignee=self.user2).count(), 2)
+        self._p("Deleting a user can hand their open tasks over first")
+
+    # ------------------------------------------------------------------
+    # Test 36: User workload annotations
+    # ------------------------------------------------------------------
+    def test_36_user_workload(self):
+        print("\n=== Test 36: User workload annotations ===")
+        import re
+
+        busy = SystemUser.objects.create(name='Test Travl', email='travl@test.dk')
+        processes = [
+            create_onboarding_from_template(
+                template=self.template, new_employee_name=f'Ny {i}', new_employee_email=f'ny{i}@test.dk',
+                new_employee_department='IT', new_employee_position='Udvikler',
+                start_date=date.today() + timedelta(days=14), created_by=busy,
+            )
+            for i in range(3)
+        ]
+        tasks = list(OnboardingTask.objects.filter(onboarding__in=processes))
+        OnboardingTask.objects.filter(pk__in=[t.pk for t in tasks]).update(assignee=busy)
+        OnboardingTask.objects.filter(pk=tasks[0].pk).update(deadline=date.today() - timedelta(days=2))
+        OnboardingTask.objects.filter(pk=tasks[1].pk).update(status=TaskStatus.COMPLETED)
+        OnboardingTask.objects.filter(pk=tasks[2].pk).update(
+            status=TaskStatus.SKIPPED, deadline=date.today() - timedelta(days=2),
+        )
+
+        with self.assertNumQueries(1):
+            users = {u.pk: u for u in SystemUser.objects.with_workload()}
+        u = users[busy.pk]
+        self.assertEqual(
+            (u.open_task_count, u.overdue_task_count, u.completed_task_count, u.task_count, u.onboarding_count),
+            (1, 1, 1, 3, 3),
+        )
+        self.assertEqual((users[self.user1.pk].onboarding_count, users[self.user1.pk].open_task_count), (1, 0))
+        self._p("with_workload returns every count in one query without join fan-out")
+
+        more = create_onboarding_from_template(
+            template=self.template, new_employee_name='Ny X', new_employee_email='nyx@test.dk',
+            new_employee_department='IT', new_employee_position='Udvikler',
+            start_date=date.today() + timedelta(days=14), created_by=self.user1,
+        )
+        OnboardingTask.objects.filter(onboarding=more).update(assignee=self.user2)
+
+        client = Client()
+        response = client.get('/users/?sort=open&dir=desc')
+        order = [int(pk) for pk in re.findall(r'/users/(\d+)/"', response.content.decode())]
+        # Equal workloads fall back to name order
+        self.assertEqual(order[:2], [self.user2.pk, busy.pk])
+        self.assertEqual(order[-1], self.user1.pk)
+        response = client.get('/users/?sort=onboardings&dir=desc&q=Test')
+        order = [int(pk) for pk in re.findall(r'/users/(\d+)/"', response.content.decode())]
+        self.assertEqual(order[0], busy.pk)
+        self.assertContains(response, 'href="?q=Test&amp;sort=open&dir=desc"')
+        self._p("The user list shows workload and sorts by it, keeping the search")
+
+        with self.assertNumQueries(2):
+            response = client.get(f'/users/{busy.pk}/')
+        self.assertContains(response, 'Forsinkede opgaver')
+        response = client.get(f'/users/{busy.pk}/delete/')
+        self.assertContains(response, '3 opgaver i alt tildelt denne bruger')
+        self.assertContains(response, '3 onboardings oprettet af denne bruger')
+        self._p("User detail and delete pages read the same annotations")
 
 if __name__ == '__main__':
     import unittest